@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Measure the effect of the compiled-expression cache when loading a
+    directory of near-identical parameter files (as generated by a sweep).
+"""
+
+import glob
+import logging
+import os.path as osp
+import tempfile
+import sys
+import timeit
+
+# benchmark the checked-out sources (also without installing them)
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+import yccp
+from yccp import prelude as pl
+
+
+def make_sweep_directory(folder, num_files):
+    """
+        Write `num_files` parameter files that only differ in their prelude.
+    """
+    for i in range(num_files):
+        lines = [
+            "__prelude__:",
+            "    - synapse_loss: {}".format(0.01 * i),
+            "      weights: !eval np.linspace(0., 1., 100)",
+            "    - scaled: !eval get.weights * (1. - get.synapse_loss)",
+            "",
+        ]
+        for j in range(50):
+            lines.extend([
+                "projection_{}:".format(j),
+                "    density: !eval 0.9 * (1. - get.synapse_loss)",
+                "    weight: !eval float(get.scaled.mean()) * {}".format(j),
+                "    delay: !eval 1. + 0.1 * get.synapse_loss",
+            ])
+        with open(osp.join(folder, "point_{:05d}.yaml".format(i)), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def load_all(filenames):
+    for fn in filenames:
+        with open(fn) as f:
+            pl.load(f)
+
+
+if __name__ == "__main__":
+    yccp.log.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as folder:
+        make_sweep_directory(folder, 200)
+        filenames = sorted(glob.glob(osp.join(folder, "*.yaml")))
+
+        maxsize = pl.expression_cache.maxsize
+
+        pl.expression_cache.maxsize = 0
+        pl.expression_cache.clear()
+        t_uncached = min(timeit.repeat(lambda: load_all(filenames),
+                                       number=1, repeat=3))
+
+        pl.expression_cache.maxsize = maxsize
+        pl.expression_cache.clear()
+        t_cached = min(timeit.repeat(lambda: load_all(filenames),
+                                     number=1, repeat=3))
+
+        print("Loading {} files: uncached {:.3f}s, cached {:.3f}s "
+              "(speedup {:.2f}x)".format(len(filenames), t_uncached, t_cached,
+                                         t_uncached / t_cached))
+        print(pl.expression_cache.info())
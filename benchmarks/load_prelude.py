@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Compare the single-pass prelude loader with the former approach of
+    parsing every document twice (once to extract the prelude, once to
+    construct the final object).
+"""
+
+import io
+import os.path as osp
+import sys
+import timeit
+
+# benchmark the checked-out sources (also without installing them)
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+from yccp import prelude as pl
+
+
+def make_document(num_entries):
+    """
+        Generate a large parameter file that makes use of a prelude.
+    """
+    lines = [
+        "__prelude__:",
+        "    - synapse_loss: 0.25",
+        "      foo: !eval 1+2 * np.arange(100)",
+        "      bar: 1024",
+        "    - foobar: !eval get.foo + get.bar",
+        "",
+    ]
+    for i in range(num_entries):
+        lines.extend([
+            "population_{}:".format(i),
+            "    size: {}".format(i),
+            "    density: !eval 0.9 * get.synapse_loss",
+            "    weight: !get bar",
+            "    labels: [a, b, c, d]",
+        ])
+    return "\n".join(lines) + "\n"
+
+
+def load_two_pass(text):
+    """
+        Emulate the former loader: the document is parsed twice.
+    """
+    pl.load(io.StringIO(text), verbatim=True)
+    return pl.load(io.StringIO(text))
+
+
+def load_single_pass(text):
+    return pl.load(io.StringIO(text))
+
+
+if __name__ == "__main__":
+    for num_entries in [100, 1000, 10000]:
+        text = make_document(num_entries)
+        repeat = max(1, 10000 // num_entries)
+
+        t_two = min(timeit.repeat(lambda: load_two_pass(text),
+                                  number=repeat, repeat=3)) / repeat
+        t_one = min(timeit.repeat(lambda: load_single_pass(text),
+                                  number=repeat, repeat=3)) / repeat
+
+        print("{:>6d} entries ({:>8d} bytes): two-pass {:.4f}s, "
+              "single-pass {:.4f}s ({:.1f}% less)".format(
+                  num_entries, len(text), t_two, t_one,
+                  100. * (1. - t_one / t_two)))
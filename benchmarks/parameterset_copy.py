@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Compare copy-on-write ParameterSets with deep copies when generating a
+    sweep over a large base document (memory and time).
+
+    Usage: parameterset_copy.py [NUM_POINTS]
+"""
+
+import logging
+import os.path as osp
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# benchmark the checked-out sources (also without installing them)
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+import yccp
+from yccp import sweeps
+
+
+class DeepCopyParameterSet(sweeps.ParameterSet):
+    """
+        ParameterSet with the former copy semantics.
+    """
+
+    def copy(self, cow=False):
+        return super(DeepCopyParameterSet, self).copy()
+
+
+def make_base(cls):
+    """
+        Create a base document of roughly 5 MB (mostly NumPy arrays).
+    """
+    paramset = cls()
+    paramset.setup_metadata("base.yaml")
+    paramset["__prelude__/weights"] = np.linspace(0., 1., 500000)
+    paramset["__prelude__/delays"] = np.ones(100000)
+    for i in range(100):
+        paramset["populations/{}/size".format(i)] = i
+        paramset["populations/{}/rate".format(i)] = 0.1 * i
+    return paramset
+
+
+def make_sweep(num_points):
+    sweep = sweeps.Sweep()
+    num_outer = max(1, int(np.sqrt(num_points)))
+    num_inner = max(1, num_points // num_outer)
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="populations/0/size"),
+        list(range(num_outer))))
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.FactorValue(path_to="populations/1/rate"),
+        list(np.linspace(0.5, 1.5, num_inner))))
+    return sweep
+
+
+def run(cls, num_points):
+    paramset = make_base(cls)
+    sweep = make_sweep(num_points)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = sum(1 for _ in sweep.generate(paramset))
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, duration, peak
+
+
+if __name__ == "__main__":
+    yccp.log.setLevel(logging.WARNING)
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    for name, cls in [("deepcopy", DeepCopyParameterSet),
+                      ("copy-on-write", sweeps.ParameterSet)]:
+        count, duration, peak = run(cls, num_points)
+        print("{:>14s}: {} points in {:.3f}s ({:.1f} us/point), "
+              "peak memory {:.2f} MB".format(
+                  name, count, duration, 1e6 * duration / count,
+                  peak / 2.**20))
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Reproducible benchmark suite covering loading, prelude evaluation, sweep
+    generation/dumping, InheritDefaults and yccp-sbn.
+
+    Results are written as JSON so that they can be compared across commits.
+
+    Usage:
+        suite.py run [--quick] [-k PATTERN] [-o RESULTS.json]
+        suite.py compare BEFORE.json AFTER.json
+        suite.py list
+"""
+
+import argparse
+import collections
+import datetime
+import fnmatch
+import gc
+import io
+import json
+import logging
+import os
+import os.path as osp
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# benchmark the checked-out sources (also without installing them)
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+import yccp
+from yccp import meta
+from yccp import prelude as pl
+from yccp import sweeps
+from yccp.cli import sort_by_numbers as sbn
+
+
+Benchmark = collections.namedtuple(
+    "Benchmark", ["name", "setup", "params", "quick_params", "repeat"])
+
+# all registered benchmarks (in order of registration)
+benchmarks = collections.OrderedDict()
+
+
+def benchmark(name, params, quick_params=None, repeat=5):
+    """
+        Register `setup(param)` as benchmark.
+
+        `setup` prepares everything that is not measured and returns the
+        function to be timed (called without arguments) or a tuple (function,
+        cleanup).
+    """
+    def register(setup):
+        benchmarks[name] = Benchmark(
+            name, setup, params,
+            params if quick_params is None else quick_params, repeat)
+        return setup
+    return register
+
+
+########
+# load #
+########
+
+def make_document(num_entries, with_prelude):
+    lines = []
+    if with_prelude:
+        lines.extend([
+            "__prelude__:",
+            "    - synapse_loss: 0.25",
+            "      weights: !eval np.linspace(0., 1., 100)",
+            "    - scaled: !eval get.weights * (1. - get.synapse_loss)",
+        ])
+    for i in range(num_entries):
+        lines.extend([
+            "population_{}:".format(i),
+            "    size: {}".format(i),
+            "    labels: [a, b, c, d]",
+        ])
+        if with_prelude:
+            lines.extend([
+                "    density: !eval 0.9 * (1. - get.synapse_loss)",
+                "    weight: !get synapse_loss",
+            ])
+        else:
+            lines.extend([
+                "    density: 0.675",
+                "    weight: 0.25",
+            ])
+    return "\n".join(lines) + "\n"
+
+
+def _setup_load(num_entries, with_prelude):
+    text = make_document(num_entries, with_prelude)
+    return lambda: pl.load(io.StringIO(text))
+
+
+@benchmark("load/plain", params=[10, 10000], quick_params=[10, 1000])
+def bench_load_plain(num_entries):
+    return _setup_load(num_entries, with_prelude=False)
+
+
+@benchmark("load/prelude", params=[10, 10000], quick_params=[10, 1000])
+def bench_load_prelude(num_entries):
+    return _setup_load(num_entries, with_prelude=True)
+
+
+########
+# eval #
+########
+
+@benchmark("eval/heavy", params=[100, 1000], quick_params=[100])
+def bench_eval_heavy(num_expressions):
+    """
+        Evaluate numerically heavy expressions via the evaluator directly.
+    """
+    expressions = [
+        pl.RawExpression(
+            "float(np.sum(np.outer(get.weights, get.weights) * {}))".format(i))
+        for i in range(num_expressions)]
+
+    def run():
+        evaluator = pl.ExpressionEvaluatorWithPrelude()
+        evaluator.prelude_add("weights", np.linspace(0., 1., 100))
+        for expression in expressions:
+            evaluator.eval(expression)
+    return run
+
+
+###################
+# generate / dump #
+###################
+
+def make_base():
+    paramset = sweeps.ParameterSet()
+    paramset.setup_metadata("base.yaml")
+    paramset["__prelude__/weights"] = [0.1 * i for i in range(10)]
+    for i in range(20):
+        paramset["populations/{}/size".format(i)] = i
+        paramset["populations/{}/rate".format(i)] = 0.1 * i
+    return paramset
+
+
+def make_sweep(num_points):
+    sweep = sweeps.Sweep()
+    num_outer = max(1, int(round(num_points ** .5)))
+    num_inner = max(1, num_points // num_outer)
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="populations/0/size"),
+        list(range(num_outer))))
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.FactorValue(path_to="populations/1/rate"),
+        [1. + i for i in range(num_inner)]))
+    sweep.add_namers_folder(sweeps.namers.create_formatted(
+        "populations/0/size", "size"))
+    sweep.set_namers_file(sweeps.namers.create_formatted(
+        "populations/1/rate", "rate", value_format=".1f"))
+    return sweep
+
+
+@benchmark("sweep/generate", params=[100, 1000, 10000, 100000],
+           quick_params=[100, 1000], repeat=3)
+def bench_generate(num_points):
+    paramset = make_base()
+    sweep = make_sweep(num_points)
+    return lambda: sum(1 for _ in sweep.generate(paramset))
+
+
+@benchmark("sweep/dump", params=[100, 1000, 10000, 100000],
+           quick_params=[100, 1000], repeat=3)
+def bench_dump(num_points):
+    paramset = make_base()
+    sweep = make_sweep(num_points)
+    folder = tempfile.mkdtemp(prefix="yccp-bench-")
+
+    def run():
+        sweep.dump(paramset, basefolder=tempfile.mkdtemp(dir=folder))
+    return run, lambda: shutil.rmtree(folder)
+
+
+#################
+# meta / cli    #
+#################
+
+@benchmark("meta/inherit_defaults", params=[10000], quick_params=[1000])
+def bench_inherit_defaults(num_instances):
+    """
+        Instantiate Transforms (InheritDefaults metaclass).
+    """
+    def run():
+        for i in range(num_instances):
+            sweeps.transforms.FactorValue(path_to="foo/bar", value=i)
+    return run
+
+
+@benchmark("meta/inherit_defaults_size", params=[10, 100, 1000],
+           quick_params=[10, 1000])
+def bench_inherit_defaults_size(num_defaults):
+    """
+        Instantiate a Transform with `num_defaults` default parameters (one
+        of which is overridden) 10000 times.
+    """
+    defaults = {"extra_{}".format(i): float(i) for i in range(num_defaults)}
+    defaults["weights"] = {"exc": 1., "inh": -1.}
+    cls = meta.InheritDefaults("LargeTransform", (sweeps.transforms.SetValue,),
+                               {"default_parameters": defaults})
+
+    def run():
+        for i in range(10000):
+            cls(path_to="foo/bar", value=i)
+    return run
+
+
+@benchmark("meta/class_creation", params=[1000], quick_params=[100])
+def bench_class_creation(num_classes):
+    def run():
+        for i in range(num_classes):
+            meta.InheritDefaults(
+                "Transform{}".format(i), (sweeps.transforms.SetValue,),
+                {"default_parameters": {"extra": {"a": i}}})
+    return run
+
+
+@benchmark("sbn/sort_filename", params=[10**6], quick_params=[10**4],
+           repeat=1)
+def bench_sort_filename(num_names):
+    rng = random.Random(1234)
+    filenames = [
+        "size_{}-rate_{:.1f}/weight_{:.3e}-seed_{}.png".format(
+            rng.randint(0, 100), rng.uniform(0., 50.),
+            rng.uniform(1e-4, 1.), i)
+        for i in range(num_names)]
+    return lambda: sbn.sort_filename(filenames)
+
+
+##########
+# runner #
+##########
+
+def measure(bench, param):
+    prepared = bench.setup(param)
+    cleanup = None
+    if isinstance(prepared, tuple):
+        prepared, cleanup = prepared
+
+    times = []
+    try:
+        for _ in range(bench.repeat):
+            gc.collect()
+            start = time.perf_counter()
+            prepared()
+            times.append(time.perf_counter() - start)
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+    return {
+        "name": bench.name,
+        "param": param,
+        "repeat": bench.repeat,
+        "times": times,
+        "min": min(times),
+        "median": statistics.median(times),
+    }
+
+
+def get_metadata(quick):
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=osp.dirname(osp.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.datetime.now().isoformat(),
+        "commit": commit,
+        "yccp": ".".join(map(str, yccp.__version__)),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "quick": quick,
+    }
+
+
+def run(args):
+    yccp.log.setLevel(logging.WARNING)
+    results = []
+    for bench in benchmarks.values():
+        if args.pattern is not None\
+                and not fnmatch.fnmatch(bench.name, args.pattern):
+            continue
+        for param in (bench.quick_params if args.quick else bench.params):
+            result = measure(bench, param)
+            results.append(result)
+            print("{:<28s} {:>8} {:>10.4f}s (median {:.4f}s)".format(
+                result["name"], result["param"], result["min"],
+                result["median"]), file=sys.stderr)
+
+    output = {"metadata": get_metadata(args.quick), "results": results}
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+
+def compare(args):
+    """
+        Print the ratio of the minimal times (after / before) of all
+        benchmarks present in both files.
+    """
+    def load(filename):
+        with open(filename) as f:
+            return collections.OrderedDict(
+                ((r["name"], r["param"]), r) for r in json.load(f)["results"])
+
+    before, after = load(args.before), load(args.after)
+    for key, result in after.items():
+        if key not in before:
+            continue
+        ratio = result["min"] / before[key]["min"]
+        print("{:<28s} {:>8} {:>10.4f}s -> {:>10.4f}s ({:.2f}x){}".format(
+            key[0], key[1], before[key]["min"], result["min"], ratio,
+            "  SLOWER" if ratio > 1.1 else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="yccp benchmark suite")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    parser_run = subparsers.add_parser("run", help="run benchmarks")
+    parser_run.add_argument("--quick", action="store_true",
+                            help="use smaller problem sizes")
+    parser_run.add_argument("-k", dest="pattern", default=None,
+                            help="only run benchmarks matching the pattern")
+    parser_run.add_argument("-o", dest="output", default=None,
+                            help="write results to file (default: stdout)")
+    parser_run.set_defaults(func=run)
+
+    parser_compare = subparsers.add_parser(
+        "compare", help="compare two result files")
+    parser_compare.add_argument("before")
+    parser_compare.add_argument("after")
+    parser_compare.set_defaults(func=compare)
+
+    parser_list = subparsers.add_parser("list", help="list benchmarks")
+    parser_list.set_defaults(func=lambda args: print("\n".join(
+        "{} {}".format(name, b.params) for name, b in benchmarks.items())))
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pytest
+
+from yccp import sweeps
+
+
+@pytest.fixture
+def make_paramset():
+    """
+        Factory of ParameterSets holding the given data (with metadata set up
+        as if loaded from "test.yaml" unless metadata is False).
+    """
+    def make(data, metadata=True):
+        paramset = sweeps.ParameterSet()
+        paramset.data = data
+        if metadata:
+            paramset.setup_metadata("test.yaml")
+        return paramset
+    return make
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import zipfile
+
+import pytest
+
+from yccp import sweeps
+from yccp.sweeps import bundles
+
+
+@pytest.mark.parametrize("ext", [".db", ".zip"])
+def test_bundle(tmp_path, ext):
+    # characters with a special meaning in URIs
+    filename = str(tmp_path / "odd?name#50%{}".format(ext))
+
+    with bundles.open_bundle(filename, mode="a") as bundle:
+        bundle.write("a/1.yaml", "a: 1\n")
+        bundle.write("a/2.yaml", "a: 2\n")
+        assert "a/1.yaml" in bundle
+        assert bundle.read("a/2.yaml") == "a: 2\n"
+
+    with bundles.open_bundle(filename, mode="a") as bundle:
+        bundle.write("a/1.yaml", "a: 3\n")
+        bundle.write("b.yaml", "b: 1\n")
+        # replaced entries can be read before closing
+        assert bundle.read("a/1.yaml") == "a: 3\n"
+
+    with bundles.open_bundle(filename) as bundle:
+        assert bundle.names() == ["a/1.yaml", "a/2.yaml", "b.yaml"]
+        assert bundle.read("a/1.yaml") == "a: 3\n"
+        assert "c.yaml" not in bundle
+        with pytest.raises(KeyError):
+            bundle.read("c.yaml")
+
+    if ext == ".zip":
+        with zipfile.ZipFile(filename) as archive:
+            # no duplicate entries
+            assert len(archive.infolist()) == 3
+
+
+def test_open_bundle(tmp_path):
+    with pytest.raises(ValueError):
+        bundles.open_bundle(str(tmp_path / "bundle.tar"))
+    with pytest.raises(IOError):
+        bundles.open_bundle(str(tmp_path / "missing.db"))
+    with pytest.raises(ValueError):
+        bundles.open_bundle(str(tmp_path / "bundle.db"), mode="w")
+
+
+@pytest.mark.parametrize("ext", [".db", ".zip"])
+def test_dump_into_bundle(tmp_path, make_paramset, ext):
+    paramset = make_paramset({"a": 0, "b": 0})
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="a"), [1, 2]))
+    sweep.set_namers_file(
+        sweeps.namers.create_formatted("a", "a", value_format="d"))
+
+    filename = str(tmp_path / "sweep{}".format(ext))
+    sweep.dump(paramset, basefolder=str(tmp_path), bundle=filename)
+    # dumping again replaces the entries
+    paramset["b"] = 1
+    sweep.dump(paramset, basefolder=str(tmp_path), bundle=filename,
+               overwrite_files=True)
+
+    with bundles.open_bundle(filename) as bundle:
+        assert bundle.names() == ["a_1.yaml", "a_2.yaml"]
+        loaded = sweeps.ParameterSet("a_2.yaml", bundle=bundle)
+    assert loaded.get_many(["a", "b"]) == [2, 1]
+    assert sweeps.ParameterSet("a_1", bundle=filename)["a"] == 1
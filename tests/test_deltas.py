@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import io
+import os.path as osp
+
+import pytest
+
+from yccp import prelude as pl
+from yccp import sweeps
+from yccp.sweeps import deltas as d
+
+base = {
+        "a": {"b": 1, "c": {"d": [1, 2, {"e": 3}]}, "f": "x"},
+        "g": [1, 2],
+        "_delta": {"user": "value"},
+    }
+
+
+@pytest.mark.parametrize("data", [
+        base,
+        {"a": {"b": 2, "c": {"d": [1, 2, {"e": 4}]}, "f": "x"},
+         "g": [1, 2], "_delta": {"user": "value"}},
+        # deletions
+        {"a": {"c": {"d": [1, 2, {}]}}, "g": [1, 2]},
+        # lists of different length and new values
+        {"a": {"b": 1, "c": {"d": [1]}, "f": "x", "h": {"i": 1}},
+         "g": [1, 2, 3], "_delta": {"user": "other"}},
+    ])
+def test_round_trip(make_paramset, data):
+    changes, deletions = d.diff(base, data)
+    delta = pl.load(io.StringIO(pl.dump(
+        d.make_delta("base.yaml", "sub/point.yaml", changes, deletions))))
+    assert d.is_delta(delta)
+    assert d.get_base_filename("sub/point.yaml", delta) == "base.yaml"
+
+    # shares base copy-on-write
+    paramset = make_paramset(base, metadata=False).copy(cow=True)
+    d.apply(paramset, delta)
+    assert paramset.data == data
+    # the base is not modified
+    assert base["a"]["c"]["d"][2] == {"e": 3}
+
+
+def test_diff():
+    changes, deletions = d.diff(base, {"a": {"b": 1, "c": 2}, "g": [1, 3]})
+    assert changes == {"a/c": 2, "g/1": 3}
+    assert sorted(deletions) == ["_delta", "a/f"]
+
+    with pytest.raises(ValueError):
+        d.diff([1], [2])
+
+
+def test_is_delta():
+    # user parameters are not mistaken for delta documents
+    assert not d.is_delta(base)
+    assert not d.is_delta({"_metainfo": "text"})
+    assert not d.is_delta({"_metainfo": {"delta": "text"}})
+
+    delta = d.make_delta("base.yaml", "point.yaml", {}, [])
+    delta["_metainfo"]["delta"]["version"] = d.delta_version + 1
+    assert d.is_delta(delta)
+    with pytest.raises(ValueError):
+        d.get_delta(delta)
+
+
+@pytest.mark.parametrize("bundle", [None, "sweep.db"])
+def test_dump_deltas(tmp_path, make_paramset, bundle):
+    paramset = make_paramset(base)
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="a/c/d/2/e"), [4, 5]))
+    sweep.add(sweeps.transforms.DeleteValues(paths=["a/f"]))
+    sweep.set_namers_file(
+        sweeps.namers.create_formatted("a/c/d/2/e", "e", value_format="d"))
+
+    full = str(tmp_path / "full")
+    sweep.dump(paramset, basefolder=full)
+    delta = str(tmp_path / "delta")
+    sweep.dump(paramset, basefolder=delta, delta_base="base.yaml",
+               bundle=bundle)
+
+    for name in ["e_4.yaml", "e_5.yaml"]:
+        if bundle is None:
+            loaded = sweeps.ParameterSet(osp.join(delta, name))
+        else:
+            loaded = sweeps.ParameterSet(name,
+                                         bundle=osp.join(delta, bundle))
+        expected = sweeps.ParameterSet(osp.join(full, name))
+        del loaded.data["_metainfo"], expected.data["_metainfo"]
+        assert loaded.data == expected.data
+        assert loaded["_delta/user"] == "value"
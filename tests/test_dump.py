@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import multiprocessing as mp
+import os
+import os.path as osp
+
+import numpy as np
+import pytest
+
+from yccp import sweeps
+
+example_file = osp.join(osp.dirname(osp.dirname(osp.abspath(__file__))),
+                        "examples", "simple.yaml")
+
+
+def make_example_sweep():
+    """
+        Sweep of examples/make_simple_sweep.py (its custom generator keeps
+        modifying the ParameterSet it yielded).
+    """
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.transforms.AddValue(path_to="regularValue", value=5))
+    sweep.add(sweeps.ranges.Range(
+        transforms=[
+                sweeps.transforms.FactorValue(path_to="nestedValue/foo"),
+                sweeps.transforms.SetValue(path_to="nestedValue/bar"),
+            ],
+        range_tuples=[(2, 4), (3, 12), (9, 10), (1, -1)]))
+
+    def custom_generator(paramset):
+        ps = paramset.copy()
+        ps["regularValuePlusOne"] = ps["nestedValue/bar"] + ps["regularValue"]
+        yield ps
+
+        ps["regularValuePlusOne"] = ps["nestedValue/bar"] - ps["regularValue"]
+        yield ps
+
+    sweep.add(custom_generator)
+    sweep.add_filter(lambda ps: ps["nestedValue/bar"] > 0)
+
+    sweep.add_namers_folder(
+        sweeps.namers.create_formatted("nestedValue/foo", "foo",
+                                       value_format="d"),
+        sweeps.namers.create_formatted("regularValue", "regular",
+                                       value_format="d"),
+    )
+    sweep.set_namers_file(
+        sweeps.namers.create_formatted("nestedValue/bar", "bar",
+                                       value_format="d"),
+        sweeps.namers.create_formatted("regularValuePlusOne", "ValP1",
+                                       value_format="d"),
+    )
+    return sweep
+
+
+def read_tree(folder):
+    contents = {}
+    for root, _, files in os.walk(folder):
+        for fn in files:
+            path = osp.join(root, fn)
+            with open(path, "rb") as f:
+                contents[osp.relpath(path, folder)] = f.read()
+    return contents
+
+
+def test_parallel_dump_equals_serial(tmp_path):
+    paramset = sweeps.ParameterSet(example_file)
+
+    for name, workers in [("serial", None), ("parallel", 3)]:
+        sweep = make_example_sweep()
+        # several chunks with points pending at the same time
+        sweep.dump_chunksize = 2
+        sweep.dump(paramset, basefolder=str(tmp_path / name),
+                   workers=workers)
+
+    serial = read_tree(str(tmp_path / "serial"))
+    assert len(serial) == 6
+    assert read_tree(str(tmp_path / "parallel")) == serial
+
+
+def test_parallel_dump_without_fork(tmp_path, monkeypatch, caplog):
+    paramset = sweeps.ParameterSet(example_file)
+    make_example_sweep().dump(paramset, basefolder=str(tmp_path / "serial"))
+
+    # e.g. Windows
+    monkeypatch.setattr(mp, "get_all_start_methods", lambda: ["spawn"])
+    make_example_sweep().dump(paramset, basefolder=str(tmp_path / "spawn"),
+                              workers=2)
+    assert "Dumping serially" in caplog.text
+    assert read_tree(str(tmp_path / "spawn")) == \
+        read_tree(str(tmp_path / "serial"))
+
+
+class WritingParameterSet(sweeps.ParameterSet):
+
+    def write(self, filename, **kwargs):
+        raise AssertionError("write called")
+
+
+def test_dump_warns_about_overridden_write(tmp_path, caplog):
+    paramset = WritingParameterSet(example_file)
+    make_example_sweep().dump(paramset, basefolder=str(tmp_path))
+    assert "WritingParameterSet.write is not used" in caplog.text
+    assert len(read_tree(str(tmp_path))) == 6
+
+
+class CommentedParameterSet(sweeps.ParameterSet):
+
+    def serialize(self, stream=None, **kwargs):
+        content = "# generated\n" + super().serialize(**kwargs)
+        if stream is None:
+            return content
+        stream.write(content)
+
+
+def test_dump_uses_serialize(tmp_path):
+    paramset = CommentedParameterSet(example_file)
+
+    for name, workers in [("serial", None), ("parallel", 2)]:
+        sweep = make_example_sweep()
+        sweep.dump(paramset, basefolder=str(tmp_path / name),
+                   workers=workers)
+        contents = read_tree(str(tmp_path / name))
+        assert len(contents) == 6
+        assert all(content.startswith(b"# generated\n")
+                   for content in contents.values())
+
+    paramset.write(str(tmp_path / "written.yaml"))
+    with open(str(tmp_path / "written.yaml")) as f:
+        assert f.readline() == "# generated\n"
+
+
+def test_parallel_dump_is_profiled(tmp_path):
+    paramset = sweeps.ParameterSet(example_file)
+
+    for name, workers in [("serial", None), ("parallel", 2)]:
+        sweep = make_example_sweep()
+        profile = sweep.enable_profiling()
+        sweep.dump(paramset, basefolder=str(tmp_path / name),
+                   workers=workers)
+        assert profile.get_timer("namers").calls == 6
+        assert profile.get_timer("serialize").calls == 6
+
+
+def make_incremental_sweep(values, collide=False):
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="a"), values))
+    if collide:
+        # all points share one filename
+        sweep.set_namers_file(lambda ps: "all")
+    else:
+        sweep.set_namers_file(
+            sweeps.namers.create_formatted("a", "a", value_format="d"))
+    return sweep
+
+
+def dump_incremental(sweep, paramset, folder, **kwargs):
+    return sweep.dump(paramset, basefolder=folder, manifest="manifest.db",
+                      incremental=True, **kwargs)
+
+
+def get_counts(stats):
+    return stats.points, stats.new, stats.changed, stats.unchanged
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_incremental_dump(tmp_path, make_paramset, workers):
+    folder = str(tmp_path)
+    paramset = make_paramset({"a": 0, "b": 0})
+
+    stats = dump_incremental(make_incremental_sweep([1, 2, 3]), paramset,
+                             folder, workers=workers)
+    assert get_counts(stats) == (3, 3, 0, 0)
+    written = read_tree(folder)
+
+    # resumed/repeated dumps only skip
+    os.remove(osp.join(folder, "a_1.yaml"))
+    sweep = make_incremental_sweep([1, 2, 3])
+    stats = dump_incremental(sweep, paramset, folder, workers=workers)
+    assert sweep.dump_stats is stats
+    assert get_counts(stats) == (3, 1, 0, 2)
+    assert read_tree(folder).keys() == written.keys()
+    assert read_tree(folder)["a_1.yaml"] == written["a_1.yaml"]
+
+    # changed and removed points
+    paramset["b"] = 1
+    stats = dump_incremental(make_incremental_sweep([1, 2]), paramset,
+                             folder, workers=workers)
+    assert get_counts(stats) == (2, 0, 2, 0)
+    assert stats.written == 2
+    assert sweeps.ParameterSet(osp.join(folder, "a_2.yaml"))["b"] == 1
+    with sweeps.manifest.Manifest(osp.join(folder, "manifest.db")) as mf:
+        assert [row["filename"] for row in mf] == [
+            osp.join(folder, "a_1.yaml"), osp.join(folder, "a_2.yaml")]
+    # files of removed points are kept
+    assert osp.isfile(osp.join(folder, "a_3.yaml"))
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_incremental_dump_collisions(tmp_path, make_paramset, workers):
+    paramset = make_paramset({"a": 0})
+
+    reference = str(tmp_path / "reference")
+    make_incremental_sweep([1, 2], collide=True).dump(
+        paramset, basefolder=reference, overwrite_files=True)
+
+    folder = str(tmp_path / "incremental")
+    for i in range(3):
+        stats = dump_incremental(make_incremental_sweep([1, 2], collide=True),
+                                 paramset, folder, overwrite_files=True,
+                                 workers=workers)
+        assert stats.points == 2 and stats.files == 1
+        contents = read_tree(folder)
+        del contents["manifest.db"]
+        assert contents == read_tree(reference)
+
+    # the last point is unchanged, the first one still needs to be written
+    # before it
+    assert get_counts(stats) == (2, 0, 2, 0)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_dump_npy(tmp_path, make_paramset, workers):
+    paramset = make_paramset({"a": 0, "array": np.arange(1000.)})
+    sweep = make_incremental_sweep([1, 2])
+    sweep.dump(paramset, basefolder=str(tmp_path), npy_threshold=1000,
+               workers=workers)
+
+    # both points share the array
+    assert len(os.listdir(str(tmp_path / "arrays"))) == 1
+    loaded = sweeps.ParameterSet(str(tmp_path / "a_2.yaml"))
+    assert loaded["a"] == 2
+    assert isinstance(loaded["array"], np.memmap)
+    assert (loaded["array"] == np.arange(1000.)).all()
+
+    with pytest.raises(ValueError):
+        sweep.dump(paramset, basefolder=str(tmp_path), npy_threshold=1000,
+                   bundle="sweep.zip")
+
+
+def test_manifest(tmp_path, make_paramset):
+    folder = str(tmp_path)
+    paramset = make_paramset({"a": 0, "b": {"c": [1, 2]}})
+    sweep = make_incremental_sweep([1, 2, 3, 4])
+    sweep.add_filter(lambda ps: ps["a"] != 2, paths=["a"])
+
+    sweep.dump(paramset, basefolder=folder, manifest="manifest.db",
+               manifest_paths=["b/c"])
+    # shards hold the global indices
+    for k in range(2):
+        sweep.dump(paramset, basefolder=folder, shard=(k, 2),
+                   overwrite_files=True,
+                   manifest="manifest{}.db".format(k))
+    with sweeps.manifest.Manifest(osp.join(folder, "manifest0.db")) as mf0,\
+            sweeps.manifest.Manifest(osp.join(folder, "manifest1.db")) as mf1:
+        assert [row["idx"] for row in mf0] == [0]
+        assert [row["idx"] for row in mf1] == [2, 3]
+
+    with sweeps.manifest.Manifest(osp.join(folder, "manifest.db")) as mf:
+        assert mf.paths == ["a", "b/c"]
+        rows = list(mf)
+        assert [row["idx"] for row in rows] == [0, 2, 3]
+        assert mf.values("a") == [1, 3, 4]
+        # non-scalar values are stored as YAML
+        assert rows[0]["b/c"] == "[1, 2]"
+        assert rows[0]["filename"] == osp.join(folder, "a_1.yaml")
+        assert rows[0]["sha1"] == sweeps.manifest.file_hash(
+            osp.join(folder, "a_1.yaml"))
+        assert mf.get(osp.join(folder, "a_4.yaml"))["idx"] == 3
+
+    # stale entries of a previous larger sweep are removed
+    stats = dump_incremental(make_incremental_sweep([1]), paramset, folder,
+                             manifest_paths=["b/c"])
+    assert stats.unchanged == 1
+    with sweeps.manifest.Manifest(osp.join(folder, "manifest.db")) as mf:
+        assert [row["idx"] for row in mf] == [0]
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+
+import pytest
+
+from yccp import sweeps
+from yccp.sweeps import loadcache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = loadcache.enable(folder=str(tmp_path / "cache"))
+    # cache freshly written files as well
+    cache.racy_interval = 0.
+    yield cache
+    loadcache.disable()
+
+
+def write_file(filename, text):
+    with open(filename, "w") as f:
+        f.write(text)
+    # older than the racy interval
+    os.utime(filename, (0, 1))
+
+
+def test_cache_hits(cache, tmp_path):
+    filename = str(tmp_path / "p.yaml")
+    write_file(filename, "a: {b: 1}\nc: !eval 1 + 1\n")
+
+    first = sweeps.ParameterSet(filename)
+    second = sweeps.ParameterSet(filename)
+    assert second["c"] == 2
+    assert cache.info().hits == 1
+
+    # the on-disk cache is used by new processes (i.e. empty caches)
+    cache._data.clear()
+    assert sweeps.ParameterSet(filename).data == first.data
+    assert cache.info().disk_hits == 1
+
+
+def test_modifications_do_not_change_cache(cache, tmp_path):
+    filename = str(tmp_path / "p.yaml")
+    write_file(filename, "a: {b: 1}\n")
+
+    first = sweeps.ParameterSet(filename)
+    first["a/b"] = 2
+    first["c"] = 3
+    first.data["d"] = 4
+    del first["a"]
+
+    second = sweeps.ParameterSet(filename)
+    assert cache.info().hits == 1
+    assert second["a/b"] == 1
+    assert "c" not in second.data and "d" not in second.data
+    assert second.metainfo["original_file"] == os.path.abspath(filename)
+
+
+def test_changed_files_are_reloaded(cache, tmp_path):
+    filename = str(tmp_path / "p.yaml")
+    write_file(filename, "a: 1\n")
+    assert sweeps.ParameterSet(filename)["a"] == 1
+
+    write_file(filename, "a: 22\n")
+    assert sweeps.ParameterSet(filename)["a"] == 22
+    assert cache.info().hits == 0
+
+
+def test_racy_files_are_not_cached(cache, tmp_path):
+    cache.racy_interval = 60.
+    filename = str(tmp_path / "p.yaml")
+    with open(filename, "w") as f:
+        f.write("a: 1\n")
+
+    # the file might still change within its mtime granularity
+    sweeps.ParameterSet(filename)
+    sweeps.ParameterSet(filename)
+    assert cache.info().hits == 0
+    assert cache.info().currsize == 0
+    assert os.listdir(cache.folder) == []
+
+
+def test_disk_cache(cache, tmp_path):
+    filename = str(tmp_path / "p.yaml")
+    write_file(filename, "a: 1\n")
+    key = cache.key(filename)
+    sweeps.ParameterSet(filename)
+    disk_filename = cache._get_disk_filename(key)
+    assert os.path.isfile(disk_filename)
+
+    # outdated entries on disk are invalidated
+    cache._data.clear()
+    with open(filename, "w") as f:
+        f.write("a: 22\n")
+    os.utime(filename, (0, 2))
+    assert cache.get(cache.key(filename)) is None
+    assert cache.info().invalidated == 1
+    assert not os.path.isfile(disk_filename)
+
+    # broken entries are ignored
+    assert sweeps.ParameterSet(filename)["a"] == 22
+    cache._data.clear()
+    with open(disk_filename, "wb") as f:
+        f.write(b"broken")
+    assert sweeps.ParameterSet(filename)["a"] == 22
+    assert cache.info().disk_hits == 0
+
+    cache.clear()
+    assert cache.info().currsize == 0
+    assert os.listdir(cache.folder) == []
+
+
+def test_eviction(cache, tmp_path):
+    cache.maxsize = 2
+    filenames = []
+    for i in range(3):
+        filenames.append(str(tmp_path / "p{}.yaml".format(i)))
+        write_file(filenames[-1], "a: {}\n".format(i))
+        sweeps.ParameterSet(filenames[-1])
+    # in-process: least recently used entries are evicted
+    assert cache.info().currsize == 2
+    assert cache.get(cache.key(filenames[0])) is not None
+    assert cache.info().disk_hits == 1
+
+    keys = [cache.key(filename) for filename in filenames]
+    disk_filenames = [cache._get_disk_filename(key) for key in keys]
+    size = os.path.getsize(disk_filenames[0])
+    # disk: the second file was used least recently
+    for i, disk_filename in enumerate(disk_filenames):
+        os.utime(disk_filename, (0, [3, 1, 2][i]))
+    cache.max_disk_size = 2 * size
+    cache._prune_disk()
+    assert [os.path.isfile(fn) for fn in disk_filenames] == \
+        [True, False, True]
+    assert cache.info().evictions == 1
+
+    # putting entries prunes as well
+    cache._data.clear()
+    cache.max_disk_size = size
+    sweeps.ParameterSet(filenames[1])
+    assert sum(os.path.isfile(fn) for fn in disk_filenames) == 1
+    assert os.path.isfile(disk_filenames[1])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import copy
+import pickle
+
+import pytest
+import yaml
+
+from yccp import meta
+
+
+class Base(object, metaclass=meta.InheritDefaults):
+    default_parameters = {
+            "a": 1,
+            "weights": {"exc": 1., "inh": -1.},
+            "paths": [],
+            "replaced": {"x": 1},
+        }
+    _no_recursive_update = ["replaced"]
+
+
+class Derived(Base):
+    default_parameters = {"b": 2, "weights": {"exc": 2.}}
+    discard_parameters = ["a"]
+
+
+def test_parameters():
+    obj = Derived(b=3, weights={"inh": -2.}, replaced={"y": 2})
+    assert obj.prms == {
+            "weights": {"exc": 2., "inh": -2.},
+            "paths": [],
+            "replaced": {"y": 2},
+            "b": 3,
+        }
+    assert list(obj.prms) == ["weights", "paths", "replaced", "b"]
+    assert "a" not in obj.prms
+    assert obj.prms.get("a") is None
+
+    with pytest.raises(ValueError):
+        Derived(a=1)
+
+
+def test_parameters_are_independent():
+    supplied = {"exc": 3.}
+    first = Base(weights=supplied)
+    second = Base()
+    first.prms["paths"].append(1)
+    first.prms["weights"]["inh"] = 0.
+    supplied["exc"] = 4.
+
+    assert first.prms["weights"] == {"exc": 3., "inh": 0.}
+    assert second.prms["paths"] == []
+    assert second.prms["weights"] == {"exc": 1., "inh": -1.}
+    assert Base.default_parameters["paths"] == []
+
+
+def test_parameters_modify():
+    obj = Base()
+    obj.prms["a"] = 2
+    obj.prms["c"] = 3
+    del obj.prms["paths"]
+    assert obj.prms == {"a": 2, "weights": {"exc": 1., "inh": -1.},
+                        "replaced": {"x": 1}, "c": 3}
+    assert len(obj.prms) == 4
+    with pytest.raises(KeyError):
+        del obj.prms["paths"]
+
+
+def test_defaults_are_snapshotted():
+    class Modified(Base):
+        pass
+
+    # defaults are fixed when the class is created
+    Modified.default_parameters["a"] = 5
+    Modified.default_parameters["weights"]["exc"] = 5.
+    assert Modified().prms["a"] == 1
+    assert Modified().prms["weights"] == {"exc": 1., "inh": -1.}
+    assert Modified(weights={"inh": 0.}).prms["weights"] == \
+        {"exc": 1., "inh": 0.}
+    assert Base().prms["a"] == 1
+
+
+def test_parameters_are_dicts():
+    obj = Base(a=2)
+    assert type(obj.prms) is dict
+    for cp in [pickle.loads(pickle.dumps(obj.prms)), copy.deepcopy(obj.prms),
+               obj.prms.copy()]:
+        assert cp == obj.prms
+    assert yaml.safe_load(yaml.safe_dump(obj.prms)) == obj.prms
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pytest
+
+import yccp
+from yccp import sweeps
+
+
+def test_copy_is_deep(make_paramset):
+    paramset = make_paramset({"a": {"b": [1, 2]}}, metadata=False)
+    cp = paramset.copy()
+    cp.data["a"]["b"].append(3)
+    assert paramset["a/b"] == [1, 2]
+
+
+def test_copy_on_write(make_paramset):
+    paramset = make_paramset({"a": {"b": 1}, "c": {"d": [1]}}, metadata=False)
+    cp = paramset.copy(cow=True)
+    cp["a/b"] = 2
+    cp.get_mutable("c/d").append(2)
+
+    assert paramset.data == {"a": {"b": 1}, "c": {"d": [1]}}
+    assert cp.data == {"a": {"b": 2}, "c": {"d": [1, 2]}}
+    # unmodified parts are shared
+    cp2 = paramset.copy(cow=True)
+    cp2["a/b"] = 3
+    assert cp2.data["c"] is paramset.data["c"]
+
+
+def test_unshare(make_paramset):
+    paramset = make_paramset({"a": {"b": 1}}, metadata=False)
+    cp = paramset.copy(cow=True).unshare()
+    cp.data["a"]["b"] = 2
+    assert paramset["a/b"] == 1
+
+
+lazy_document = """
+__prelude__:
+    n: 3
+small: !eval get.n + 1
+big:
+    table: !eval 1/0
+    other: [1, !eval get.n]
+"""
+
+
+def test_copy_lazy_keeps_untouched_branches(tmp_path):
+    filename = tmp_path / "lazy.yaml"
+    filename.write_text(lazy_document)
+
+    paramset = sweeps.ParameterSet(str(filename), lazy=True)
+    assert paramset["small"] == 4
+    # partially constructed
+    assert paramset["big/other/1"] == 3
+
+    for cp in [paramset.copy(), paramset.copy(cow=True)]:
+        assert cp["big/other"] == [1, 3]
+        cp["big/other/0"] = 5
+        assert cp["big/other"] == [5, 3]
+        assert paramset["big/other"] == [1, 3]
+        with pytest.raises(ZeroDivisionError):
+            cp["big/table"]
+
+
+def test_lazy_modifications(tmp_path):
+    filename = tmp_path / "lazy.yaml"
+    filename.write_text(lazy_document.replace("1/0", "2"))
+
+    eager = sweeps.ParameterSet(str(filename))
+    lazy = sweeps.ParameterSet(str(filename), lazy=True)
+    assert lazy.fingerprint() == eager.fingerprint()
+
+    for paramset in [eager, lazy]:
+        paramset["big/other/2"] = 7
+        del paramset["big/table"]
+        paramset.get_mutable("big/other").append(8)
+    assert lazy["big"] == eager["big"] == {"other": [1, 3, 7, 8]}
+    assert lazy.fingerprint() == eager.fingerprint()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_load_many(tmp_path, executor):
+    filenames = []
+    for i in range(6):
+        filenames.append(str(tmp_path / "p{}.yaml".format(i)))
+        with open(filenames[-1], "w") as f:
+            # every file has its own prelude
+            f.write("__prelude__: {{n: {}}}\nm: !eval get.n * 2\n".format(i))
+
+    paramsets = yccp.load_many(filenames, workers=3, executor=executor)
+    assert [ps["m"] for ps in paramsets] == [2 * i for i in range(6)]
+    assert paramsets[1].metainfo["original_file"] == filenames[1]
+
+    with pytest.raises(ValueError):
+        yccp.load_many(filenames, executor="unknown")
+
+
+reactive_document = """
+__prelude__:
+    n: 2
+    m: !eval get.n * 10
+a: !eval get.n + 1
+b: !eval get.m + 1
+c: !eval 5
+d: {e: !eval get.m * 2}
+"""
+
+
+def test_reactive(tmp_path):
+    filename = tmp_path / "reactive.yaml"
+    filename.write_text(reactive_document)
+
+    paramset = sweeps.ParameterSet(str(filename), reactive=True)
+    eager = sweeps.ParameterSet(str(filename))
+    assert paramset.data == eager.data
+
+    # only expressions depending on the changed entry are re-evaluated
+    assert paramset.reactive.evaluate(paramset.data, changed=["m"]) == 2
+
+    cp = paramset.copy(cow=True)
+    cp["__prelude__/n"] = 3
+    assert cp.get_many(["a", "b", "c", "d/e", "__prelude__/m"]) == \
+        [4, 31, 5, 60, 30]
+    assert paramset.data == eager.data
+
+    # explicitly set values are not re-evaluated anymore
+    cp["d/e"] = 0
+    cp.set_many({"__prelude__/n": 4, "c": 1})
+    assert cp.get_many(["a", "b", "c", "d/e"]) == [5, 41, 1, 0]
+    assert paramset["d/e"] == 40
+
+
+def test_reactive_sweep(tmp_path):
+    filename = tmp_path / "reactive.yaml"
+    filename.write_text(reactive_document)
+    paramset = sweeps.ParameterSet(str(filename), reactive=True)
+
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="__prelude__/n"), [1, 2, 3]))
+    assert [ps["b"] for ps in sweep.generate(paramset)] == [11, 21, 31]
+    assert paramset["b"] == 21
+
+    with pytest.raises(ValueError):
+        sweeps.ParameterSet(str(filename), reactive=True, lazy=True)
+
+
+def test_copy_on_write_ownership(make_paramset):
+    paramset = make_paramset({"a": {"b": {"c": 1}}, "d": [{"e": 1}]},
+                             metadata=False)
+    cp = paramset.copy(cow=True)
+    # the original shares everything as well now
+    assert paramset._owned == {} and cp._owned == {}
+
+    cp["a/b/c"] = 2
+    # exactly the containers along the path are copied once
+    a, b = cp.data["a"], cp.data["a"]["b"]
+    assert all(cp._is_owned(obj) for obj in [cp.data, a, b])
+    assert not any(paramset._is_owned(obj) for obj in [cp.data, a, b])
+    cp["a/b/x"] = 3
+    assert cp.data["a"] is a and cp.data["a"]["b"] is b
+    assert cp.data["d"] is paramset.data["d"]
+
+    # replaced and deleted containers are not owned anymore
+    cp["a/b"] = {"y": 1}
+    assert not cp._is_owned(b) and not cp._is_owned(cp.data["a"]["b"])
+    cp.get_mutable("d/0")["e"] = 2
+    d = cp.data["d"]
+    del cp["d"]
+    assert not cp._is_owned(d)
+    assert len(cp._owned) == 2
+
+    # modifying the original copies as well
+    paramset["d/0/e"] = 3
+    assert d == [{"e": 2}]
+    assert paramset.data == {"a": {"b": {"c": 1}}, "d": [{"e": 3}]}
+    assert cp.data == {"a": {"b": {"y": 1}}}
+
+    cp.unshare()
+    assert cp._owned is None
+
+
+def make_layered():
+    base = {"a": {"x": 1, "y": [1, 2]}, "b": 1, "l": [{"v": 1}]}
+    override = {"a": {"y": [3]}, "c": 2}
+    return base, override, sweeps.LayeredParameterSet([base, override])
+
+
+def test_layered():
+    base, override, paramset = make_layered()
+    assert paramset.flatten().data == {
+        "a": {"x": 1, "y": [3]}, "b": 1, "l": [{"v": 1}], "c": 2}
+    assert paramset.get_many(["a/x", "a/y", "d"], default=0) == [1, [3], 0]
+
+    # modifications are written to the top-most layer
+    paramset["a/x"] = 5
+    paramset.get_mutable("a/y").append(4)
+    paramset["l/0/v"] = 7
+    assert paramset.flatten().data == {
+        "a": {"x": 5, "y": [3, 4]}, "b": 1, "l": [{"v": 7}], "c": 2}
+    # lists of lower layers are copied up before being modified
+    assert paramset.top.data == {"a": {"x": 5, "y": [3, 4]},
+                                 "l": [{"v": 7}]}
+    assert base == {"a": {"x": 1, "y": [1, 2]}, "b": 1, "l": [{"v": 1}]}
+    assert override == {"a": {"y": [3]}, "c": 2}
+
+    # only values of the top-most layer can be deleted
+    paramset["d"] = 1
+    del paramset["d"]
+    assert "d" not in paramset.data
+    with pytest.raises(ValueError):
+        del paramset["b"]
+
+
+def test_layered_copies():
+    _, _, paramset = make_layered()
+    fingerprint = paramset.fingerprint()
+
+    for cow in [False, True]:
+        cp = paramset.copy(cow=cow)
+        assert cp.fingerprint() == fingerprint
+        cp["a/x"] = 2
+        assert cp["a/x"] == 2 and paramset["a/x"] == 1
+        assert cp.fingerprint() != fingerprint
+    # copy-on-write copies share all layers
+    assert paramset.copy(cow=True).layers is paramset.layers
+
+    assert paramset.fingerprint() == fingerprint
+    assert make_layered()[2].fingerprint() == fingerprint
+
+
+def test_layered_sweep():
+    _, _, paramset = make_layered()
+    paramset.setup_metadata("test.yaml")
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="a/x"), [1, 2]))
+    sweep.add(sweeps.transforms.AddValue(path_to="l/0/v", value=1))
+
+    expected = [ps.data for ps in sweep.generate(paramset.flatten())]
+    assert [ps.flatten().data for ps in sweep.generate(paramset)] == expected
+    assert paramset["l/0/v"] == 1
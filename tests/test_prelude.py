@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import copy
+import io
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from yccp import prelude as pl
+from yccp import utils as u
+
+document = """
+__prelude__:
+    n: 3
+small: !eval get.n + 1
+big:
+    table: !eval 1/0
+    other: [1, !eval get.n, {x: !eval get.n * 2}]
+"""
+
+safe_document = document.replace("1/0", "list(range(get.n))")
+
+
+class UnseekableStream(io.StringIO):
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation("seek")
+
+
+def test_load_unseekable_stream():
+    data = pl.load(UnseekableStream(safe_document))
+    assert data == {
+            "__prelude__": {"n": 3},
+            "small": 4,
+            "big": {"table": [0, 1, 2], "other": [1, 3, {"x": 6}]},
+        }
+
+
+def test_load_prelude_variants():
+    data = pl.load(io.StringIO(
+        "pre:\n    - {a: 1}\n    - {b: !eval get.a + 1}\n"
+        "c: !eval cc.b * 2\nd: !get b\n"), name_prelude=["other", "pre"])
+    assert data == {"pre": {"a": 1, "b": 2}, "c": 4, "d": 2}
+
+    # the prelude of one document does not leak into the next one
+    assert pl.load(io.StringIO("a: 1\n")) == {"a": 1, "cache": {}}
+    with pytest.raises(KeyError):
+        pl.load(io.StringIO("c: !eval get.a\n"))
+
+    with pytest.raises(ValueError):
+        pl.load(io.StringIO("__prelude__: [1, 2]\n"))
+
+
+def test_lazy_untouched_expressions_are_not_evaluated():
+    data = pl.load(io.StringIO(document), lazy=True)
+    assert u.get_recursive(data, "small") == 4
+    assert u.get_recursive(data, "big/other/2/x") == 6
+    with pytest.raises(ZeroDivisionError):
+        u.get_recursive(data, "big/table")
+    # failed constructions can be retried
+    with pytest.raises(ZeroDivisionError):
+        u.get_recursive(data, "big/table")
+    assert u.get_recursive(data, "big/other") == [1, 3, {"x": 6}]
+
+
+def test_lazy_equals_eager():
+    eager = pl.load(io.StringIO(safe_document))
+    lazy = pl.load(io.StringIO(safe_document), lazy=True)
+    assert u.materialize(lazy) == eager
+    assert pl.dump(lazy) == pl.dump(eager)
+
+
+lazy_documents = [
+    safe_document,
+    """
+__prelude__:
+    n: 3
+base: &base {a: 1, b: [1, 2]}
+merged:
+    <<: *base
+    b: !eval get.n
+alias: *base
+seq: [!eval get.n, [!get n, {x: !eval "[i for i in range(get.n)]"}]]
+""",
+    "a: !eval 1 + 1\nb: [1, {c: !eval 2 * 2}]\n",
+]
+
+
+@pytest.mark.parametrize("text", lazy_documents)
+def test_lazy_load_equivalence(text):
+    eager = pl.load(io.StringIO(text))
+
+    assert u.materialize(pl.load(io.StringIO(text), lazy=True)) == eager
+    # pickled and deep-copied documents are constructed independently
+    lazy = pl.load(io.StringIO(text), lazy=True)
+    assert pickle.loads(pickle.dumps(lazy)) == eager
+    lazy = pl.load(io.StringIO(text), lazy=True)
+    copied = copy.deepcopy(lazy)
+    assert isinstance(copied, u.PartialDict)
+    assert u.materialize(copied) == eager
+    assert u.materialize(lazy) == eager
+
+
+def test_lazy_copies_are_independent():
+    data = pl.load(io.StringIO(safe_document), lazy=True)
+    copied = copy.deepcopy(data)
+    assert copied["big"] is not data["big"]
+    assert isinstance(copied["big"], pl.LazyNode)
+
+    u.get_recursive(copied, "big/other").append(4)
+    assert u.get_recursive(data, "big/other") == [1, 3, {"x": 6}]
+    assert u.get_recursive(copied, "big/other") == [1, 3, {"x": 6}, 4]
+
+
+def test_lazy_verbatim():
+    with pytest.raises(ValueError):
+        pl.load(io.StringIO(document), verbatim=True, lazy=True)
+
+
+def test_lazy_loader_disposed_once_constructed():
+    data = pl.load(io.StringIO(safe_document), lazy=True)
+    lazy_document = data["big"].document
+
+    assert u.get_recursive(data, "small") == 4
+    assert lazy_document.loader is not None
+
+    u.materialize(data)
+    assert lazy_document.pending == 0
+    assert lazy_document.loader is None
+
+
+def test_lazy_concurrent_access():
+    data = pl.load(io.StringIO(safe_document), lazy=True)
+    results = []
+
+    def access():
+        results.append(u.get_recursive(data, "big/other"))
+
+    threads = [threading.Thread(target=access) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[1, 3, {"x": 6}]] * 8
+
+
+def test_concurrent_loads_use_own_preludes():
+    results = {}
+
+    def load(i):
+        for _ in range(20):
+            data = pl.load(io.StringIO(
+                "__prelude__: {{n: {}}}\nm: !eval get.n\n".format(i)))
+            results.setdefault(i, set()).add(data["m"])
+
+    threads = [threading.Thread(target=load, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: {i} for i in range(8)}
+
+
+@pytest.mark.parametrize("verbatim", [False, True])
+def test_load_rejects_unknown_arguments(verbatim):
+    with pytest.raises(TypeError):
+        pl.load(io.StringIO("a: 1\n"), verbatim=verbatim, unknown=True)
+
+
+def test_expressions_with_leading_whitespace():
+    assert pl.load(io.StringIO('a: !eval " 1 + 2"\nb: !eval "\\t3"\n')) == \
+        {"a": 3, "b": 3, "cache": {}}
+
+
+def test_expressions_do_not_share_names():
+    assert pl.load(io.StringIO("a: !eval (x := 2) * 3\n"))["a"] == 6
+    with pytest.raises(NameError):
+        pl.load(io.StringIO("a: !eval (x := 2) * 3\nb: !eval x\n"))
+
+
+def test_expression_cache():
+    cache = pl.ExpressionCache(maxsize=2)
+    first = cache.compile("1 + 1")
+    assert cache.compile("1 + 1") is first
+    assert cache.info() == (1, 1, 0, 2, 1)
+
+    cache.compile("2 + 2")
+    # "1 + 1" was used most recently, hence "2 + 2" is evicted
+    cache.compile("1 + 1")
+    cache.compile("3 + 3")
+    assert cache.info() == (2, 3, 1, 2, 2)
+    assert cache.compile("1 + 1") is first
+    cache.compile("2 + 2")
+    assert cache.info().misses == 4
+
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 2, 0)
+
+    uncached = pl.ExpressionCache(maxsize=0)
+    uncached.compile("1 + 1")
+    uncached.compile("1 + 1")
+    assert uncached.info() == (0, 2, 0, 0, 0)
+
+
+def test_npy_round_trip(tmp_path):
+    filename = str(tmp_path / "arrays.yaml")
+    data = {"big": np.arange(100.), "same": np.arange(100.),
+            "small": np.arange(3), "objects": np.array([None] * 100)}
+    with open(filename, "w") as f:
+        pl.dump(data, f, npy_threshold=100 * 8)
+
+    # identical arrays are only stored once, small and object arrays inline
+    assert len(os.listdir(str(tmp_path / "arrays"))) == 1
+    with open(filename) as f:
+        assert f.read().count("!npy arrays/") == 2
+
+    with open(filename) as f:
+        loaded = pl.load(f)
+    assert isinstance(loaded["big"], np.memmap)
+    assert not loaded["big"].flags.writeable
+    assert not isinstance(loaded["small"], np.memmap)
+    for key, value in data.items():
+        assert (loaded[key] == value).all()
+
+    # memory-mapped arrays are dumped inline below the threshold
+    assert "!npy" not in pl.dump(loaded)
+    assert "!npy" in pl.dump(loaded, npy_threshold=1,
+                             npy_folder=str(tmp_path))
+    assert len(os.listdir(str(tmp_path / "arrays"))) == 2
+
+
+def test_npy_missing_or_corrupt(tmp_path):
+    filename = str(tmp_path / "arrays.yaml")
+    with open(filename, "w") as f:
+        pl.dump({"big": np.arange(100.)}, f, npy_threshold=1)
+    npy_file, = os.listdir(str(tmp_path / "arrays"))
+    npy_file = str(tmp_path / "arrays" / npy_file)
+
+    with open(npy_file, "wb") as f:
+        f.write(b"corrupt")
+    with pytest.raises(ValueError):
+        with open(filename) as f:
+            pl.load(f)
+
+    os.remove(npy_file)
+    with pytest.raises(FileNotFoundError):
+        with open(filename) as f:
+            pl.load(f)
+    # lazily loaded documents only fail once the array is accessed
+    with open(filename) as f:
+        data = pl.load(f, lazy=True)
+    with pytest.raises(FileNotFoundError):
+        u.get_recursive(data, "big")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import errno
+import os.path as osp
+
+import pytest
+
+from yccp.sweeps import manifest
+from yccp.sweeps import sinks
+
+
+def make_sink(kind, tmp_path):
+    if kind == "files":
+        return sinks.FileSink()
+    elif kind == "threads":
+        return sinks.FileSink(workers=2)
+    else:
+        return sinks.BundleSink(str(tmp_path / "bundle.zip"))
+
+
+def name(kind, tmp_path, fn):
+    return str(tmp_path / "points" / fn) if kind != "bundle" else fn
+
+
+@pytest.mark.parametrize("kind", ["files", "threads", "bundle"])
+def test_sink(tmp_path, kind):
+    a = name(kind, tmp_path, "a.yaml")
+    with make_sink(kind, tmp_path) as sink:
+        assert not sink.exists(a)
+        assert sink.store(a, "a: 1\n") == "new"
+        assert sink.has_stored(a) and sink.exists(a)
+        # points of the same dump collide
+        with pytest.raises(OSError) as excinfo:
+            sink.store(a, "a: 2\n")
+        assert excinfo.value.errno == errno.EEXIST
+        assert sink.store(a, "a: 2\n", overwrite=True) == "changed"
+        sink.flush()
+        assert sink.get_hash(a) == manifest.content_hash("a: 2\n")
+
+    with make_sink(kind, tmp_path) as sink:
+        assert sink.exists(a) and not sink.has_stored(a)
+        assert sink.get_hash(name(kind, tmp_path, "b.yaml")) is None
+
+        # the base is only written if it changed
+        base = name(kind, tmp_path, "base.yaml")
+        sink.write_base(base, "b: 1\n")
+        sink.write_base(base, "b: 1\n")
+        with pytest.raises(OSError):
+            sink.write_base(base, "b: 2\n")
+        sink.flush()
+        assert sink.get_hash(base) == manifest.content_hash("b: 1\n")
+
+
+def test_incremental_sink(tmp_path):
+    filename = str(tmp_path / "manifest.db")
+    a, b, c = (str(tmp_path / fn) for fn in ["a.yaml", "b.yaml", "c.yaml"])
+    with sinks.FileSink() as sink, \
+            manifest.Checkpoint(filename, [], incremental=True) as checkpoint:
+        for i, fn in enumerate([a, b]):
+            sink.store(fn, "a: 1\n")
+            checkpoint.add(i, fn, manifest.content_hash("a: 1\n"), "fp",
+                           True, [])
+        checkpoint.finish()
+
+    with sinks.FileSink() as sink, \
+            manifest.Checkpoint(filename, [], incremental=True) as checkpoint:
+        # content is None if unchanged according to the checkpoint
+        assert sink.store(a, None, checkpoint=checkpoint) == "unchanged"
+        # same content on disk
+        sha1 = manifest.content_hash("a: 1\n")
+        assert sink.store(b, "a: 1\n", sha1, checkpoint=checkpoint) == \
+            "unchanged"
+        # files of the previous dump are overwritten
+        assert osp.isfile(b)
+        sink.names.clear()
+        sha1 = manifest.content_hash("a: 2\n")
+        assert sink.store(b, "a: 2\n", sha1, checkpoint=checkpoint) == \
+            "changed"
+        # but other files are not
+        with open(c, "w") as f:
+            f.write("c: 1\n")
+        with pytest.raises(OSError):
+            sink.store(c, "a: 2\n", sha1, checkpoint=checkpoint)
+
+
+def test_dry_run_sink(tmp_path):
+    fn = str(tmp_path / "a.yaml")
+    with sinks.DryRunSink() as sink:
+        assert sink.store(fn, "a: 1\n") is None
+        sink.write_base(str(tmp_path / "base.yaml"), "b: 1\n")
+        assert sink.names == {fn}
+        assert not sink.has_stored(fn)
+    assert not osp.exists(fn)
+    assert not osp.exists(str(tmp_path / "base.yaml"))
+
+
+def test_checkpoint(tmp_path):
+    filename = str(tmp_path / "sub" / "manifest.db")
+    with manifest.Checkpoint(filename, ["x"], step=2) as checkpoint:
+        assert not checkpoint.incremental
+        for index in [0, 2, 4, 6]:
+            checkpoint.add(index, "p{}".format(index), "sha", "fp", True,
+                           [index])
+        checkpoint.finish()
+
+    with manifest.Checkpoint(filename, ["x"], incremental=True,
+                             step=2) as checkpoint:
+        assert checkpoint.is_unchanged("p2", "fp")
+        assert not checkpoint.is_unchanged("p2", "other")
+        assert checkpoint.get_hash("p4") == "sha"
+        assert "p8" not in checkpoint and checkpoint.get_hash("p8") is None
+
+        # skipped (i.e. filtered) and remaining indices are removed
+        checkpoint.add(0, "p0", "sha", "fp", True, [0])
+        checkpoint.add(4, "p4", "sha", "fp", True, [4])
+        checkpoint.finish()
+        assert checkpoint.manifest.values("x") == [0, 4]
+
+    # changed paths start a new manifest (the previous one is the checkpoint)
+    with manifest.Checkpoint(filename, ["y"],
+                             incremental=True) as checkpoint:
+        assert "p4" in checkpoint
+        assert len(checkpoint.manifest) == 0
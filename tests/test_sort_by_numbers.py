@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import io
+import os
+import sys
+
+import pytest
+
+from yccp.cli import sort_by_numbers as sbn
+
+
+filenames = [
+    "a_2-b_off-c_1e-3",
+    "a_10-b_on-c_1",
+    "a_2-b_on-c_0.5",
+    "a_1-b_off-c_2",
+    "a_2-b_1-c_1",
+]
+
+
+def sort_stream(filenames, sep=b"\n", **kwargs):
+    out = io.BytesIO()
+    sbn.sort_stream(io.BytesIO(sep.join(fn.encode() for fn in filenames)),
+                    out, sep=sep, **kwargs)
+    return [fn.decode() for fn in out.getvalue().split(sep) if fn]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"first": ["b"]},
+    {"last": ["a"], "reverse": ["c"]},
+    {"reverse_all": True},
+    {"reverse_all": True, "reverse": ["b"]},
+])
+def test_stream_equals_sort_filename(kwargs):
+    expected = sbn.sort_filename(filenames, **kwargs)
+    assert sort_stream(filenames, **kwargs) == expected
+    assert sort_stream(filenames, sep=b"\0", **kwargs) == expected
+
+
+def test_words_are_sorted_after_numbers():
+    # words sort alphabetically after numbers (the same in every process)
+    assert sbn.sort_filename(filenames, first=["b"]) == [
+        "a_2-b_1-c_1",
+        "a_1-b_off-c_2",
+        "a_2-b_off-c_1e-3",
+        "a_2-b_on-c_0.5",
+        "a_10-b_on-c_1",
+    ]
+    assert sort_stream(filenames, first=["b"], reverse=["b"]) == [
+        "a_2-b_on-c_0.5",
+        "a_10-b_on-c_1",
+        "a_1-b_off-c_2",
+        "a_2-b_off-c_1e-3",
+        "a_2-b_1-c_1",
+    ]
+
+
+def test_stream_mismatching_keys():
+    with pytest.raises(ValueError):
+        sort_stream(["a_1-b_2", "a_1-c_2"])
+
+
+def make_tree(root):
+    for a in [2, 10]:
+        folder = root / "a_{}".format(a)
+        folder.mkdir()
+        for b in ["on", "off"]:
+            (folder / "b_{}.png".format(b)).write_text("")
+        (folder / "notes.txt").write_text("")
+        (folder / ".hidden_1.png").write_text("")
+    # folders older than the racy interval
+    for folder in [root, root / "a_2", root / "a_10"]:
+        os.utime(str(folder), (0, 1))
+
+
+def walk(root, cache_folder, **kwargs):
+    index = sbn.load_index(str(root), cache_folder=str(cache_folder),
+                           **kwargs)
+    return [index.get(i).decode() for i in index.argsort()]
+
+
+def test_walk(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    make_tree(root)
+
+    assert walk(root, tmp_path / "cache", pattern="*.png") == [
+        "a_2/b_off.png",
+        "a_2/b_on.png",
+        "a_10/b_off.png",
+        "a_10/b_on.png",
+    ]
+
+
+def test_walk_cache(tmp_path, monkeypatch, capsys):
+    root = tmp_path / "root"
+    root.mkdir()
+    make_tree(root)
+    cache_folder = tmp_path / "cache"
+
+    expected = walk(root, cache_folder, pattern="*.png")
+    assert len(os.listdir(str(cache_folder))) == 1
+
+    # the cached index is used as long as no folder changed
+    def index_tree(root, pattern=None):
+        raise AssertionError("index rebuilt")
+    with monkeypatch.context() as m:
+        m.setattr(sbn, "index_tree", index_tree)
+        assert walk(root, cache_folder, pattern="*.png",
+                    verbose=True) == expected
+    assert "Using cached index" in capsys.readouterr().err
+
+    # different patterns are cached separately
+    assert walk(root, cache_folder, pattern="b_*") == expected
+    assert len(os.listdir(str(cache_folder))) == 2
+
+    # adding files invalidates the cache
+    (root / "a_2" / "b_1.png").write_text("")
+    assert walk(root, cache_folder, pattern="*.png") == \
+        ["a_2/b_1.png"] + expected
+    assert walk(root, cache_folder, pattern="*.png",
+                use_cache=False) == ["a_2/b_1.png"] + expected
+
+
+def run_main(monkeypatch, capsysbinary, argv, stdin=b""):
+    monkeypatch.setattr(sys, "argv", ["yccp-sbn"] + argv)
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(stdin)))
+    sbn.main()
+    return capsysbinary.readouterr().out
+
+
+def test_main_stdin(monkeypatch, capsysbinary):
+    stdin = b"\0".join(fn.encode() for fn in filenames)
+    out = run_main(monkeypatch, capsysbinary, ["-z", "-r", "a", "--stdin"],
+                   stdin=stdin)
+    assert out.split(b"\0")[:-1] == \
+        [fn.encode() for fn in sbn.sort_filename(filenames, reverse=["a"])]
+
+
+def test_main_walk(tmp_path, monkeypatch, capsysbinary):
+    root = tmp_path / "root"
+    root.mkdir()
+    make_tree(root)
+
+    out = run_main(monkeypatch, capsysbinary,
+                   ["-f", "b", "-p", "*.png", "--no-cache", "--walk",
+                    str(root)])
+    assert out.decode().splitlines() == [
+        os.path.join(str(root), fn) for fn in [
+            "a_2/b_off.png", "a_10/b_off.png", "a_2/b_on.png",
+            "a_10/b_on.png"]]
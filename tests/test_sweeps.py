@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import threading
+
+import pytest
+
+from yccp import sweeps
+
+
+def test_custom_generator_modifies_points_in_place(make_paramset):
+    paramset = make_paramset({"a": {"y": 0}, "b": 0})
+
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="b"), [1, 2]))
+
+    def increment(ps):
+        ps.data["a"]["y"] += 1
+        yield ps
+
+    sweep.add(increment)
+
+    points = list(sweep.generate(paramset))
+    assert [ps["a/y"] for ps in points] == [1, 1]
+    assert [ps["b"] for ps in points] == [1, 2]
+    assert paramset["a/y"] == 0
+    assert paramset["b"] == 0
+
+
+def test_generated_points_do_not_share_data(make_paramset):
+    paramset = make_paramset({"a": {"b": 1}})
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="c"), [1, 2, 3]))
+
+    for points in [list(sweep.generate(paramset)),
+                   [sweep.point(paramset, i) for i in range(3)],
+                   list(sweep.shard(paramset, 0, 1))]:
+        for ps in points:
+            ps["a"]["b"] += 10
+        assert [ps["a/b"] for ps in points] == [11, 11, 11]
+        assert paramset["a/b"] == 1
+
+    # copy-on-write copies share data until modified via the ParameterSet
+    points = list(sweep.generate(paramset, cow=True))
+    assert points[0].data["a"] is paramset.data["a"]
+    points[0]["a/b"] = 2
+    assert [ps["a/b"] for ps in points] == [2, 1, 1]
+    assert paramset["a/b"] == 1
+
+
+def test_custom_generator_modifies_its_paramset(make_paramset):
+    paramset = make_paramset({"a": {"y": 0}, "b": 0})
+
+    def generate_y(ps):
+        for y in [1, 2]:
+            ps.data["a"]["y"] = y
+            yield ps
+
+    sweep = sweeps.Sweep()
+    sweep.add(generate_y)
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="b"), [10, 20]))
+
+    assert [(ps["a/y"], ps["b"]) for ps in sweep.generate(paramset)] == \
+        [(1, 10), (1, 20), (2, 10), (2, 20)]
+    assert sweep.to_table(paramset, paths=["a/y", "b"],
+                          filenames=False).tolist() == \
+        [(1, 10), (1, 20), (2, 10), (2, 20)]
+
+
+def test_empty_range(make_paramset):
+    paramset = make_paramset({"a": {"y": 0}, "b": 0})
+
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="a/y"), [1]))
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="b"), []))
+
+    assert len(sweep) == 0
+    assert list(sweep.generate(paramset)) == []
+    assert list(sweep.shard(paramset, 0, 2)) == []
+    sweep.dump(paramset, write_files=False)
+
+
+def make_indexable_sweep():
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="a/y"), [1, 2, 3]))
+    sweep.add(sweeps.transforms.AddValue(path_to="b", value=10))
+    sweep.add(sweeps.ranges.Range(
+        [sweeps.transforms.SetValue(path_to="c"),
+         sweeps.transforms.FactorValue(path_to="b")],
+        [(0, 1), (1, 2), (2, 3), (3, 4)]))
+    return sweep
+
+
+def get_values(points):
+    return [(ps["a/y"], ps["b"], ps["c"]) for ps in points]
+
+
+def test_random_access(make_paramset):
+    paramset = make_paramset({"a": {"y": 0}, "b": 0, "c": 0})
+    sweep = make_indexable_sweep()
+
+    expected = get_values(sweep.generate(paramset))
+    # mixed-radix order: the last generator function varies fastest
+    assert expected[:5] == [(1, 10, 0), (1, 20, 1), (1, 30, 2), (1, 40, 3),
+                            (2, 10, 0)]
+    assert len(sweep) == sweep.count(paramset) == 12
+
+    assert get_values(sweep.point(paramset, i) for i in range(12)) == expected
+    assert get_values([sweep.point(paramset, -1)]) == expected[-1:]
+    with pytest.raises(IndexError):
+        sweep.point(paramset, 12)
+
+    for num in [1, 5, 12, 13]:
+        assert get_values(ps for k in range(num)
+                          for ps in sweep.shard(paramset, k, num)) == expected
+    with pytest.raises(ValueError):
+        list(sweep.shard(paramset, 2, 2))
+
+    # indices stay global if points are filtered
+    sweep.add_filter(lambda ps: ps["c"] != 1, paths=["c"])
+    assert [index for k in range(2)
+            for index, _ in sweep._iter_shard(paramset, k, 2)] == \
+        [i for i in range(12) if i % 4 != 1]
+
+
+def test_random_access_custom_generator(make_paramset):
+    paramset = make_paramset({"a": {"y": 0}, "b": 0, "c": 0})
+    sweep = make_indexable_sweep()
+
+    def twice(ps):
+        yield ps
+        ps = ps.copy()
+        ps["c"] += 100
+        yield ps
+
+    sweep.add(twice)
+    sweep.add_filter(lambda ps: ps["a/y"] != 2)
+
+    assert not sweep.is_indexable()
+    with pytest.raises(TypeError):
+        len(sweep)
+    assert sweep.count(paramset) == 16
+
+    expected = get_values(sweep.generate(paramset))
+    assert get_values([sweep.point(paramset, 9)]) == expected[9:10]
+    assert get_values([sweep.point(paramset, -16)]) == expected[:1]
+    with pytest.raises(IndexError):
+        sweep.point(paramset, 16)
+
+    # shards of non-indexable sweeps are interleaved
+    shards = [list(sweep._iter_shard(paramset, k, 3)) for k in range(3)]
+    assert [index for index, _ in shards[1]] == list(range(1, 16, 3))
+    assert sorted((index, value) for shard in shards
+                  for index, value in zip(
+                      (index for index, _ in shard),
+                      get_values(ps for _, ps in shard))) == \
+        list(enumerate(expected))
+
+
+class SetOther(sweeps.transforms.SetValue):
+    """
+        Stateful subclass that writes to a path other than path_to.
+    """
+
+    def modify(self, paramset):
+        paramset["other"] = self.prms["value"]
+
+
+def test_filter_pushdown(make_paramset):
+    paramset = make_paramset({"a": 0, "b": 0, "other": 0})
+
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="a"), [1, 2, 3]))
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="b"), [1, 2]))
+    sweep.add_filter(lambda ps: ps["a"] != 2, paths=["a"])
+
+    assert [(ps["a"], ps["b"]) for ps in sweep.generate(paramset)] == \
+        [(1, 1), (1, 2), (3, 1), (3, 2)]
+    # rejected right after the first Range
+    assert sweep.filter_stats.pruned == 1
+    assert sweep.filter_stats.leaves_avoided == 2
+
+    with pytest.raises(ValueError):
+        sweep.add_filter(lambda ps: True, stage=0, paths=["a"])
+
+
+def test_filter_not_pushed_past_unknown_paths(make_paramset):
+    paramset = make_paramset({"a": 0, "b": 0, "other": 0})
+
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(SetOther(path_to="a"), [1, 2]))
+    sweep.add(sweeps.ranges.Range(
+        sweeps.transforms.SetValue(path_to="b"), [1, 2]))
+    sweep.add_filter(lambda ps: ps["other"] == 2, paths=["other"])
+
+    assert SetOther(path_to="a").modified_paths() is None
+    assert sweep.get_swept_paths() == ["b"]
+    assert [(ps["other"], ps["b"]) for ps in sweep.generate(paramset)] == \
+        [(2, 1), (2, 2)]
+    assert sweep.filter_stats.rejected == [0, 1, 0]
+
+
+def test_to_table(make_paramset):
+    paramset = make_paramset({"a": {"y": 0}, "b": 0, "c": 0, "d": "x"})
+    sweep = make_indexable_sweep()
+    points = list(sweep.generate(paramset))
+
+    # taken from the Ranges directly (not b, it is modified by AddValue)
+    assert sweep._get_columns_from_ranges(paramset, ["b"]) is None
+    columns = sweep.to_table(paramset, paths=["a/y", "c", "d"],
+                             filenames=False, as_dict=True)
+    assert list(columns) == ["a/y", "c", "d"]
+    assert columns["a/y"].tolist() == [ps["a/y"] for ps in points]
+    assert columns["c"].tolist() == [ps["c"] for ps in points]
+    assert columns["d"].tolist() == ["x"] * 12
+    assert columns.keys() == sweep._get_columns_from_ranges(
+        paramset, ["a/y", "c", "d"]).keys()
+
+    sweep.set_namers_file(
+        sweeps.namers.create_formatted("c", "c", value_format="d"))
+    table = sweep.to_table(paramset, basefolder="out")
+    assert table.dtype.names == ("filename", "a/y", "b", "c")
+    assert table["b"].tolist() == [ps["b"] for ps in points]
+    assert table["filename"][1] == "out/c_1.yaml"
+
+    sweep.add_filter(lambda ps: ps["c"] == 0)
+    table = sweep.to_table(paramset, paths=["a/y", "c"], filenames=False)
+    assert table["a/y"].tolist() == [1, 2, 3]
+    assert table["c"].tolist() == [0, 0, 0]
+
+
+def test_profiled_copies(make_paramset):
+    paramset = make_paramset({"a": {"y": 0}, "b": 0, "c": 0})
+
+    sweep = make_indexable_sweep()
+    profile = sweep.enable_profiling()
+    assert len(list(sweep.generate(paramset))) == 12
+    # one copy per generated value: 3 + 3 (AddValue) + 3 * 4
+    assert profile.copies == 18
+
+    # copies made while the sweep is suspended are not attributed to it
+    sweep = make_indexable_sweep()
+    profile = sweep.enable_profiling()
+    for ps in sweep.generate(paramset):
+        ps.copy()
+        thread = threading.Thread(target=lambda: [paramset.copy()
+                                                  for _ in range(3)])
+        thread.start()
+        thread.join()
+    assert profile.copies == 18
+
+    # random access constructs each point on its own
+    sweep = make_indexable_sweep()
+    profile = sweep.enable_profiling()
+    for i in range(12):
+        sweep.point(paramset, i).copy()
+    assert profile.copies == 36
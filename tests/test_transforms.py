@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pickle
+
+import pytest
+
+from yccp import sweeps
+from yccp import utils as u
+
+t = sweeps.transforms
+
+
+def get_descriptions(paramset):
+    return [record["description"]
+            for record in paramset["_metainfo/transforms"]]
+
+
+def test_builtin_transforms(make_paramset):
+    paramset = make_paramset({"a": 1, "b": {"c": 2}, "s": "x"})
+    sweep = sweeps.Sweep()
+    sweep.add(t.SetValue(path_to="a", value=3))
+    sweep.add(t.AddValue(path_to="s", value="y"))
+    sweep.add(t.FactorValue(path_to="b/c", value=2))
+    sweep.add(t.ApplyFunction(path_from="a", path_to="d",
+                              function=lambda x: 2 * x))
+    sweep.add(t.CopyValue(path_from="b/c", path_to="e"))
+    sweep.add(t.DeleteValues(paths=["b"]))
+
+    ps, = sweep.generate(paramset)
+    assert {k: v for k, v in ps.data.items() if k != "_metainfo"} == {
+        "a": 3, "s": "xy", "d": 6, "e": 4}
+    assert get_descriptions(ps)[:3] == [
+        "Changed a to 3.", "Added y to s (x -> xy).",
+        "Multiplied b/c by 2 (2 -> 4)."]
+    assert paramset.data["b"] == {"c": 2}
+
+
+def test_delete_values(make_paramset):
+    paramset = make_paramset({"a": {"b": 1}})
+    t.DeleteValues(paths=["a/missing", "a/b"]).apply(paramset)
+    assert paramset["a"] == {}
+
+    with pytest.raises(KeyError):
+        t.DeleteValues(paths=["missing/b"]).apply(paramset)
+
+
+class LegacySetValue(t.SetValue):
+    """
+        Subclass implementing the stateful interface.
+    """
+
+    def modify(self, paramset):
+        u.set_recursive(paramset.data, self.prms["path_to"],
+                        10 * self.prms["value"])
+
+    def describe(self, paramset):
+        return "Set {} to ten times {}.".format(self.prms["path_to"],
+                                                self.prms["value"])
+
+
+class LegacyAddValue(t.AddValue):
+
+    def get_orig_value(self, paramset):
+        self.orig_value = 100
+
+
+class LegacyFactorValue(t.FactorValue):
+    """
+        Subclass implementing `modify` with the deprecated attributes.
+    """
+
+    def modify(self, paramset):
+        self.get_orig_value(paramset)
+        self.final_value = self.orig_value * self.prms["value"]
+        u.set_recursive(paramset.data, self.prms["path_to"],
+                        self.final_value)
+
+
+class LegacyApplyFunctionElaborate(t.ApplyFunctionElaborate):
+
+    def get_orig_value(self, paramset):
+        self.orig_values = {"x": paramset["a"] + 1}
+
+
+def test_stateful_subclasses(make_paramset):
+    paramset = make_paramset({"a": 0})
+    sweep = sweeps.Sweep()
+    sweep.add(sweeps.ranges.Range(LegacySetValue(path_to="a"), [1, 2]))
+    points = list(sweep.generate(paramset))
+    assert [ps["a"] for ps in points] == [10, 20]
+    assert get_descriptions(points[1]) == ["Set a to ten times 2."]
+    assert paramset["a"] == 0
+
+    transform = LegacyAddValue(path_to="a", value=1)
+    assert transform.apply(paramset)["a"] == 101
+    with pytest.warns(DeprecationWarning):
+        assert transform.final_value == 101
+
+    transform = LegacyApplyFunctionElaborate(path_to="b",
+                                             function=lambda x: 2 * x)
+    assert transform.apply(paramset)["b"] == 204
+    with pytest.warns(DeprecationWarning):
+        assert transform.orig_values == {"x": 102}
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_stateful_modify_uses_orig_value(make_paramset):
+    paramset = make_paramset({"a": 2, "b": 5})
+    transform = LegacyFactorValue(path_to="a", value=3)
+    assert transform.apply(paramset, record=False)["a"] == 6
+    assert transform.orig_value == 2
+
+    transform = LegacyFactorValue(path_to="a", path_from="b", value=3)
+    assert transform.apply_value(paramset, 2, record=False)["a"] == 10
+    assert (transform.orig_value, transform.final_value) == (5, 10)
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_stateful_modify_is_described_right_away(make_paramset):
+    paramset = make_paramset({"a": 2})
+    LegacyFactorValue(path_to="a", value=3).apply(paramset)
+
+    record, = paramset["_metainfo/transforms"]
+    # described from the deprecated attributes set by modify
+    assert type(record) is dict
+    assert record["description"] == "Multiplied a by 3 (2 -> 6)."
+    assert "Multiplied a by 3" in paramset.serialize()
+
+
+def test_builtin_transforms_are_stateless(make_paramset):
+    paramset = make_paramset({"a": 1, "b": 2})
+    transforms = [
+        t.AddValue(path_to="a", value=1),
+        t.FactorValue(path_to="a", path_from="b", value=3),
+        t.ApplyFunction(path_from="a", path_to="c", function=lambda x: -x),
+        t.ApplyFunctionElaborate(dict={"x": "a", "y": "b"}, path_to="d",
+                                 function=lambda x, y: x * y),
+    ]
+    for transform in transforms:
+        before = dict(vars(transform))
+        transform.apply(paramset)
+        assert vars(transform) == before
+    assert {k: paramset[k] for k in "abcd"} == \
+        {"a": 6, "b": 2, "c": -6, "d": 12}
+
+
+def test_records_capture_parameters(make_paramset):
+    paramset = make_paramset({"a": [1, 2]})
+    transform = t.ApplyFunction(path_from="a", path_to="b",
+                                function=lambda x: x + [3])
+    transform.apply(paramset)
+    set_value = t.SetValue(path_to="c", value=1)
+    set_value.apply(paramset)
+
+    record = paramset["_metainfo/transforms"][0]
+    # no references to the (possibly large) values
+    assert record.info == ("[1, 2]", "[1, 2, 3]")
+
+    transform.prms["path_to"] = "other"
+    set_value.set_value(2)
+    assert get_descriptions(paramset)[1] == "Changed c to 1."
+    assert " saved at b ([1, 2] -> [1, 2, 3])." in \
+        get_descriptions(paramset)[0]
+
+
+def test_records_are_pickled_unrendered(make_paramset):
+    paramset = make_paramset({"a": 0})
+    t.SetValue(path_to="a", value=1).apply(paramset)
+    t.ApplyFunction(path_from="a", path_to="b",
+                    function=lambda x: x + 1).apply(paramset)
+    fingerprint = paramset.fingerprint()
+
+    record, applied = pickle.loads(pickle.dumps(
+        paramset["_metainfo/transforms"]))
+    assert isinstance(record, t.Record)
+    assert record._description is None
+    assert (record.name, record.prms, record.value) == \
+        ("SetValue", {"path_to": "a"}, 1)
+    assert record["description"] == "Changed a to 1."
+    # lambdas cannot be pickled by reference
+    assert type(applied) is dict
+    assert "saved at b (1 -> 2)" in applied["description"]
+
+    # rendering does not change the fingerprint
+    get_descriptions(paramset)
+    assert paramset.fingerprint() == fingerprint
+
+
+def test_disable_provenance(make_paramset):
+    paramset = make_paramset({"a": 0, "b": 0})
+    sweep = sweeps.Sweep(record_provenance=False)
+    sweep.add(sweeps.ranges.Range(t.SetValue(path_to="a"), [1, 2]))
+    sweep.add(t.SetValue(path_to="b", value=1))
+
+    points = list(sweep.generate(paramset)) + [sweep.point(paramset, 1)]
+    assert [ps["a"] for ps in points] == [1, 2, 2]
+    assert all(ps["_metainfo/transforms"] == [] for ps in points)
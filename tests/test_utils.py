@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import copy
+import os
+import pickle
+
+import pytest
+
+from yccp import utils as u
+
+
+@pytest.mark.parametrize("path", [None, "", "/"])
+def test_root_path(path):
+    data = {"a": 1}
+    assert u.get_recursive(data, path) is data
+    assert u.retrieve_path(data, path) is data
+    assert u.compile_path(path).names == ()
+
+
+def test_paths():
+    data = {}
+    u.set_recursive(data, "a/0/b", 1)
+    u.set_recursive(data, "a/1", [2])
+    assert data == {"a": [{"b": 1}, [2]]}
+    assert u.get_recursive(data, "a/1/0") == 2
+    assert u.get_recursive(data, "a.0.b", sep=".") == 1
+    assert u.compile_path("a/0/b") is u.compile_path("a/0/b")
+
+    assert u.get_recursive(data, "c", default=3) == 3
+    with pytest.raises(KeyError):
+        u.get_recursive(data, "a/0/c")
+
+
+def test_layered_mapping():
+    bottom = {"a": {"x": 1, "y": [1, 2]}, "b": 1}
+    top = {"a": {"y": [3], "z": {"w": 1}}, "c": 2}
+    layered = u.LayeredMapping([bottom, top])
+
+    assert list(layered) == ["a", "b", "c"]
+    assert len(layered) == 3
+    assert isinstance(layered["a"], u.LayeredMapping)
+    # lists are replaced, not merged
+    assert layered["a"]["y"] == [3]
+    # mappings present in a single layer are returned as they are
+    assert layered["a"]["z"] is top["a"]["z"]
+    assert "x" in layered["a"] and "d" not in layered
+    with pytest.raises(KeyError):
+        layered["d"]
+
+    merged = u.update_dict_recursively(
+        u.update_dict_recursively({}, bottom), top)
+    assert layered.to_dict() == merged
+    assert dict(layered["a"]) == {"x": 1, "y": [3], "z": {"w": 1}}
+
+    with pytest.raises(ValueError):
+        u.LayeredMapping([bottom, {"a": 1}, {"a": {"x": 2}}])["a"]
+
+
+class CountingLazy(u.Lazy):
+
+    constructed = 0
+
+    def __init__(self, value):
+        super(CountingLazy, self).__init__()
+        self.value = value
+
+    def construct(self, deep):
+        CountingLazy.constructed += 1
+        if isinstance(self.value, dict):
+            partial = u.PartialDict(
+                (k, CountingLazy(v)) for k, v in self.value.items())
+            return u.materialize(partial) if deep else partial
+        elif isinstance(self.value, list):
+            partial = u.PartialList(CountingLazy(v) for v in self.value)
+            return u.materialize(partial) if deep else partial
+        return self.value
+
+
+def test_lazy():
+    CountingLazy.constructed = 0
+    lazy = CountingLazy({"a": [1, 2], "b": 3})
+
+    shallow = lazy.resolve(deep=False)
+    assert isinstance(shallow, u.PartialDict)
+    assert isinstance(shallow["a"], CountingLazy)
+    assert lazy.resolve(deep=False) is shallow
+    assert CountingLazy.constructed == 1
+
+    assert u.get_recursive(shallow, "a/1") == 2
+    assert isinstance(shallow["b"], CountingLazy)
+
+    # constructed values are reused when materializing
+    deep = lazy.resolve()
+    assert deep == {"a": [1, 2], "b": 3}
+    assert type(deep) is dict and type(deep["a"]) is list
+    assert lazy.resolve() is deep
+    assert CountingLazy.constructed == 5
+
+
+def test_partial_containers():
+    partial = u.PartialDict(a=CountingLazy([1, 2]), b=1)
+
+    # shallow copies share the placeholders, deep copies do not
+    shallow = copy.copy(partial)
+    assert type(shallow) is u.PartialDict
+    assert shallow["a"] is partial["a"]
+    deep = copy.deepcopy(partial)
+    assert type(deep) is u.PartialDict
+    assert deep["a"] is not partial["a"]
+
+    u.get_recursive(deep, "a").append(3)
+    assert u.materialize(deep) == {"a": [1, 2, 3], "b": 1}
+    assert u.materialize(partial) == {"a": [1, 2], "b": 1}
+
+    # pickled containers are materialized
+    assert type(pickle.loads(pickle.dumps(partial))) is dict
+    assert pickle.loads(pickle.dumps(partial)) == {"a": [1, 2], "b": 1}
+    assert pickle.loads(pickle.dumps(
+        u.PartialList([CountingLazy(1), 2]))) == [1, 2]
+
+
+
+def test_lru_cache():
+    cache = u.LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" was used least recently
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("b", default=0) == 0
+    assert cache.info() == (1, 2, 1, 2, 2)
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.info().hits == 1
+    cache.clear(counters=True)
+    assert cache.info() == (0, 0, 0, 2, 0)
+
+    uncached = u.LRUCache(maxsize=0)
+    uncached.put("a", 1)
+    assert uncached.get("a") is None
+    assert len(uncached) == 0
+
+
+def test_atomic_write(tmp_path):
+    filename = str(tmp_path / "file")
+    with u.atomic_write(filename) as f:
+        f.write(b"first")
+        assert not os.path.exists(filename)
+    with open(filename, "rb") as f:
+        assert f.read() == b"first"
+
+    # failed writes leave the file untouched and no temporary files behind
+    with pytest.raises(RuntimeError):
+        with u.atomic_write(filename, mode="w") as f:
+            f.write("second")
+            raise RuntimeError()
+    with open(filename, "rb") as f:
+        assert f.read() == b"first"
+    assert os.listdir(str(tmp_path)) == ["file"]
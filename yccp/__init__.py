@@ -7,6 +7,7 @@ __all__ = [
         "__version__"
         "dump",
         "load",
+        "load_many",
         "log",
         "rget",
         "rset",
@@ -19,6 +20,7 @@ from .prelude import dump
 from .prelude import load
 
 from . import sweeps
+from .sweeps.parametersets import load_many
 
 from .logcfg import log
 from .utils import get_recursive as rget
@@ -4,12 +4,20 @@
 
 
 from docopt import docopt
-from pprint import pprint
+import array
+import fnmatch
+import hashlib
 import itertools as it
+import os
 import os.path as osp
+import pickle
 import re
 import sys
+import time
 
+import numpy as np
+
+from .. import utils as u
 from ..version import __version__
 
 __all__ = [
@@ -20,17 +28,31 @@ __doc__ = \
 """
 Usage:
     {prgm} [-v] [-R] [-f KEY]... [-l KEY]... [-r KEY]... FILENAME...
+    {prgm} [-v] [-R] [-z] [-f KEY]... [-l KEY]... [-r KEY]... --stdin
+    {prgm} [-v] [-R] [-z] [-f KEY]... [-l KEY]... [-r KEY]... [-p PATTERN]
+        [--no-cache] --walk DIR
     {prgm} -h | --help
     {prgm} --version
 
     Receives a bunch of FILENAMEs and sorts them according to the numbers
     contained in key-number pairs in the filename. A pair has the form
     <KEY>_<NUM>. Several pairs are conjoined by "-". NUM can be integers or
-    floats (in regular or scientific notation).
+    floats (in regular or scientific notation). Words (e.g. "on"/"off") are
+    sorted alphabetically after all numbers.
 
     This script was written to sort the result-plots of parameter-sweeps
     in different orders before viewing them.
 
+    With --stdin, filenames are read from stdin (one per line) instead of the
+    command line, which avoids the limit on the length of the command line
+    for large sweeps. Each filename is parsed only once, the sorted names are
+    streamed to stdout.
+
+    With --walk, all files below DIR are sorted. Keys are parsed from the
+    folder and file names (without extension) as generated by the namers of
+    a sweep. The parsed index is cached on disk and only rebuilt if a folder
+    in DIR changed, so that repeated sorts in different orders are fast.
+
 Options:
     -h --help         Show this help.
 
@@ -47,44 +69,80 @@ Options:
 
     -l --last KEY     Sort by KEY last (in order of specification).
 
+    -s --stdin        Read filenames from stdin.
+
+    -z --null         Filenames read from stdin and written to stdout are
+                      separated by NUL instead of newline (see `find -print0`).
+
+    -w --walk DIR     Sort all files below DIR.
+
+    -p --pattern PATTERN
+                      Only sort files whose names match PATTERN (e.g. "*.png").
+
+    --no-cache        Do not use the on-disk cache of parsed folders.
+
 """.format(prgm=osp.basename(sys.argv[0]))
 
 _matcher = re.compile("([^-/]+?)_(\d+\.?\d*(?:e(?:\+|-|)\d+)?|[A-Za-z]+)(?:-|$|/)")
 
+# file extensions (numbers like "_1.5" are no extensions)
+_extension = re.compile(r"\.[A-Za-z][A-Za-z0-9]*$")
+
+# folders modified less than this many seconds ago are not cached since a
+# later modification might not change their mtime
+racy_interval = 2.
+
+
+# version of the cached FilenameIndex format
+cache_format = 2
+
+
+def _to_number(v):
+    """
+        Convert v to float, words (e.g. "on"/"off") are kept as strings.
+    """
+    try:
+        return float(v)
+    except ValueError:
+        return v
+
+
+def _sort_value(v):
+    # numbers come before words, words are sorted alphabetically
+    if isinstance(v, str):
+        return (1, 0., v)
+    else:
+        return (0, v, "")
+
+
+def get_ranks(values):
+    """
+        Return a dictionary mapping all distinct values (numbers or words) to
+        their rank in sorted order.
+    """
+    return {v: i for i, v in enumerate(sorted(set(values), key=_sort_value))}
+
+
+def parse_numbers(filename):
+    return {k: _to_number(v) for k, v in _matcher.findall(filename)}
+
+
 def parse_filenames_for_numbers(filenames):
     retval = {}
     for fn in filenames:
-        fn_nums = retval[fn] = {}
-        for k,v in _matcher.findall(fn):
-            try:
-                v = float(v)
-            except ValueError:
-                v = hash(v)
-            fn_nums[k] = v
+        retval[fn] = parse_numbers(fn)
     return retval
 
 def get_order(filename):
     return [m[0] for m in _matcher.findall(filename)]
 
-def sort_filename(filenames, first=[], last=[],
-        reverse=[], reverse_all=False, verbose=False):
-    # matcher = re.compile("([^-/_]+?)_(\d+\.?\d*(?:e(?:\+|-|)\d+)?)(?:-|$|/)")
-    # fn_to_nums = {fn: {k: (float(v) if len(v) > 0 else 0.) for k,v in matcher.findall(fn)}\
-            # for fn in filenames}
-    fn_to_nums = parse_filenames_for_numbers(filenames)
 
-    if verbose:
-        print(fn_to_nums)
-
-    num_numbers = list(map(len, iter(fn_to_nums.values())))
-    assert min(num_numbers) == max(num_numbers), "Amount of numbers varies"
-
-    key_set = set()
-    for fnk in fn_to_nums.values():
-        key_set.update(iter(fnk.keys()))
-
-    assert len(key_set) == min(num_numbers),\
-        "Key values are not the same accross filenames" 
+def get_sort_order(keys, first=[], last=[]):
+    """
+        Return the order in which to sort by `keys` (as found in the first
+        filename) after moving `first` to the front and `last` to the end.
+    """
+    key_set = set(keys)
 
     assert len(set(first).union(last)) == len(first+last),\
         "Duplicates found in first and last."
@@ -94,33 +152,337 @@ def sort_filename(filenames, first=[], last=[],
         raise ValueError("Unknown keys: {}".format(
             ", ".join(set_firstlast-key_set)))
 
-    reverse_key = {k: reverse_all for k in key_set}
+    order = list(keys)
+
+    # remove items from the order that are specified
+    for v in it.chain(first, last):
+        order.remove(v)
 
+    return first + order + last
+
+
+def get_reverse_keys(keys, reverse=[], reverse_all=False):
+    reverse_key = {k: reverse_all for k in keys}
     for rk in reverse:
         reverse_key[rk] = not reverse_key[rk]
+    return reverse_key
 
-    order = get_order(filenames[0])
 
-    # remove items from the order that are specified
-    for v in it.chain(first, last):
-        order.remove(v)
+def sort_filename(filenames, first=[], last=[],
+        reverse=[], reverse_all=False, verbose=False):
+    """
+        Sort filenames by a single composite key (every filename is parsed
+        once).
+    """
+    fn_to_nums = parse_filenames_for_numbers(filenames)
+
+    if verbose:
+        print(fn_to_nums)
 
-    order = first + order + last
+    num_numbers = list(map(len, iter(fn_to_nums.values())))
+    assert min(num_numbers) == max(num_numbers), "Amount of numbers varies"
+
+    key_set = set()
+    for fnk in fn_to_nums.values():
+        key_set.update(iter(fnk.keys()))
+
+    assert len(key_set) == min(num_numbers),\
+        "Key values are not the same accross filenames"
+
+    order = get_sort_order(list(dict.fromkeys(get_order(filenames[0]))),
+                           first, last)
+    reverse_key = get_reverse_keys(key_set, reverse, reverse_all)
 
     if verbose:
         print("Final order:", order)
 
-    for i in range(-1, -len(order)-1, -1):
-        filenames = sorted(filenames, key=lambda fn: fn_to_nums[fn][order[i]],
-                reverse=reverse_key[order[i]])
+    # negating the ranks of reversed keys keeps the sort stable (identical
+    # to successive stable sorts by every key)
+    signs = [-1 if reverse_key[k] else 1 for k in order]
+    ranks = [get_ranks(nums[k] for nums in fn_to_nums.values())
+             for k in order]
+
+    def composite_key(fn):
+        nums = fn_to_nums[fn]
+        return tuple(sign * rank[nums[k]]
+                     for sign, rank, k in zip(signs, ranks, order))
+
+    return sorted(filenames, key=composite_key)
+
+
+class FilenameIndex(object):
+    """
+        Compact index of many filenames and the numbers they contain.
+
+        Filenames are stored as bytes in a single buffer and the numbers in
+        one array per key, so that millions of filenames can be sorted with
+        little memory overhead. Words (non-numeric values) are stored
+        separately per key.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array.array("q", [0])
+        # key names in order of appearance in the first filename
+        self.keys = None
+        self.values = None
+        # per key: index of filename -> word
+        self.words = None
+        self._positions = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def add(self, filename, nums=None):
+        """
+            Add filename (bytes) with its already parsed numbers (if given).
+        """
+        if nums is None:
+            nums = parse_numbers(filename.decode("utf-8", "surrogateescape"))
+        if self.keys is None:
+            self.keys = list(nums)
+            self.values = [array.array("d") for _ in self.keys]
+            self.words = [{} for _ in self.keys]
+            self._positions = {k: i for i, k in enumerate(self.keys)}
+
+        if len(nums) != len(self.keys)\
+                or any(k not in self._positions for k in nums):
+            raise ValueError("Key values are not the same accross filenames: "
+                             "{}".format(filename.decode("utf-8", "replace")))
+
+        for k, v in nums.items():
+            position = self._positions[k]
+            if isinstance(v, str):
+                self.words[position][len(self)] = v
+                v = 0.
+            self.values[position].append(v)
+
+        self.buffer.extend(filename)
+        self.offsets.append(len(self.buffer))
+
+    def argsort(self, first=[], last=[], reverse=[], reverse_all=False):
+        """
+            Return the indices of all filenames in sorted order (stable).
+        """
+        if len(self) == 0:
+            return np.arange(0)
+        order = get_sort_order(self.keys, first, last)
+        reverse_key = get_reverse_keys(self.keys, reverse, reverse_all)
+
+        columns = []
+        for k in order:
+            position = self._positions[k]
+            sign = -1 if reverse_key[k] else 1
+            words = self.words[position]
+            if len(words) > 0:
+                # sort words after all numbers (by their rank)
+                ranks = get_ranks(words.values())
+                column = np.zeros(len(self))
+                column[list(words)] = [ranks[w] + 1 for w in words.values()]
+                columns.append(sign * column)
+            column = np.frombuffer(self.values[position], dtype=np.float64)
+            columns.append(sign * column)
+        # lexsort sorts by the last key first
+        return np.lexsort(columns[::-1])
+
+    def get(self, index):
+        return bytes(self.buffer[self.offsets[index]:self.offsets[index+1]])
+
+    def write(self, stream, indices, sep=b"\n", prefix=b""):
+        """
+            Write the filenames with the given indices to the binary stream.
+        """
+        view = memoryview(self.buffer)
+        offsets = self.offsets
+        for index in indices:
+            stream.write(prefix)
+            stream.write(view[offsets[index]:offsets[index+1]])
+            stream.write(sep)
+
+
+def read_filenames(stream, sep=b"\n", chunksize=2**20):
+    """
+        Iterate over all `sep`-separated filenames (bytes) in the binary
+        stream without reading it at once (empty names are skipped).
+    """
+    remainder = b""
+    while True:
+        chunk = stream.read(chunksize)
+        if len(chunk) == 0:
+            break
+        parts = (remainder + chunk).split(sep)
+        remainder = parts.pop()
+        for part in parts:
+            if len(part) > 0:
+                yield part
+    if len(remainder) > 0:
+        yield remainder
+
+
+def sort_stream(instream, outstream, sep=b"\n", first=[], last=[],
+                reverse=[], reverse_all=False, verbose=False):
+    """
+        Read filenames from the binary instream and write them sorted to the
+        binary outstream.
+    """
+    index = FilenameIndex()
+    for filename in read_filenames(instream, sep=sep):
+        index.add(filename)
+
+    if verbose:
+        print("Read {} filenames with keys: {}".format(
+            len(index), index.keys), file=sys.stderr)
+
+    index.write(outstream, index.argsort(first=first, last=last,
+                                         reverse=reverse,
+                                         reverse_all=reverse_all), sep=sep)
+
+
+def index_tree(root, pattern=None):
+    """
+        Walk the directory tree below root and return (index, folders).
+
+        index is a FilenameIndex of the paths of all files relative to root,
+        keys are parsed from folder and file names (without extension).
+        Hidden entries and files without key-number pairs are skipped.
+
+        folders maps all visited folders to their modification time.
+    """
+    index = FilenameIndex()
+    folders = {}
+    stack = [""]
+    while len(stack) > 0:
+        folder = stack.pop()
+        path = osp.join(root, folder)
+        # stat before scanning so that concurrent modifications invalidate
+        # the cached index
+        folders[folder] = os.stat(path).st_mtime_ns
+        with os.scandir(path) as scanned:
+            entries = sorted(scanned, key=lambda e: e.name)
+
+        subfolders = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            relpath = folder + "/" + entry.name if folder else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                subfolders.append(relpath)
+            elif entry.is_file() and (pattern is None
+                                      or fnmatch.fnmatch(entry.name, pattern)):
+                nums = parse_numbers(_extension.sub("", relpath))
+                if len(nums) > 0:
+                    index.add(os.fsencode(relpath), nums)
+        # depth-first in alphabetical order
+        stack.extend(reversed(subfolders))
+
+    return index, folders
+
+
+def get_cache_filename(root, pattern=None, cache_folder=None):
+    if cache_folder is None:
+        cache_folder = osp.join(
+            os.environ.get("XDG_CACHE_HOME", osp.expanduser("~/.cache")),
+            "yccp", "sbn")
+    key = repr((osp.abspath(root), pattern))
+    return osp.join(cache_folder, hashlib.sha1(
+        key.encode("utf-8", "surrogateescape")).hexdigest() + ".pickle")
+
+
+def load_index(root, pattern=None, cache_folder=None, use_cache=True,
+               verbose=False):
+    """
+        Return the FilenameIndex of all files below root (see `index_tree`).
+
+        The parsed index is cached on disk (in cache_folder, by default
+        ~/.cache/yccp/sbn) and only rebuilt if any folder in the tree was
+        modified (i.e. files were added, removed or renamed).
+    """
+    if not use_cache:
+        return index_tree(root, pattern)[0]
+
+    filename = get_cache_filename(root, pattern, cache_folder)
+    index = _read_cached_index(filename, root, pattern)
+    if index is not None:
         if verbose:
-            print(">> Filenames after sorting by:", order[i])
-            pprint(filenames)
+            print("Using cached index {}".format(filename), file=sys.stderr)
+        return index
+
+    index, folders = index_tree(root, pattern)
+    _write_cached_index(filename, root, pattern, index, folders)
+    return index
+
+
+def _get_cache_header(root, pattern, folders):
+    return {
+        "version": __version__,
+        "format": cache_format,
+        "root": osp.abspath(root),
+        "pattern": pattern,
+        "folders": folders,
+    }
+
+
+def _read_cached_index(filename, root, pattern):
+    try:
+        with open(filename, "rb") as f:
+            # validate before unpickling the (large) index
+            header = pickle.load(f)
+            if header != _get_cache_header(root, pattern, header["folders"]):
+                return None
+            for folder, mtime in header["folders"].items():
+                if os.stat(osp.join(root, folder)).st_mtime_ns != mtime:
+                    return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print("Ignoring broken cache entry {}: {}".format(filename, e),
+              file=sys.stderr)
+        return None
+
+
+def _write_cached_index(filename, root, pattern, index, folders):
+    if time.time() - max(folders.values()) * 1e-9 < racy_interval:
+        return
+    try:
+        os.makedirs(osp.dirname(filename), exist_ok=True)
+        with u.atomic_write(filename) as f:
+            pickle.dump(_get_cache_header(root, pattern, folders), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print("Could not cache index of {}: {}".format(root, e),
+              file=sys.stderr)
 
-    return filenames
 
 def main():
     args = docopt(__doc__, version=__version__)
+    sep = b"\0" if args["--null"] else b"\n"
+
+    if args["--walk"] is not None:
+        root = args["--walk"]
+        index = load_index(root, pattern=args["--pattern"],
+                           use_cache=not args["--no-cache"],
+                           verbose=args["--verbose"])
+        if args["--verbose"]:
+            print("Found {} files with keys: {}".format(
+                len(index), index.keys), file=sys.stderr)
+        index.write(sys.stdout.buffer,
+                    index.argsort(first=args["--first"], last=args["--last"],
+                                  reverse=args["--reverse"],
+                                  reverse_all=args["--reverse-all"]),
+                    sep=sep, prefix=os.fsencode(osp.join(root, "")))
+        sys.stdout.buffer.flush()
+        return
+
+    if args["--stdin"]:
+        sort_stream(sys.stdin.buffer, sys.stdout.buffer, sep=sep,
+                    first=args["--first"], last=args["--last"],
+                    reverse=args["--reverse"],
+                    reverse_all=args["--reverse-all"],
+                    verbose=args["--verbose"])
+        sys.stdout.buffer.flush()
+        return
 
     for filename in sort_filename(args["FILENAME"],
             first=args["--first"], last=args["--last"],
@@ -8,6 +8,7 @@
 import copy
 import functools as ft
 import logging
+import types
 from pprint import pformat as pf
 
 from . import utils as u
@@ -42,12 +43,18 @@ class InheritDefaults(type):
 
         Note #2: In order to avoid possible naming conflicts, names of all
         attributes used by the meta-class can be customized if needed.
+
+        Note #3: The default parameters are snapshotted when the class is
+        created (see `_freeze_defaults`), instantiation only copies mutable
+        defaults and supplied parameters. Hence, modifications of
+        `default_parameters` after class creation have no effect.
     """
 
     attr_defaults = "default_parameters"
     attr_discard = "discard_parameters"
     attr_parameters = "prms"
     attr_nonrec_update = "_no_recursive_update"
+    attr_frozen_defaults = "_frozen_defaults"
 
     func_get_parameters = "_get_updated_parameters"
 
@@ -112,6 +119,7 @@ class InheritDefaults(type):
         mcs.update_init_if_needed(name, bases, dct)
 
         dct[mcs.attr_defaults] = updated_defaults
+        dct[mcs.attr_frozen_defaults] = _freeze_defaults(updated_defaults)
         dct[mcs.func_get_parameters] = classmethod(_get_updated_parameters)
         dct[mcs.attr_nonrec_update] = list(all_nonrec_updates)
 
@@ -154,6 +162,32 @@ class InheritDefaults(type):
         dct["__init__"] = wrapped_init
 
 
+# types whose instances can be shared between all instances of a class
+_immutable_types = frozenset([
+    type(None), bool, int, float, complex, str, bytes, type,
+    types.FunctionType, types.BuiltinFunctionType,
+])
+
+
+def _is_immutable(value):
+    if type(value) in (tuple, frozenset):
+        return all(_is_immutable(v) for v in value)
+    return type(value) in _immutable_types
+
+
+def _freeze_defaults(defaults):
+    """
+        Snapshot the default parameters of a class.
+
+        Returns (frozen, mutable) where frozen is a deep copy of defaults whose
+        immutable values can be shared by all instances and mutable lists the
+        keys whose values have to be copied for every instance.
+    """
+    frozen = copy.deepcopy(defaults)
+    mutable = tuple(k for k, v in frozen.items() if not _is_immutable(v))
+    return frozen, mutable
+
+
 def _get_updated_parameters(cls, parameters):
     """
         Updates the default parameters with the parameters in `parameters`,
@@ -162,24 +196,34 @@ def _get_updated_parameters(cls, parameters):
 
         Returns the updated dictionary.
     """
+    mcs = cls.__class__
     if log.getEffectiveLevel() <= logging.DEBUG:
         log.debug("Supplied parameters for {}:\n".format(
             cls.__name__) + pf(parameters))
-    # get a deep-copy of the default parameters to be updated
-    prms = copy.deepcopy(getattr(
-        cls, cls.__class__.attr_defaults))
+
+    frozen, mutable = getattr(cls, mcs.attr_frozen_defaults)
+
+    # immutable defaults are shared, mutable ones copied unless they are
+    # replaced anyway
+    prms = frozen.copy()
+    for k in mutable:
+        if k not in parameters:
+            prms[k] = copy.deepcopy(frozen[k])
 
     not_recursively_updated_attributes = getattr(
-        cls, cls.__class__.attr_nonrec_update, set())
+        cls, mcs.attr_nonrec_update, set())
 
     # update the default parameters with whatever was proved
-    for k, v in copy.deepcopy(parameters).items():
-        if k in prms:
+    for k, v in parameters.items():
+        if k in frozen:
             if isinstance(v, dict)\
                     and k not in not_recursively_updated_attributes:
-                u.update_dict_recursively(prms[k], v)
-            else:
+                prms[k] = u.update_dict_recursively(
+                    copy.deepcopy(frozen[k]), v)
+            elif _is_immutable(v):
                 prms[k] = v
+            else:
+                prms[k] = copy.deepcopy(v)
         else:
             warning = "Parameter-Mismatch: "\
                 + "`{0}` no parameter of class {1}!".format(
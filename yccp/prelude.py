@@ -8,21 +8,41 @@
 
 
 __all__ = [
+        "ArrayStore",
+        "ExpressionCache",
+        "LazyDocument",
+        "LazyNode",
+        "ReactivePrelude",
         "YccpDumper",
         "YccpLoader",
         "dump",
+        "expression_cache",
         "load",
+        "load_reactive",
     ]
 
 
+import ast
+import collections as c
+import copy
+import hashlib
+import itertools as it
+import os
+import os.path as osp
+import threading
+
 import numpy as np
 import yaml
 
+from . import utils as u
+from .utils import LayeredMapping
+from .utils import set_recursive
+
 # if available, load c-based implementaiton
 try:
-    from yaml import CLoader as YccpLoader, CDumper as YccpDumper
+    from yaml import CLoader as BaseLoader, CDumper as YccpDumper
 except ImportError:
-    from yaml import Loader as YccpLoader, Dumper as YccpDumper
+    from yaml import Loader as BaseLoader, Dumper as YccpDumper
 
 
 ########
@@ -32,6 +52,8 @@ yccp_tags = {
     "eval": ["!eval", "!ee"],
     "get":  ["!get",  "!cc"],
 }
+# externalized NumPy arrays
+tag_npy = "!npy"
 # "__prelude__" used to be called "cache" → keep it for backwards compatability
 default_prelude_attr = ["__prelude__", "cache"]
 
@@ -65,14 +87,67 @@ class RawPreludeEntry(object):
         return dumper.represent_scalar("!get", self.expression)
 
 
+class ExpressionCache(object):
+    """
+        Bounded LRU-cache of compiled code objects keyed by expression text.
+
+        Sweeps usually consist of many near-identical files, this way each
+        expression only needs to be compiled once. The cache is shared by all
+        loaders and can be used from several threads.
+    """
+
+    Info = u.LRUCache.Info
+
+    def __init__(self, maxsize=1024):
+        """
+            If maxsize is 0, nothing will be cached.
+        """
+        self._code = u.LRUCache(maxsize)
+
+    @property
+    def maxsize(self):
+        return self._code.maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        self._code.maxsize = maxsize
+
+    def clear(self):
+        """
+            Remove all cached code objects and reset all counters.
+        """
+        self._code.clear(counters=True)
+
+    def compile(self, expression):
+        """
+            Return the compiled code object for `expression`.
+        """
+        code = self._code.get(expression)
+        if code is None:
+            # like eval(str), ignore leading spaces and tabs
+            code = compile(expression.lstrip(" \t"), "<yccp-expression>",
+                           "eval")
+            self._code.put(expression, code)
+        return code
+
+    def info(self):
+        """
+            Return hit/miss/eviction counters as well as the current size.
+        """
+        return self._code.info()
+
+
+expression_cache = ExpressionCache()
+
+
 class ExpressionEvaluatorWithPrelude(object):
     """
         Evaluate python expressions in the context of a prelude.
     """
 
     class Prelude(object):
-        def __init__(self):
-            self._data = {}
+        def __init__(self, data=None):
+            self._data = {} if data is None else data
 
         def add(self, name, value):
             self._data[name] = value
@@ -98,7 +173,22 @@ class ExpressionEvaluatorWithPrelude(object):
         self.prelude.dump(dct)
 
     def prelude_empty(self):
-        self.prelude = self.Prelude()
+        self.prelude_attach({})
+
+    def prelude_attach(self, dct):
+        """
+            Use `dct` as storage for the prelude (modifications to the prelude
+            are reflected in `dct` and vice versa).
+        """
+        self.prelude = self.Prelude(dct)
+        # namespaces are only built once, every evaluation gets a copy so
+        # that names bound by one expression do not leak into the next
+        self.eval_globals = {"np": np}
+        self.eval_locals = {
+                "get": self.prelude,
+                # provide cc for backwards compatibility
+                "cc": self.prelude
+            }
 
     def enable(self):
         self.evaluate = True
@@ -107,17 +197,14 @@ class ExpressionEvaluatorWithPrelude(object):
         self.evaluate = False
 
     def eval(self, value):
-        if isinstance(value, (RawExpression, RawPreludeEntry)):
+        if isinstance(value, RawPreludeEntry):
+            return getattr(self.prelude, value.expression)
+        if isinstance(value, RawExpression):
             value = value.expression
         if not isinstance(value, str):
             return value
-        eval_globals = {"np": np}
-        eval_locals = {
-                "get": self.prelude,
-                # provide cc for backwards compatibility
-                "cc": self.prelude
-            }
-        return eval(value, eval_globals, eval_locals)
+        return eval(expression_cache.compile(value),
+                    dict(self.eval_globals), dict(self.eval_locals))
 
     def __call__(self, loader, node):
         value = loader.construct_scalar(node)
@@ -134,13 +221,424 @@ class ExpressionEvaluatorWithPrelude(object):
         return value
 
 
-evaluate_expression = ExpressionEvaluatorWithPrelude()
+def get_references(value):
+    """
+        Return the names of all prelude entries that `value` (as it would be
+        passed to `ExpressionEvaluatorWithPrelude.eval`) references via
+        `get.<name>` (or `cc.<name>`).
+
+        Note: Dynamic lookups such as `getattr(get, name)` are not detected.
+    """
+    if isinstance(value, RawPreludeEntry):
+        return frozenset([value.expression])
+    if isinstance(value, RawExpression):
+        value = value.expression
+    if not isinstance(value, str):
+        return frozenset()
+    tree = ast.parse(value, mode="eval")
+    return frozenset(
+        node.attr for node in ast.walk(tree)
+        if isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Name)
+        and node.value.id in ("get", "cc"))
+
+
+def is_expression(value):
+    return isinstance(value, (RawExpression, RawPreludeEntry))
+
+
+class ReactivePrelude(object):
+    """
+        Keep the verbatim expressions of a loaded document together with the
+        prelude entries they reference.
+
+        Whenever a prelude value changes, only the prelude entries and
+        expressions in the document that depend on it (directly or
+        indirectly) are re-evaluated.
+
+        The evaluated values themselves are stored in the document, the
+        evaluated prelude under `name_prelude`.
+    """
+
+    def __init__(self, name_prelude, prelude_expressions=None,
+                 document_expressions=None):
+        """
+            prelude_expressions:
+                Ordered dictionary mapping prelude names to (raw value,
+                references), in order of evaluation.
+
+            document_expressions:
+                Dictionary mapping paths in the document to (raw value,
+                references).
+        """
+        self.name_prelude = name_prelude
+        self.prelude_expressions = c.OrderedDict(prelude_expressions or {})
+        self.document_expressions = dict(document_expressions or {})
+        self._shared = False
+
+    @classmethod
+    def from_verbatim(cls, data, name_prelude=default_prelude_attr):
+        """
+            Set up from a verbatim-loaded document. The prelude is removed from
+            `data` and all expressions are evaluated in place.
+
+            Returns the evaluated data and the ReactivePrelude.
+        """
+        if not isinstance(name_prelude, list):
+            name_prelude = [name_prelude]
+
+        name_prelude_found = name_prelude[-1]
+        prelude = None
+        for name in name_prelude:
+            if name in data:
+                name_prelude_found = name
+                prelude = data.pop(name)
+                break
+
+        if prelude is None:
+            prelude = []
+        elif isinstance(prelude, dict):
+            prelude = [prelude]
+        elif not (isinstance(prelude, list)
+                  and all((isinstance(v, dict) for v in prelude))):
+            raise ValueError(
+                "The {} attribute needs to be either a dictionary or a "
+                "list of dictionaries".format(name_prelude_found))
+
+        reactive = cls(name_prelude_found)
+        for dct in prelude:
+            for k, v in dct.items():
+                reactive.prelude_expressions[k] = (v, get_references(v))
+
+        reactive.document_expressions = {
+            path: (v, get_references(v))
+            for path, v in iter_expressions(data)}
+
+        data[name_prelude_found] = {}
+        reactive.evaluate(data)
+        return data, reactive
+
+    def copy(self):
+        """
+            Return a copy (the expressions are shared until either copy is
+            modified).
+        """
+        cp = self.__class__(self.name_prelude)
+        cp.prelude_expressions = self.prelude_expressions
+        cp.document_expressions = self.document_expressions
+        self._shared = cp._shared = True
+        return cp
+
+    def evaluate(self, data, changed=None, setter=None):
+        """
+            Evaluate all prelude entries and expressions in `data` that depend
+            on any of the prelude names in `changed` (everything if None).
+
+            Evaluated values are stored via `setter(path, value)` (defaults to
+            setting them in `data` directly).
+
+            Returns the number of evaluated expressions.
+        """
+        if setter is None:
+            setter = lambda path, value: set_recursive(data, path, value)
+
+        # evaluate on a copy of the prelude in case `data` is shared
+        prelude = dict(data[self.name_prelude])
+        evaluator = ExpressionEvaluatorWithPrelude()
+        evaluator.prelude_attach(prelude)
+
+        if changed is not None:
+            changed = set(changed)
+        count = 0
+
+        for name, (raw, references) in self.prelude_expressions.items():
+            if changed is None or references & changed:
+                value = evaluator.eval(raw)
+                evaluator.prelude_add(name, value)
+                setter("{}/{}".format(self.name_prelude, name), value)
+                count += 1
+                if changed is not None:
+                    changed.add(name)
+
+        for path, (raw, references) in self.document_expressions.items():
+            if changed is None or references & changed:
+                setter(path, evaluator.eval(raw))
+                count += 1
+
+        return count
+
+    def set(self, data, path, setter=None):
+        """
+            Notify that the value at `path` in `data` was set explicitly.
+
+            Expressions at (or below/above) `path` are now literal values and
+            hence are forgotten. If `path` points into the prelude, everything
+            depending on the changed entries is re-evaluated (see `evaluate`
+            for `setter`).
+        """
+        self.set_many(data, [path], setter=setter)
+
+    def set_many(self, data, paths, setter=None):
+        """
+            Like `set` for several paths, dependent expressions are evaluated
+            only once.
+        """
+        changed = None
+        for path in paths:
+            path = str(path).strip("/")
+            split = path.split("/")
+
+            if split[0] == self.name_prelude:
+                self._unshare()
+                if changed is None:
+                    changed = set()
+                if len(split) == 1:
+                    changed.update(self.prelude_expressions)
+                    changed.update(data[self.name_prelude])
+                    self.prelude_expressions.clear()
+                else:
+                    changed.add(split[1])
+                    self.prelude_expressions.pop(split[1], None)
+            else:
+                forget = [expression_path
+                          for expression_path in self.document_expressions
+                          if expression_path == path
+                          or expression_path.startswith(path + "/")
+                          or path.startswith(expression_path + "/")]
+                if len(forget) > 0:
+                    self._unshare()
+                    for expression_path in forget:
+                        del self.document_expressions[expression_path]
+
+        if changed is not None:
+            self.evaluate(data, changed, setter=setter)
+
+    def _unshare(self):
+        if self._shared:
+            self.prelude_expressions = c.OrderedDict(self.prelude_expressions)
+            self.document_expressions = dict(self.document_expressions)
+            self._shared = False
+
+
+def iter_expressions(data, path=None):
+    """
+        Iterate over all (path, expression) pairs in a verbatim-loaded
+        document.
+    """
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = enumerate(data)
+    else:
+        return
+    for k, v in items:
+        subpath = str(k) if path is None else "{}/{}".format(path, k)
+        if is_expression(v):
+            yield subpath, v
+        else:
+            for item in iter_expressions(v, subpath):
+                yield item
+
+
+class YccpLoader(BaseLoader):
+    """
+        Loader that resolves our custom tags.
+
+        Every loader carries its own evaluator (and hence its own prelude) so
+        that several documents can be loaded concurrently.
+    """
+
+    def __init__(self, stream, evaluator=None, folder=None):
+        """
+            Externalized arrays (`!npy`) are loaded relative to `folder`
+            (defaults to the folder of the file `stream` was opened from).
+        """
+        super(YccpLoader, self).__init__(stream)
+        if evaluator is None:
+            evaluator = ExpressionEvaluatorWithPrelude()
+        self.evaluator = evaluator
+        if folder is None:
+            name = getattr(stream, "name", None)
+            folder = osp.dirname(name) if isinstance(name, str) else ""
+        self.folder = folder
+
+
+class LazyDocument(object):
+    """
+        Loader shared by all `LazyNode`s of a lazily loaded document.
+
+        The loader is kept alive as long as there are LazyNodes that were not
+        constructed yet and disposed afterwards.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.lock = threading.RLock()
+        # unconstructed LazyNodes (plus one held while loading)
+        self.pending = 1
+
+    def acquire(self):
+        with self.lock:
+            self.pending += 1
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+            if self.pending == 0:
+                self.loader.dispose()
+                self.loader = None
+
+
+class LazyNode(u.Lazy):
+    """
+        Part of a lazily loaded document that is constructed from its node
+        (and expressions therein evaluated) only when accessed.
+
+        All LazyNodes of a document share its `LazyDocument` (and hence the
+        loader with the evaluated prelude).
+    """
+
+    __slots__ = ["document", "node", "lock"]
+
+    # tagged scalars constructed lazily
+    lazy_tags = frozenset(it.chain([tag_npy], *yccp_tags.values()))
+
+    def __init__(self, document, node):
+        super(LazyNode, self).__init__()
+        document.acquire()
+        self.document = document
+        self.node = node
+        # kept after construction
+        self.lock = document.lock
+
+    def resolve(self, deep=True):
+        with self.lock:
+            return super(LazyNode, self).resolve(deep)
+
+    def construct(self, deep):
+        loader = self.document.loader
+        try:
+            value = construct_lazily(self.document, self.node, deep=deep)
+        except Exception:
+            # the loader only resets its state after successful
+            # constructions
+            loader.constructed_objects = {}
+            loader.recursive_objects = {}
+            loader.deep_construct = False
+            raise
+        document, self.document, self.node = self.document, None, None
+        document.release()
+        return value
+
+    def duplicate(self):
+        with self.lock:
+            if self.node is None:
+                # constructed in the meantime
+                return copy.deepcopy(self.resolve(deep=False))
+            return LazyNode(self.document, self.node)
+
+
+def construct_lazily(document, node, deep=False):
+    """
+        Construct node (of the given `LazyDocument`) one level deep: Values
+        that are collections or expressions are replaced by `LazyNode`s.
+
+        Mappings with merge keys and custom tags are constructed as a whole.
+    """
+    loader = document.loader
+    if deep:
+        return loader.construct_document(node)
+
+    if isinstance(node, yaml.MappingNode)\
+            and node.tag == "tag:yaml.org,2002:map"\
+            and all(key.tag != "tag:yaml.org,2002:merge"
+                    for key, _ in node.value):
+        retval = u.PartialDict()
+        for key_node, value_node in node.value:
+            retval[loader.construct_document(key_node)] =\
+                _construct_lazy_value(document, value_node)
+        return retval
+
+    elif isinstance(node, yaml.SequenceNode)\
+            and node.tag == "tag:yaml.org,2002:seq":
+        return u.PartialList(_construct_lazy_value(document, item)
+                             for item in node.value)
+
+    return loader.construct_document(node)
+
+
+def _construct_lazy_value(document, node):
+    if isinstance(node, yaml.ScalarNode)\
+            and node.tag not in LazyNode.lazy_tags:
+        return document.loader.construct_document(node)
+    return LazyNode(document, node)
+
+
+def construct_expression(loader, node):
+    return loader.evaluator(loader, node)
+
+
+def construct_npy(loader, node):
+    """
+        Memory-map an externalized array read-only, so that several processes
+        loading the same file share its pages.
+    """
+    return np.load(osp.join(loader.folder, loader.construct_scalar(node)),
+                   mmap_mode="r")
+
+
+class ArrayStore(object):
+    """
+        Writes NumPy arrays of at least `threshold` bytes to side-car .npy
+        files (in `subfolder` of `folder`) when dumping.
+
+        Files are named by the hash of their content, so identical arrays are
+        only written once per folder.
+    """
+
+    subfolder = "arrays"
+
+    def __init__(self, folder, threshold):
+        self.folder = folder
+        self.threshold = threshold
+
+    def externalize(self, array):
+        return not array.dtype.hasobject and array.nbytes >= self.threshold
+
+    def save(self, array):
+        """
+            Write the array (if needed) and return its filename relative to
+            `folder`.
+        """
+        array = np.ascontiguousarray(array)
+        digest = hashlib.sha1()
+        digest.update("{}{}".format(array.dtype.str, array.shape).encode())
+        digest.update(array.data)
+        filename = osp.join(self.subfolder, digest.hexdigest() + ".npy")
+
+        path = osp.join(self.folder, filename)
+        if not osp.isfile(path):
+            os.makedirs(osp.dirname(path), exist_ok=True)
+            # concurrent writers must not expose partial files
+            with u.atomic_write(path) as f:
+                np.save(f, array)
+        return filename
+
+
+def represent_ndarray(dumper, array):
+    store = getattr(dumper, "array_store", None)
+    if store is not None and store.externalize(array):
+        return dumper.represent_scalar(tag_npy, store.save(array))
+    if isinstance(array, np.memmap):
+        array = np.array(array)
+    return dumper.represent_object(array)
 
 
 # Constructors
 for k, v in list(yccp_tags.items()):
     for tag in v:
-        yaml.add_constructor(tag, evaluate_expression, Loader=YccpLoader)
+        yaml.add_constructor(tag, construct_expression, Loader=YccpLoader)
+yaml.add_constructor(tag_npy, construct_npy, Loader=YccpLoader)
 
 # Representations
 yaml.add_representer(RawExpression,
@@ -149,17 +647,51 @@ yaml.add_representer(RawExpression,
 yaml.add_representer(str, lambda dumper, value:
                      dumper.represent_scalar('tag:yaml.org,2002:str', value),
                      Dumper=YccpDumper)
+yaml.add_multi_representer(np.ndarray, represent_ndarray, Dumper=YccpDumper)
+yaml.add_representer(LayeredMapping,
+                     lambda dumper, value: dumper.represent_dict(value),
+                     Dumper=YccpDumper)
+yaml.add_multi_representer(u.Lazy, lambda dumper, value:
+                           dumper.represent_data(value.resolve()),
+                           Dumper=YccpDumper)
+yaml.add_representer(u.PartialDict,
+                     lambda dumper, value: dumper.represent_dict(value),
+                     Dumper=YccpDumper)
+yaml.add_representer(u.PartialList,
+                     lambda dumper, value: dumper.represent_list(value),
+                     Dumper=YccpDumper)
 
 
-def dump(data, stream=None, **kw):
-    "Return yaml representation."
+def dump(data, stream=None, npy_threshold=None, npy_folder=None, **kw):
+    """
+        Return yaml representation.
+
+        If npy_threshold is not None, NumPy arrays of at least that many bytes
+        are written to side-car .npy files and referenced via `!npy` (see
+        `ArrayStore`). They are stored relative to npy_folder, which defaults
+        to the folder of the file `stream` was opened from.
+    """
     kwargs = {"default_flow_style": False}
     kwargs.setdefault("indent", 4)
     kwargs.update(kw)
-    return yaml.dump(data, stream, Dumper=YccpDumper, **kwargs)
 
+    if npy_threshold is None:
+        dumper = YccpDumper
+    else:
+        if npy_folder is None:
+            name = getattr(stream, "name", None)
+            npy_folder = osp.dirname(name) if isinstance(name, str) else ""
+        store = ArrayStore(npy_folder, npy_threshold)
+
+        def dumper(*args, **kwargs):
+            instance = YccpDumper(*args, **kwargs)
+            instance.array_store = store
+            return instance
+
+    return yaml.dump(data, stream, Dumper=dumper, **kwargs)
 
-def load(obj, verbatim=False, **kwargs):
+
+def load(obj, verbatim=False, lazy=False, **kwargs):
     """
         Load a yaml with a little preprocessor.
 
@@ -175,78 +707,141 @@ def load(obj, verbatim=False, **kwargs):
         If verbatim is enabled, expressions are not evaluated and instead kept
         in their raw form RawExpression.
 
-        The object is parsed twice in total.
+        If lazy is enabled, only the prelude is evaluated right away. The rest
+        of the document is constructed (and expressions therein evaluated)
+        only when accessed via `utils.Path`s (e.g. `utils.get_recursive` or
+        `ParameterSet.__getitem__`), see `LazyNode`. Iterating over the
+        returned (partial) containers directly yields `utils.Lazy`
+        placeholders.
+
+        Externalized arrays (`!npy`) are loaded relative to `folder` (see
+        `YccpLoader`).
+
+        The object is parsed only once, hence it does not need to be seekable.
     """
     if verbatim:
+        if lazy:
+            raise ValueError("Verbatim documents cannot be loaded lazily.")
         return load_data_verbatim(obj, **kwargs)
     else:
-        return load_data_with_prelude(obj, **kwargs)
+        return load_data_with_prelude(obj, lazy=lazy, **kwargs)
 
 
-def load_data_verbatim(obj, name_prelude=None, **kwargs):
+def load_data_verbatim(obj, name_prelude=None, folder=None):
     """
         Load data from object as is, without evaluating expressions.
+
+        name_prelude is only accepted for symmetry with
+        `load_data_with_prelude` (the prelude is kept verbatim as well).
     """
-    # chache_attr is just to remove it from the kwargs dict passed to load
-    evaluate_expression.disable()
-    data = load(obj, **kwargs)
-    evaluate_expression.enable()
-    return data
+    evaluator = ExpressionEvaluatorWithPrelude()
+    evaluator.disable()
+    loader = YccpLoader(obj, evaluator=evaluator, folder=folder)
+    try:
+        return loader.get_single_data()
+    finally:
+        loader.dispose()
 
 
-def load_data_with_prelude(obj, name_prelude=default_prelude_attr, **kwargs):
+def load_data_with_prelude(obj, name_prelude=default_prelude_attr,
+                           lazy=False, folder=None):
     """
         Load a yaml with a little preprocessor.
+
+        The document is composed into a node graph only once: The prelude is
+        constructed and evaluated from that graph, afterwards the remaining
+        document is constructed from the very same graph (only partially if
+        lazy, see `load`). Hence, `obj` does not need to be seekable.
     """
-    filepos = None
+    if not isinstance(name_prelude, list):
+        name_prelude = [name_prelude]
+
+    evaluator = ExpressionEvaluatorWithPrelude()
+    loader = YccpLoader(obj, evaluator=evaluator, folder=folder)
+    document = None
     try:
-        filepos = obj.tell()
-    except AttributeError:
-        pass
+        node = loader.get_single_node()
+
+        name_prelude_found, prelude_node = pop_prelude_node(node, name_prelude)
+        if name_prelude_found is None:
+            name_prelude_found = name_prelude[-1]
+
+        # disable the expression evaluater while constructing the prelude
+        evaluator.disable()
+
+        prelude = None
+        if prelude_node is not None:
+            prelude = loader.construct_document(prelude_node)
+        evaluator.enable()
+
+        # compute prelude if it exists
+        if prelude is not None:
+            if isinstance(prelude, dict):
+                prelude = [prelude]
+            elif not (isinstance(prelude, list)
+                      and all((isinstance(v, dict) for v in prelude))):
+                raise ValueError(
+                    "The {} attribute needs to be either a dictionary or a "
+                    "list of dictionaries".format(name_prelude_found))
+
+            for dct in prelude:
+                for k, v in dct.items():
+                    evaluator.prelude_add(k, evaluator.eval(v))
+
+        if node is None:
+            final_object = {}
+        elif lazy:
+            document = LazyDocument(loader)
+            final_object = construct_lazily(document, node)
+        else:
+            final_object = loader.construct_document(node)
+    finally:
+        if document is None:
+            loader.dispose()
+        else:
+            # disposed once all LazyNodes are constructed
+            document.release()
 
-    # disable the expression evaluater and empty prelude
-    evaluate_expression.disable()
-    evaluate_expression.prelude_empty()
+    final_object[name_prelude_found] = prelude = {}
+    evaluator.prelude_dump(prelude)
 
-    raw_object = raw_load(obj, **kwargs)
-    evaluate_expression.enable()
+    return final_object
 
-    prelude = None
-    # find prelude under different names
-    if not isinstance(name_prelude, list):
-        name_prelude = [name_prelude]
-    for name_prelude_found in name_prelude:
-        if name_prelude_found in raw_object:
-            prelude = raw_object[name_prelude_found]
-            break
-
-    # compute prelude if it exists
-    if prelude is not None:
-        if isinstance(prelude, dict):
-            prelude = [prelude]
-        elif not (isinstance(prelude, list)
-                  and all((isinstance(v, dict) for v in prelude))):
-            raise ValueError(
-                "The {} attribute needs to be either a dictionary or a list "
-                "of dictionaries".format(name_prelude_found))
 
-        for dct in prelude:
-            for k, v in dct.items():
-                evaluate_expression.prelude_add(
-                    k, evaluate_expression.eval(v))
+def pop_prelude_node(node, name_prelude):
+    """
+        Remove the prelude from the toplevel mapping `node` of a composed
+        document.
 
-    if filepos is not None:
-        obj.seek(filepos)
+        The first name in `name_prelude` present in the mapping is used.
 
-    final_object = raw_load(obj, **kwargs)
-    if name_prelude_found in raw_object:
-        del final_object[name_prelude_found]
+        Returns a tuple (name found, prelude node) or (None, None) if there is
+        no prelude.
+    """
+    if not isinstance(node, yaml.MappingNode):
+        return None, None
 
-    final_object[name_prelude_found] = prelude = {}
-    evaluate_expression.prelude_dump(prelude)
-    evaluate_expression.prelude_empty()
+    keys = [key.value if isinstance(key, yaml.ScalarNode) else None
+            for key, _ in node.value]
+    for name in name_prelude:
+        if name in keys:
+            _, prelude_node = node.value.pop(keys.index(name))
+            return name, prelude_node
+    return None, None
 
-    return final_object
+
+def load_reactive(obj, name_prelude=default_prelude_attr, folder=None):
+    """
+        Load a yaml with a little preprocessor but keep track of all
+        expressions (see `ReactivePrelude`).
+
+        Returns the evaluated data (identical to `load`) and the
+        ReactivePrelude.
+    """
+    data = load_data_verbatim(obj, folder=folder)
+    if data is None:
+        data = {}
+    return ReactivePrelude.from_verbatim(data, name_prelude=name_prelude)
 
 
 def raw_load(obj, verbatim=False, name_prelude=default_prelude_attr, **kw):
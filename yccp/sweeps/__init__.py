@@ -8,9 +8,15 @@
     more tractable.
 """
 
+from . import bundles
+from . import deltas
+from . import loadcache
+from . import manifest
+from . import profiling
 from . import transforms
 from . import namers
 from . import ranges
+from . import sinks
 
 from .parametersets import *
 
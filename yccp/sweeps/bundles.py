@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Bundles store many serialized ParameterSets in a single file (keyed by the
+    path generated by the namers) instead of one file each.
+
+    This spares parallel file systems from creating huge numbers of small
+    files. Bundles support random access, single entries can be loaded via
+    `ParameterSet(name, bundle=...)` without unpacking the whole bundle.
+
+    Supported formats (chosen by extension):
+        * SQLite (.sqlite, .sqlite3, .db)
+        * zip (.zip)
+"""
+
+import os.path as osp
+import pathlib
+import sqlite3
+import zipfile
+
+from .. import utils as u
+
+__all__ = [
+        "SQLiteBundle",
+        "ZipBundle",
+        "open_bundle",
+    ]
+
+
+class Bundle(object):
+    """
+        Common interface of all bundles.
+    """
+
+    def __init__(self, filename, mode="r"):
+        """
+            Open bundle `filename` for reading (mode "r") or reading and
+            appending (mode "a", the bundle is created if needed).
+        """
+        if mode not in ["r", "a"]:
+            raise ValueError("Unsupported mode: {}".format(mode))
+        self.filename = filename
+        self.mode = mode
+
+    def __contains__(self, name):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        raise NotImplementedError
+
+    def names(self):
+        """
+            Return the names of all entries (in order of insertion).
+        """
+        raise NotImplementedError
+
+    def read(self, name):
+        """
+            Return the content of entry `name` (KeyError if missing).
+        """
+        raise NotImplementedError
+
+    def write(self, name, content):
+        """
+            Store content under `name` (replacing any previous entry).
+        """
+        raise NotImplementedError
+
+
+class SQLiteBundle(Bundle):
+    """
+        Bundle stored in a single SQLite table.
+    """
+
+    table = "parametersets"
+
+    # number of entries written per transaction
+    batchsize = 1000
+
+    def __init__(self, filename, mode="r"):
+        super(SQLiteBundle, self).__init__(filename, mode=mode)
+        if mode == "r":
+            if not osp.isfile(filename):
+                raise IOError("Bundle {} does not exist.".format(filename))
+            # as_uri escapes characters special in URIs (e.g. "?" or "#")
+            self.connection = sqlite3.connect(
+                pathlib.Path(osp.abspath(filename)).as_uri() + "?mode=ro",
+                uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(filename)
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS {} (name TEXT PRIMARY KEY, "
+                    "content TEXT)".format(self.table))
+        self._uncommitted = 0
+
+    def __contains__(self, name):
+        return self.connection.execute(
+            "SELECT 1 FROM {} WHERE name = ?".format(self.table),
+            (name,)).fetchone() is not None
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def names(self):
+        return [row[0] for row in self.connection.execute(
+            "SELECT name FROM {} ORDER BY rowid".format(self.table))]
+
+    def read(self, name):
+        row = self.connection.execute(
+            "SELECT content FROM {} WHERE name = ?".format(self.table),
+            (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def write(self, name, content):
+        # replaced entries keep their position (unlike INSERT OR REPLACE)
+        self.connection.execute(
+            "INSERT INTO {} VALUES (?, ?) ON CONFLICT (name) DO UPDATE "
+            "SET content = excluded.content".format(self.table),
+            (name, content))
+        self._uncommitted += 1
+        if self._uncommitted >= self.batchsize:
+            self.connection.commit()
+            self._uncommitted = 0
+
+
+class ZipBundle(Bundle):
+    """
+        Bundle stored as (compressed) zip archive.
+
+        Note: Entries cannot be replaced in zip archives. Replaced entries are
+        kept in memory and the archive is rewritten once when closing the
+        bundle.
+    """
+
+    compression = zipfile.ZIP_DEFLATED
+
+    def __init__(self, filename, mode="r"):
+        super(ZipBundle, self).__init__(filename, mode=mode)
+        self.zipfile = zipfile.ZipFile(filename, mode=mode,
+                                       compression=self.compression)
+        self._names = set(self.zipfile.namelist())
+        # name -> content of replaced entries (not written yet)
+        self._replaced = {}
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def close(self):
+        self.zipfile.close()
+        if len(self._replaced) > 0:
+            self._rewrite()
+
+    def names(self):
+        # archives might hold duplicate entries (last one wins)
+        return list(dict.fromkeys(self.zipfile.namelist()))
+
+    def read(self, name):
+        if name in self._replaced:
+            return self._replaced[name]
+        return self.zipfile.read(name).decode("utf-8")
+
+    def write(self, name, content):
+        if name in self._names:
+            self._replaced[name] = content
+        else:
+            self.zipfile.writestr(name, content)
+            self._names.add(name)
+
+    def _rewrite(self):
+        """
+            Rewrite the (closed) archive with all replaced entries.
+        """
+        with zipfile.ZipFile(self.filename) as old, \
+                u.atomic_write(self.filename) as f, \
+                zipfile.ZipFile(f, mode="w",
+                                compression=self.compression) as new:
+            for name in list(dict.fromkeys(old.namelist())):
+                if name in self._replaced:
+                    new.writestr(name, self._replaced[name])
+                else:
+                    info = old.getinfo(name)
+                    new.writestr(info, old.read(info))
+        self._replaced = {}
+
+
+_bundle_types = {
+        ".db": SQLiteBundle,
+        ".sqlite": SQLiteBundle,
+        ".sqlite3": SQLiteBundle,
+        ".zip": ZipBundle,
+    }
+
+
+def open_bundle(filename, mode="r"):
+    """
+        Open the bundle `filename`, its type is determined by the extension.
+    """
+    ext = osp.splitext(filename)[1]
+    if ext not in _bundle_types:
+        raise ValueError("Unsupported bundle format {}, use one of: {}".format(
+            ext, ", ".join(sorted(_bundle_types))))
+    return _bundle_types[ext](filename, mode=mode)
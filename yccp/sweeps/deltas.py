@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Delta-encoded ParameterSets: Only the differences to a base document
+    (written once) are stored for every point of a sweep.
+
+    A delta document looks like:
+
+        _metainfo:
+            delta:
+                version: 1
+                base: ../base.yaml
+                delete: [some/removed/value]
+                set:
+                    nestedValue/foo: 200
+
+    where `base` is relative to the folder of the delta document (or entry of
+    a bundle). `ParameterSet` rebuilds the full data when loading such a
+    document.
+
+    The marker lives in `_metainfo` (which is reserved for yccp) so that user
+    parameters cannot be mistaken for it.
+"""
+
+import collections
+import collections.abc
+import io
+import os
+import os.path as osp
+
+from .. import prelude as pl
+from .. import utils as u
+
+__all__ = [
+        "BaseCache",
+        "base_cache",
+        "diff",
+        "is_delta",
+        "make_delta",
+    ]
+
+
+# path of the delta in delta documents
+path_delta = "_metainfo/delta"
+# version of the format written by `make_delta`
+delta_version = 1
+
+
+def diff(base, data):
+    """
+        Return (changes, deletions) needed to turn base into data.
+
+        Changes is a dictionary path -> value, deletions a list of paths.
+        Containers shared between base and data (see copy-on-write in
+        `ParameterSet`) are skipped without comparing them.
+    """
+    changes = {}
+    deletions = []
+    _diff(base, data, [], changes, deletions)
+    return changes, deletions
+
+
+def _diff(base, data, path, changes, deletions):
+    if base is data:
+        return
+
+    # lazily loaded values (see `utils.Lazy`)
+    if isinstance(base, u.Lazy):
+        base = base.resolve(deep=False)
+    if isinstance(data, u.Lazy):
+        data = data.resolve(deep=False)
+    if base is data:
+        return
+
+    if isinstance(base, collections.abc.Mapping)\
+            and isinstance(data, collections.abc.Mapping)\
+            and _is_addressable(base) and _is_addressable(data):
+        for key in base:
+            if key not in data:
+                deletions.append("/".join(path + [key]))
+        for key, value in data.items():
+            if key in base:
+                _diff(base[key], value, path + [key], changes, deletions)
+            else:
+                changes["/".join(path + [key])] = value
+
+    elif isinstance(base, list) and isinstance(data, list)\
+            and len(base) == len(data) and len(path) > 0:
+        for i, (b, d) in enumerate(zip(base, data)):
+            _diff(b, d, path + [str(i)], changes, deletions)
+
+    elif len(path) == 0:
+        raise ValueError("Can only compute differences between documents.")
+
+    elif not _equal(u.materialize(base), u.materialize(data)):
+        changes["/".join(path)] = data
+
+
+def _equal(a, b):
+    if type(a) is not type(b):
+        return False
+    if hasattr(a, "shape"):
+        # NumPy arrays
+        return a.shape == b.shape and bool((a == b).all())
+    try:
+        return bool(a == b)
+    except ValueError:
+        # containers of NumPy arrays
+        return False
+
+
+def _is_addressable(dct):
+    """
+        Whether all keys can be used in paths.
+    """
+    return all(isinstance(key, str) and key != "" and "/" not in key
+               and not key.isdigit() for key in dct)
+
+
+def make_delta(base_filename, filename, changes, deletions):
+    """
+        Return the delta document for `filename` that refers to
+        `base_filename`.
+    """
+    folder = osp.dirname(filename) or os.curdir
+    delta = {}
+    u.set_recursive(delta, path_delta, {
+            "version": delta_version,
+            "base": osp.relpath(base_filename, folder),
+            "delete": deletions,
+            "set": changes,
+        })
+    return delta
+
+
+def is_delta(data):
+    if not isinstance(data, dict):
+        return False
+    # user documents might hold anything in _metainfo
+    metainfo = u.retrieve_path(data, path_delta.split("/")[0])
+    return isinstance(metainfo, dict)\
+        and isinstance(metainfo.get("delta"), dict)\
+        and "version" in metainfo["delta"]
+
+
+def get_delta(data):
+    """
+        Return the delta of the delta document `data`.
+
+        Raises ValueError if it was written by a newer version of yccp.
+    """
+    delta = u.retrieve_path(data, path_delta)
+    if delta["version"] > delta_version:
+        raise ValueError("Unsupported version {} of delta document (only "
+                         "versions up to {} are supported).".format(
+                             delta["version"], delta_version))
+    return delta
+
+
+def get_base_filename(filename, data):
+    """
+        Return the filename of the base document referred to by the delta
+        document `data` loaded from filename.
+    """
+    return osp.normpath(osp.join(osp.dirname(filename),
+                                 get_delta(data)["base"]))
+
+
+def apply(paramset, data):
+    """
+        Apply the delta document `data` to `paramset` (holding the base).
+    """
+    delta = get_delta(data)
+    for path in delta.get("delete", []):
+        del paramset[path]
+    for path, value in delta.get("set", {}).items():
+        paramset[path] = value
+
+
+class BaseCache(object):
+    """
+        Small LRU-cache of loaded base documents, so that loading many points
+        of a sweep only parses the base once.
+
+        Entries are keyed by filename and modification time/size, the cached
+        data must not be modified (ParameterSets copy on write).
+    """
+
+    def __init__(self, maxsize=8):
+        self._data = u.LRUCache(maxsize)
+
+    @property
+    def maxsize(self):
+        return self._data.maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        self._data.maxsize = maxsize
+
+    def clear(self):
+        self._data.clear()
+
+    def load(self, filename, bundle=None):
+        """
+            Return the data of base document `filename` (an entry in bundle
+            if bundle is not None).
+        """
+        if bundle is None:
+            stat = os.stat(filename)
+            key = (osp.abspath(filename), None, stat.st_mtime_ns,
+                   stat.st_size)
+        else:
+            stat = os.stat(bundle.filename)
+            key = (osp.abspath(bundle.filename), filename, stat.st_mtime_ns,
+                   stat.st_size)
+
+        data = self._data.get(key)
+        if data is not None:
+            return data
+
+        if bundle is None:
+            with open(filename, "r") as f:
+                data = pl.load(f)
+        else:
+            data = pl.load(io.StringIO(bundle.read(filename)))
+
+        self._data.put(key, data)
+        return data
+
+
+base_cache = BaseCache()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Opt-in cache of loaded (i.e. parsed and evaluated) parameter files.
+
+    Once enabled via `enable`, `ParameterSet(filename)` looks up the document
+    in an in-process LRU-cache first and then (if a folder is given) in an
+    on-disk cache of pickled documents. Entries are keyed by absolute path,
+    modification time, size and yccp version, so changed files are never
+    served from the cache.
+"""
+
+import collections
+import hashlib
+import os
+import os.path as osp
+import pickle
+import threading
+import time
+
+from .. import utils as u
+from ..version import __version__
+
+import logging
+log = logging.getLogger(__name__.split(".")[0])
+
+__all__ = [
+        "DocumentCache",
+        "disable",
+        "enable",
+    ]
+
+
+# the cache used by ParameterSet (None if disabled)
+document_cache = None
+
+
+def enable(folder=None, maxsize=128, max_disk_size=2**30):
+    """
+        Enable caching of loaded documents (see `DocumentCache`) and return
+        the cache.
+    """
+    global document_cache
+    document_cache = DocumentCache(folder=folder, maxsize=maxsize,
+                                   max_disk_size=max_disk_size)
+    return document_cache
+
+
+def disable():
+    global document_cache
+    document_cache = None
+
+
+class DocumentCache(object):
+    """
+        Two-level cache of loaded documents: An in-process LRU-cache with at
+        most `maxsize` documents in front of an on-disk cache in `folder`
+        (if not None) of at most `max_disk_size` bytes (least recently used
+        entries are removed first).
+
+        Cached documents are shared, they must not be modified in place
+        (ParameterSets own only a copy of the top level and copy nested
+        containers on write, see `ParameterSet.__init__`).
+    """
+
+    # files modified less than this many seconds ago are not cached since a
+    # later modification might not change their mtime (coarse timestamps on
+    # some file systems)
+    racy_interval = 2.
+
+    Info = collections.namedtuple(
+        "Info", ["hits", "disk_hits", "misses", "invalidated", "evictions",
+                 "currsize", "maxsize"])
+
+    def __init__(self, folder=None, maxsize=128, max_disk_size=2**30):
+        if folder is not None:
+            folder = osp.expanduser(folder)
+            os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.max_disk_size = max_disk_size
+
+        # in-process level
+        self._data = u.LRUCache(maxsize)
+        self._lock = threading.Lock()
+        # estimated size of the on-disk cache (None if unknown)
+        self._disk_size = None
+        self.disk_hits = self.misses = 0
+        self.invalidated = self.evictions = 0
+
+    @property
+    def maxsize(self):
+        return self._data.maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        self._data.maxsize = maxsize
+
+    @property
+    def hits(self):
+        return self._data.hits
+
+    def clear(self):
+        """
+            Remove all entries (including those on disk).
+        """
+        self._data.clear()
+        with self._lock:
+            self._disk_size = None
+        for entry in self._iter_disk_entries():
+            _remove(entry.path)
+
+    def get(self, key):
+        """
+            Return the document for `key` (see `key`) or None.
+        """
+        if key is None:
+            return None
+        data = self._data.get(key, _missing)
+        if data is not _missing:
+            return data
+
+        data = self._get_from_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+        if data is not None:
+            self._data.put(key, data)
+        return data
+
+    def info(self):
+        with self._lock:
+            return self.Info(self.hits, self.disk_hits, self.misses,
+                             self.invalidated, self.evictions,
+                             len(self._data), self.maxsize)
+
+    def key(self, filename, verbatim=False):
+        """
+            Return the key for filename (to be obtained before reading it).
+        """
+        filename = osp.abspath(filename)
+        stat = os.stat(filename)
+        return (filename, bool(verbatim), stat.st_mtime_ns, stat.st_size,
+                __version__)
+
+    def put(self, key, data):
+        """
+            Add a loaded document.
+        """
+        if time.time() - key[2] * 1e-9 < self.racy_interval:
+            return
+        self._data.put(key, data)
+        if self.folder is not None:
+            self._put_to_disk(key, data)
+
+    def _get_disk_filename(self, key):
+        # one entry per file, outdated entries are replaced
+        return osp.join(self.folder, hashlib.sha1(
+            repr(key[:2]).encode("utf-8")).hexdigest() + ".pickle")
+
+    def _get_from_disk(self, key):
+        if self.folder is None:
+            return None
+        filename = self._get_disk_filename(key)
+        try:
+            with open(filename, "rb") as f:
+                # compare the key before unpickling the (large) document
+                if pickle.load(f) != key:
+                    with self._lock:
+                        self.invalidated += 1
+                    _remove(filename)
+                    return None
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning("Ignoring broken cache entry {}: {}".format(
+                filename, e))
+            _remove(filename)
+            return None
+        # keep track of recently used entries for eviction
+        os.utime(filename)
+        return data
+
+    def _put_to_disk(self, key, data):
+        filename = self._get_disk_filename(key)
+        try:
+            with u.atomic_write(filename) as f:
+                pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+        except (OSError, pickle.PicklingError, TypeError) as e:
+            log.warning("Could not cache {}: {}".format(key[0], e))
+            return
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += size
+            prune = self._disk_size is None\
+                or self._disk_size > self.max_disk_size
+        if prune:
+            self._prune_disk()
+
+    def _iter_disk_entries(self):
+        if self.folder is None:
+            return iter([])
+        return (entry for entry in os.scandir(self.folder)
+                if entry.name.endswith(".pickle"))
+
+    def _prune_disk(self):
+        """
+            Remove least recently used entries until the on-disk cache fits
+            into max_disk_size (other processes might share the folder).
+        """
+        entries = []
+        for entry in self._iter_disk_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_size:
+                break
+            _remove(path)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+        with self._lock:
+            self._disk_size = total
+
+
+_missing = object()
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Manifests are compact SQLite-indices of all ParameterSets of a dumped
+    sweep.
+
+    For every point of the sweep, the manifest holds its index, filename,
+    content hash and the swept values (one column per path), so that analysis
+    tools do not need to parse every generated file.
+
+    The index is the same for sharded and complete dumps. For sweeps of
+    Transforms and Ranges, it is the index before filtering (points rejected
+    by filters leave gaps).
+"""
+
+import hashlib
+import os
+import os.path as osp
+import sqlite3
+
+from .. import prelude as pl
+from .. import utils as u
+
+__all__ = [
+        "Checkpoint",
+        "Manifest",
+        "content_hash",
+        "file_hash",
+    ]
+
+
+def content_hash(content):
+    """
+        Hash of the serialized content of a ParameterSet.
+    """
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def file_hash(filename):
+    """
+        Hash of the content of a written ParameterSet.
+    """
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _quote(identifier):
+    return '"{}"'.format(identifier.replace('"', '""'))
+
+
+def _to_column_value(value):
+    """
+        Store scalars as is, everything else as YAML flow-text.
+    """
+    if hasattr(value, "tolist"):
+        # NumPy arrays and scalars
+        value = value.tolist()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return pl.dump(value, default_flow_style=True).strip()
+
+
+class Manifest(object):
+    """
+        SQLite-index of the ParameterSets of a sweep.
+
+        The table `points` has the columns `idx`, `filename`, `sha1` (hash of
+        the content), `fingerprint` (see `ParameterSet.fingerprint`, only for
+        incremental dumps), `written` (whether the file holds this
+        ParameterSet) followed by one column per swept path. Use `connection`
+        for arbitrary queries.
+    """
+
+    table = "points"
+    fixed_columns = ["idx", "filename", "sha1", "fingerprint", "written"]
+
+    # number of rows inserted at once
+    batchsize = 1000
+
+    def __init__(self, filename):
+        """
+            Open an existing manifest.
+        """
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self._pending = []
+
+        columns = [row[1] for row in self.connection.execute(
+            "PRAGMA table_info({})".format(self.table))]
+        self.paths = columns[len(self.fixed_columns):]
+
+    @classmethod
+    def create(cls, filename, paths):
+        """
+            Create a new (empty) manifest with one column per path, an
+            existing manifest is replaced.
+        """
+        connection = sqlite3.connect(filename)
+        with connection:
+            connection.execute("DROP TABLE IF EXISTS {}".format(cls.table))
+            connection.execute(
+                "CREATE TABLE {} (idx INTEGER PRIMARY KEY, filename TEXT, "
+                "sha1 TEXT, fingerprint TEXT, written INTEGER{})".format(
+                    cls.table, "".join(", " + _quote(p) for p in paths)))
+            connection.execute(
+                "CREATE INDEX {0}_filename ON {0} (filename)".format(
+                    cls.table))
+        connection.close()
+        return cls(filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        """
+            Iterate over all rows (as dictionaries) in order of the index.
+        """
+        self.flush()
+        columns = self.fixed_columns + self.paths
+        for row in self.connection.execute(
+                "SELECT * FROM {} ORDER BY idx".format(self.table)):
+            yield dict(zip(columns, row))
+
+    def __len__(self):
+        self.flush()
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM {}".format(self.table)).fetchone()[0]
+
+    def add(self, index, filename, sha1, fingerprint, written, values):
+        """
+            Add a point of the sweep, `values` holds one value per path.
+        """
+        self._pending.append(
+            (index, filename, sha1, fingerprint, int(written))
+            + tuple(_to_column_value(v) for v in values))
+        if len(self._pending) >= self.batchsize:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def flush(self):
+        if len(self._pending) == 0:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO {} VALUES ({})".format(
+                    self.table,
+                    ", ".join("?" * (len(self.fixed_columns)
+                                     + len(self.paths)))),
+                self._pending)
+        self._pending = []
+
+    def get_checkpoint(self):
+        """
+            Return a dictionary mapping the filenames of all written
+            ParameterSets to (fingerprint, sha1).
+        """
+        self.flush()
+        return {filename: (fingerprint, sha1)
+                for filename, fingerprint, sha1 in self.connection.execute(
+                    "SELECT filename, fingerprint, sha1 FROM {} "
+                    "WHERE written ORDER BY idx".format(self.table))}
+
+    def get(self, filename):
+        """
+            Return the (last) row for the given filename or None.
+        """
+        self.flush()
+        row = self.connection.execute(
+            "SELECT * FROM {} WHERE filename = ? ORDER BY idx DESC".format(
+                self.table), (filename,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(self.fixed_columns + self.paths, row))
+
+    def remove(self, start, stop=None, step=1):
+        """
+            Remove all rows with an index in range(start, stop, step) (stop
+            None: unbounded).
+        """
+        def removed(index):
+            return index >= start and (stop is None or index < stop)\
+                and (index - start) % step == 0
+
+        # pending rows in the range are dropped as well
+        self._pending = [row for row in self._pending if not removed(row[0])]
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM {} WHERE idx >= ? AND (? IS NULL OR idx < ?) "
+                "AND (idx - ?) % ? = 0".format(self.table),
+                (start, stop, stop, start, step))
+
+    def truncate(self, num):
+        """
+            Remove all rows with an index larger or equal to num.
+        """
+        self.remove(num)
+
+    def values(self, path):
+        """
+            Return all values of the given path in order of the index.
+        """
+        self.flush()
+        return [row[0] for row in self.connection.execute(
+            "SELECT {} FROM {} ORDER BY idx".format(_quote(path),
+                                                   self.table))]
+
+
+class Checkpoint(object):
+    """
+        Records the points of a `Sweep.dump` in a manifest.
+
+        Points are added in order of their index, entries of the skipped
+        indices in range(start, stop, step) (i.e. points rejected by filters)
+        are removed, so are all remaining entries once the dump is finished.
+
+        If incremental is True, an existing manifest serves as checkpoint
+        (see `previous`), it is reused if it has the same paths.
+    """
+
+    def __init__(self, filename, paths, incremental=False, start=0,
+                 stop=None, step=1):
+        self.paths = paths
+        # filename -> (fingerprint, sha1) of the previous dump (None if not
+        # incremental)
+        self.previous = None
+
+        os.makedirs(osp.dirname(filename), exist_ok=True)
+
+        self.manifest = None
+        if incremental:
+            self.previous = {}
+            if osp.isfile(filename):
+                existing = Manifest(filename)
+                self.previous = existing.get_checkpoint()
+                if existing.paths == paths:
+                    self.manifest = existing
+                else:
+                    existing.close()
+        if self.manifest is None:
+            self.manifest = Manifest.create(filename, paths)
+
+        self._next_index = start
+        self._stop = stop
+        self._step = step
+
+    def __contains__(self, filename):
+        return self.previous is not None and filename in self.previous
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def incremental(self):
+        return self.previous is not None
+
+    def add(self, index, filename, sha1, fingerprint, written, values):
+        """
+            Add the point with the given index (see `Manifest.add`).
+        """
+        if index > self._next_index:
+            # stale entries of points rejected by filters
+            self.manifest.remove(self._next_index, index, step=self._step)
+        self.manifest.add(index, filename, sha1, fingerprint, written, values)
+        self._next_index = index + self._step
+
+    def close(self):
+        self.manifest.close()
+
+    def finish(self):
+        """
+            Remove stale entries of a previous (larger) sweep after the last
+            point was added.
+        """
+        self.manifest.remove(self._next_index, self._stop, step=self._step)
+
+    def get_hash(self, filename):
+        """
+            Return the content hash of filename in the previous dump or None.
+        """
+        if filename not in self:
+            return None
+        return self.previous[filename][1]
+
+    def is_unchanged(self, filename, fingerprint):
+        """
+            Whether filename held a ParameterSet with the same fingerprint in
+            the previous dump.
+        """
+        return filename in self and self.previous[filename][0] == fingerprint
+
+
+def extract_values(paramset, paths):
+    """
+        Extract the values for all paths from paramset (None if missing).
+    """
+    return [u.retrieve_path(paramset.data, path) for path in paths]
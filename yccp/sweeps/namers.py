@@ -32,8 +32,10 @@ def create_custom(listOfPaths, name,
     """Go through the listOfPaths and pass them together to a function given by user."""
     assert callable(func)
 
+    paths = [utils.compile_path(path) for path in listOfPaths]
+
     def namer(paramset):
-        lst = [rget(paramset.data, path) for path in listOfPaths]
+        lst = [path.get(paramset.data) for path in paths]
         val = func(lst)
         val = val[:length] if length > 0 else val
         return "{}_{}".format(
@@ -75,8 +77,9 @@ def create_formatted(path, name, value_format=".0f",
     and will add "valAB_42.42" somewhere in its name.
     """
     format = format.format(value_format=value_format)
+    path = utils.compile_path(path)
     def formatter(paramset):
-        value = rget(paramset.data, path)
+        value = path.get(paramset.data)
         try:
             return format.format(name=name, value=value)
         except ValueError:
@@ -6,28 +6,75 @@
 
 from .. import utils as u
 from .. import prelude as pl
+from . import bundles as b
+from . import deltas as d
+from . import loadcache as lc
 
+import collections.abc
+import concurrent.futures as cf
 import copy
 import errno
+import hashlib
+import io
+import itertools as it
 import os
 import os.path as osp
+import pickle
+import threading
+import time
 
 import logging
 log = logging.getLogger(__name__.split(".")[0])
 
 
-__all__ = ["ParameterSet"]
+__all__ = ["LayeredParameterSet", "ParameterSet", "load_many"]
+
+
+# callables notified with the duration of every `ParameterSet.copy` made by
+# the current thread (profiling, see `get_copy_observers`)
+_copy_observers = threading.local()
+
+
+def get_copy_observers():
+    """
+        Return the (modifiable) list of copy observers of the current thread.
+    """
+    try:
+        return _copy_observers.observers
+    except AttributeError:
+        _copy_observers.observers = []
+        return _copy_observers.observers
 
 
 class ParameterSet(object):
     """
         ParameterSet to keep track of changes.
+
+        Copy-on-write copies (`copy(cow=True)`, used by `Sweep.dump` and
+        `Sweep.to_table`, which consume every generated ParameterSet right
+        away) share their data with the original: Only the containers
+        along a path that is modified via item assignment/deletion (or
+        `get_mutable`) are copied. Hence, values retrieved from such a
+        ParameterSet must not be modified in place (call `unshare` first).
     """
 
     def __getitem__(self, key):
         return u.get_recursive(self.data, key)
 
-    def __init__(self, filename=None, verbatim=False):
+    def __delitem__(self, key):
+        path = u.compile_path(key)
+        base = self._retrieve_mutable(path.parent, materialized=False)
+        if isinstance(base, list):
+            index = int(path.names[-1])
+        else:
+            index = path.names[-1]
+        self._disown(base[index])
+        del base[index]
+        if self.reactive is not None:
+            self.reactive.set(self.data, path, setter=self._set)
+
+    def __init__(self, filename=None, verbatim=False, reactive=False,
+                 bundle=None, lazy=False):
         """Create a new dataset.
 
         Args:
@@ -41,30 +88,221 @@ class ParameterSet(object):
                 The parameter set will be loaded as it  is on disk (i.e.,
                 verbatim).
 
+            reactive:
+                If True, keep track of all expressions and the prelude entries
+                they depend on. Changing a prelude value (e.g.,
+                `ps["__prelude__/synapse_loss"] = 0.5`) then re-evaluates all
+                dependent expressions. Only changes made via the ParameterSet
+                (and not `data` directly) are tracked.
+
+            bundle:
+                If not None, filename is the name of an entry in this bundle
+                (filename or opened bundle, see `bundles`).
+
+            lazy:
+                If True, parts of the document are only constructed (and
+                expressions therein evaluated) once they are accessed, e.g.
+                via `__getitem__` (see `prelude.load`). Not cached by
+                `loadcache` and cannot be combined with verbatim or reactive.
+
+        Note:
+            If `loadcache` is enabled, the loaded document is shared with the
+            cache (and all other ParameterSets loaded from the same file)
+            like a copy-on-write copy (see class documentation): Only the
+            top-level dictionary is owned. Modifying retrieved values in
+            place (e.g. `ps["a"]["b"] = 1` or `ps.data["a"]["b"] = 1`)
+            would modify every later load, use item assignment
+            (`ps["a/b"] = 1`), `get_mutable` or `unshare` instead.
+
         Returns:
             The created ParameterSet.
         """
         self.data = {}
+        self.reactive = None
+        # containers in data not shared with other ParameterSets (by id),
+        # None if no part of data is shared
+        self._owned = {}
         if filename is not None:
-            self.load(filename, verbatim=False)
+            self.load(filename, verbatim=verbatim, reactive=reactive,
+                      bundle=bundle, lazy=lazy)
 
     def __setitem__(self, key, value):
-        u.set_recursive(self.data, key, value)
+        self._set(key, value)
+        if self.reactive is not None:
+            self.reactive.set(self.data, key, setter=self._set)
+
+    def get_many(self, keys, default=None):
+        """
+            Return the values for all keys (see `utils.get_recursive` for
+            `default`).
+        """
+        return [u.get_recursive(self.data, key, default=default)
+                for key in keys]
+
+    def set_many(self, items):
+        """
+            Set several values at once from a dictionary or (key, value)
+            pairs.
+
+            For reactive ParameterSets, dependent expressions are re-evaluated
+            only once.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        keys = []
+        for key, value in items:
+            self._set(key, value)
+            keys.append(key)
+        if self.reactive is not None:
+            self.reactive.set_many(self.data, keys, setter=self._set)
+
+    def _set(self, key, value):
+        if self._owned:
+            # the replaced value is not part of data anymore
+            self._disown(self._get_owned(u.compile_path(key)))
+        self.data = self._make_mutable(self.data)
+        u.set_recursive(self.data, key, value, make_mutable=self._make_mutable)
 
-    def copy(self):
+    def _make_mutable(self, obj):
+        """
+            Return `obj` if it is owned by this ParameterSet, otherwise a
+            shallow copy that is then owned.
+        """
+        if self._owned is None or self._is_owned(obj):
+            return obj
+        obj = copy.copy(obj)
+        # keep a reference so that the id stays unique
+        self._owned[id(obj)] = obj
+        return obj
+
+    def _is_owned(self, obj):
+        return id(obj) in self._owned and self._owned[id(obj)] is obj
+
+    def _get_owned(self, path):
+        """
+            Return the value at path if it is owned (None otherwise).
+        """
+        # owned containers are only reachable via owned containers
+        current = self.data
+        for name, idx, _ in path._steps:
+            if not self._is_owned(current):
+                return None
+            if idx is not None:
+                if not isinstance(current, list) or idx >= len(current):
+                    return None
+                current = current[idx]
+            elif isinstance(current, dict) and name in current:
+                current = current[name]
+            else:
+                return None
+        return current if self._is_owned(current) else None
+
+    def _disown(self, obj):
+        """
+            Forget obj and all owned containers within it (after they were
+            removed from data).
+        """
+        if self._owned is None or not self._is_owned(obj):
+            return
+        del self._owned[id(obj)]
+        for value in (obj.values() if isinstance(obj, dict) else obj):
+            if isinstance(value, (dict, list)):
+                self._disown(value)
+
+    def copy(self, cow=False):
         """
             Return a copy of this ParameterSet.
+
+            Per default, all data is copied immediately (parts of lazily
+            loaded documents that were not accessed yet are constructed
+            independently once accessed in either ParameterSet). If `cow` is
+            True, both ParameterSets share their data until they are modified
+            (copy-on-write, see class documentation).
         """
+        observers = getattr(_copy_observers, "observers", None)
+        if not observers:
+            return self._copy(cow)
+
+        start = time.perf_counter()
+        cp = self._copy(cow)
+        duration = time.perf_counter() - start
+        for observer in list(observers):
+            observer(duration)
+        return cp
+
+    def _copy(self, cow):
         cp = self.__class__()
-        cp.data = copy.deepcopy(self.data)
+        if not cow:
+            cp.data = copy.deepcopy(self.data)
+            cp._owned = None
+        else:
+            cp.data = self.data
+            # everything is shared now
+            self._owned = {}
+        if self.reactive is not None:
+            cp.reactive = self.reactive.copy()
 
         return cp
 
-    def load(self, filename, verbatim=False):
+    def unshare(self):
+        """
+            Copy all data that is still shared with other ParameterSets
+            (copy-on-write, see class documentation), afterwards it can be
+            modified in place.
+
+            Returns the ParameterSet itself.
+        """
+        if self._owned is not None:
+            self.data = copy.deepcopy(self.data)
+            self._owned = None
+        return self
+
+    def fingerprint(self):
+        """
+            Return a hash of the data that is considerably cheaper to compute
+            than serializing it (used to detect unchanged ParameterSets).
+
+            Like writing, this constructs all of a lazily loaded document.
+        """
+        return hashlib.sha1(pickle.dumps(u.materialize(self.data),
+                                         protocol=4)).hexdigest()
+
+    def get_mutable(self, key):
+        """
+            Return the value at `key` so that it can be modified in place.
+
+            The value (and all containers leading to it) is copied first if it
+            is shared with another ParameterSet.
+        """
+        return self._retrieve_mutable(key)
+
+    def _retrieve_mutable(self, key, materialized=True):
+        path = u.compile_path(key)
+        if materialized and len(path.names) == 0:
+            # lazily loaded documents (see `utils.Lazy`)
+            self._disown(self.data)
+            self.data = u.materialize(self.data)
+        self.data = self._make_mutable(self.data)
+        retval = path.retrieve(self.data, make_mutable=self._make_mutable,
+                               materialized=materialized)
+        if retval is None:
+            raise KeyError("YCCP: Did not find {} in the given "
+                           "document.".format(key))
+        return retval
+
+    def load(self, filename, verbatim=False, reactive=False, bundle=None,
+             lazy=False):
         """
             Load data from a certain yaml file.
 
             verbatim == True does not resolve the cache or any !ee tags.
+
+            reactive == True keeps track of expressions (see `__init__`).
+
+            lazy == True constructs the document on access (see `__init__`).
+
+            If bundle is not None, load the entry filename from it (see
+            `__init__`).
         """
         base, ext = osp.splitext(filename)
 
@@ -77,40 +315,384 @@ class ParameterSet(object):
 
         param_filename = base+ext
 
-        with open(param_filename, "r") as f:
-            self.data = pl.load(f, verbatim=verbatim)
+        if lazy and reactive:
+            raise ValueError("Reactive ParameterSets cannot be loaded "
+                             "lazily.")
+
+        if bundle is None:
+            self._load_file(param_filename, verbatim, reactive, lazy)
+            if not verbatim and d.is_delta(self.data):
+                self._load_delta(param_filename)
+        elif isinstance(bundle, b.Bundle):
+            self._load_entry(param_filename, bundle, verbatim, reactive,
+                             lazy)
+            param_filename = osp.join(bundle.filename, param_filename)
+        else:
+            with b.open_bundle(bundle) as opened:
+                self._load_entry(param_filename, opened, verbatim,
+                                 reactive, lazy)
+            param_filename = osp.join(bundle, param_filename)
 
         self.setup_metadata(param_filename)
 
         log.info("Read parameters from {}.".format(param_filename))
 
+    def _load_delta(self, filename, bundle=None):
+        """
+            Rebuild the full data from the loaded delta document (see
+            `deltas`).
+        """
+        delta = u.materialize(self.data)
+        self._use_shared(d.base_cache.load(
+            d.get_base_filename(filename, delta), bundle=bundle))
+        d.apply(self, delta)
+
+    def _load_entry(self, name, bundle, verbatim, reactive, lazy):
+        self._load_stream(io.StringIO(bundle.read(name)), verbatim, reactive,
+                          lazy)
+        if not verbatim and d.is_delta(self.data):
+            self._load_delta(name, bundle=bundle)
+
+    def _load_file(self, filename, verbatim, reactive, lazy):
+        cache = lc.document_cache
+        if cache is None or reactive or lazy:
+            with open(filename, "r") as f:
+                self._load_stream(f, verbatim, reactive, lazy)
+            return
+
+        key = cache.key(filename, verbatim)
+        data = cache.get(key)
+        if data is None:
+            with open(filename, "r") as f:
+                self._load_stream(f, verbatim, reactive, lazy)
+            cache.put(key, self.data)
+            data = self.data
+        self._use_shared(data)
+
+    def _use_shared(self, data):
+        """
+            Use a document that is shared with a cache: Own only a copy of
+            its top level (see `__init__`).
+        """
+        self.data = copy.copy(data)
+        self._owned = {id(self.data): self.data}
+        # cached data does not hold expressions
+        self.reactive = None
+
+    def _load_stream(self, stream, verbatim, reactive, lazy):
+        # freshly loaded data is not shared
+        self._owned = None
+        if reactive and not verbatim:
+            self.data, self.reactive = pl.load_reactive(stream)
+        else:
+            self.data = pl.load(stream, verbatim=verbatim, lazy=lazy)
+            self.reactive = None
+
     @property
     def metainfo(self):
         return self.data.get("_metainfo", {})
 
     def setup_metadata(self, orig_file):
-        self.data["_metainfo"] = {
+        self["_metainfo"] = {
                 "original_file": osp.abspath(orig_file),
                 "transforms": [],
             }
 
-    def write(self, filename, overwrite=False):
+    def write(self, filename, overwrite=False, npy_threshold=None):
         """
             Dump data into filename.
+
+            If npy_threshold is not None, NumPy arrays of at least that many
+            bytes are written to side-car .npy files that are memory-mapped
+            when loading (see `prelude.ArrayStore`).
         """
         if not filename.endswith(".yaml"):
             filename += ".yaml"
 
-        folder = osp.dirname(filename)
-        if not osp.isdir(folder):
-            log.info("Creating folder: {}".format(folder))
-            os.makedirs(folder)
+        create_folder(filename)
+        check_overwrite(filename, overwrite)
+
+        with open(filename, "w") as f:
+            self.serialize(stream=f, npy_threshold=npy_threshold)
+
+    def serialize(self, stream=None, npy_threshold=None, npy_folder=None):
+        """
+            Return the YAML representation of data (None if written to
+            stream, see `prelude.dump` for npy_threshold and npy_folder).
+
+            Used by `write` and `Sweep.dump`, override it to customize the
+            written files.
+        """
+        return pl.dump(self.data, stream=stream, npy_threshold=npy_threshold,
+                       npy_folder=npy_folder)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # unpickled data is not shared
+        state["_owned"] = None
+        return state
+
+
+class LayeredParameterSet(object):
+    """
+        Stack of layers (e.g. base file, site overrides, sweep overrides)
+        that behaves like a single ParameterSet without materializing the
+        merged data.
+
+        Layers are merged like successive `utils.update_dict_recursively`
+        calls, values are looked up lazily from the top-most layer down (see
+        `utils.LayeredMapping`). The layers are shared by all copies and must
+        not be modified; modifications of the LayeredParameterSet itself are
+        stored in an additional top-most layer (`top`).
+
+        Note: Values present in lower layers cannot be deleted and prelude
+        expressions are not re-evaluated when values change (use `flatten`).
+    """
+
+    def __init__(self, layers=()):
+        """
+            Layers (bottom to top) can be ParameterSets, dictionaries or
+            filenames.
+        """
+        self.layers = [_as_paramset(layer) for layer in layers]
+        self.top = ParameterSet()
+        self._layer_fingerprints = None
 
-        if osp.isfile(filename) and not overwrite:
-            log.error(
-                "File {} exists and overwrite was not set to True".format(
-                    filename))
-            raise OSError(errno.EEXIST)
+    def __getitem__(self, key):
+        return u.get_recursive(self.data, key)
+
+    def __setitem__(self, key, value):
+        path = u.compile_path(key)
+        self._copy_up_lists(path)
+        self.top[path] = value
+
+    def __delitem__(self, key):
+        path = u.compile_path(key)
+        if any(path.retrieve(layer.data) is not None
+               for layer in self.layers):
+            raise ValueError("Cannot delete {} present in lower layers of a "
+                             "LayeredParameterSet.".format(key))
+        del self.top[path]
+
+    @property
+    def data(self):
+        """
+            Read-only merged view of all layers.
+        """
+        return u.LayeredMapping(
+            [layer.data for layer in self.layers] + [self.top.data])
+
+    def get_many(self, keys, default=None):
+        data = self.data
+        return [u.get_recursive(data, key, default=default) for key in keys]
+
+    def set_many(self, items):
+        if isinstance(items, dict):
+            items = items.items()
+        for key, value in items:
+            self[key] = value
+
+    def copy(self, cow=False):
+        """
+            Return a copy (see `ParameterSet.copy`), copy-on-write copies
+            share all layers.
+        """
+        cp = self.__class__()
+        if not cow:
+            cp.layers = [layer.copy() for layer in self.layers]
         else:
-            with open(filename, "w") as f:
-                pl.dump(self.data, stream=f)
+            cp.layers = self.layers
+            cp._layer_fingerprints = self._layer_fingerprints
+        cp.top = self.top.copy(cow=cow)
+        return cp
+
+    def unshare(self):
+        """
+            See `ParameterSet.unshare` (the layers are shared by all copies
+            and must not be modified).
+        """
+        self.top.unshare()
+        return self
+
+    def fingerprint(self):
+        """
+            See `ParameterSet.fingerprint` (the fingerprints of the layers are
+            computed only once).
+        """
+        if self._layer_fingerprints is None:
+            self._layer_fingerprints = [
+                layer.fingerprint() for layer in self.layers]
+        return hashlib.sha1("".join(
+            self._layer_fingerprints + [self.top.fingerprint()]).encode(
+                "ascii")).hexdigest()
+
+    def flatten(self):
+        """
+            Return a regular ParameterSet holding the merged data (values are
+            shared copy-on-write).
+        """
+        flat = ParameterSet()
+        flat.data = self.data.to_dict()
+        return flat
+
+    def get_mutable(self, key):
+        """
+            See `ParameterSet.get_mutable`, values from lower layers are copied
+            to the top-most layer first.
+        """
+        path = u.compile_path(key)
+        value = path.retrieve(self.data)
+        if value is None:
+            raise KeyError("YCCP: Did not find {} in the given "
+                           "document.".format(key))
+        if isinstance(value, u.LayeredMapping):
+            self[path] = value.to_dict()
+        elif path.retrieve(self.top.data) is not value:
+            self[path] = value
+        return self.top.get_mutable(path)
+
+    @property
+    def metainfo(self):
+        return self.data.get("_metainfo", {})
+
+    def setup_metadata(self, orig_file):
+        self["_metainfo"] = {
+                "original_file": osp.abspath(orig_file),
+                "transforms": [],
+            }
+
+    def write(self, filename, overwrite=False, npy_threshold=None):
+        """
+            See `ParameterSet.write`.
+        """
+        self.flatten().write(filename, overwrite=overwrite,
+                             npy_threshold=npy_threshold)
+
+    def serialize(self, stream=None, npy_threshold=None, npy_folder=None):
+        """
+            See `ParameterSet.serialize`.
+        """
+        return self.flatten().serialize(stream=stream,
+                                        npy_threshold=npy_threshold,
+                                        npy_folder=npy_folder)
+
+    def _copy_up_lists(self, path):
+        """
+            Lists are not merged, hence the first list from a lower layer on
+            the way to path is copied to the top-most layer before modifying
+            it.
+        """
+        current = self.data
+        for i, (name, idx, _) in enumerate(path._steps[:-1]):
+            if isinstance(current, list):
+                if idx is None or idx >= len(current):
+                    return
+                current = current[idx]
+            elif isinstance(current, collections.abc.Mapping)\
+                    and name in current:
+                current = current[name]
+            else:
+                return
+            if isinstance(current, u.Lazy):
+                current = current.resolve(deep=False)
+            if isinstance(current, list):
+                prefix = u.compile_path(path.sep.join(path.names[:i+1]),
+                                        path.sep)
+                if prefix.retrieve(self.top.data,
+                                   materialized=False) is not current:
+                    self.top[prefix] = current
+                return
+
+
+def _as_paramset(layer):
+    if isinstance(layer, ParameterSet):
+        return layer
+    elif isinstance(layer, dict):
+        paramset = ParameterSet()
+        # shared copy-on-write
+        paramset.data = layer
+        return paramset
+    else:
+        return ParameterSet(layer)
+
+
+def check_overwrite(filename, overwrite=False, exists=None):
+    """
+        Raise OSError (EEXIST) if `filename` exists and overwrite is not set.
+
+        If `exists` is not None, it is used instead of checking the file
+        system.
+    """
+    if exists is None:
+        exists = osp.isfile(filename)
+    if exists and not overwrite:
+        log.error(
+            "File {} exists and overwrite was not set to True".format(
+                filename))
+        raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), filename)
+
+
+def create_folder(filename):
+    """
+        Create the folder `filename` resides in if it does not exist.
+    """
+    folder = osp.dirname(filename)
+    if not osp.isdir(folder):
+        log.info("Creating folder: {}".format(folder))
+        # another process might have created the folder in the meantime
+        os.makedirs(folder, exist_ok=True)
+
+
+def write_serialized(filename, content):
+    """
+        Write already serialized content of a ParameterSet to `filename`
+        (its folder has to exist).
+    """
+    with open(filename, "w") as f:
+        f.write(content)
+
+
+_executors = {
+        "thread": cf.ThreadPoolExecutor,
+        "process": cf.ProcessPoolExecutor,
+    }
+
+
+def load_many(filenames, workers=None, executor="thread", verbatim=False):
+    """
+        Load several parameter sets in parallel.
+
+        Args:
+            filenames:
+                Files to load.
+
+            workers:
+                Number of workers to use (defaults to the number of CPUs).
+
+            executor:
+                Either "thread" or "process".
+
+            verbatim:
+                See `ParameterSet.__init__`.
+
+        Returns:
+            List of ParameterSets in the same order as `filenames`.
+    """
+    if executor not in _executors:
+        raise ValueError("Unknown executor {}, use one of: {}".format(
+            executor, ", ".join(sorted(_executors))))
+
+    filenames = list(filenames)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # send several files to each worker process at once to reduce overhead
+    chunksize = max(1, len(filenames) // (4 * workers))
+
+    with _executors[executor](max_workers=workers) as pool:
+        return list(pool.map(_load, filenames, it.repeat(verbatim),
+                             chunksize=chunksize))
+
+
+def _load(filename, verbatim):
+    return ParameterSet(filename, verbatim=verbatim)
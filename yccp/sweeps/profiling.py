@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Profiling of the Sweep pipeline (see `Sweep.enable_profiling`).
+"""
+
+import collections
+import contextlib
+import time
+
+from . import parametersets as p
+
+__all__ = [
+        "ProfileStats",
+        "Timer",
+    ]
+
+
+class Timer(object):
+    """
+        Accumulated time and number of calls.
+    """
+
+    __slots__ = ["calls", "time"]
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.
+
+    def add(self, duration, calls=1):
+        self.calls += calls
+        self.time += duration
+
+    def __repr__(self):
+        return "Timer(calls={}, time={:.6f})".format(self.calls, self.time)
+
+
+class ProfileStats(object):
+    """
+        Timers of all parts of the Sweep pipeline.
+
+        `timers` maps names to `Timer`s:
+            * "generator[i] <description>": time spent generating the
+              ParameterSets of the i-th generator function (including copies
+              and transforms), calls = number of ParameterSets generated
+            * "filter[i]": filters evaluated on ParameterSets of stage i
+            * "copy": `ParameterSet.copy`
+            * "namers", "serialize", "fingerprint", "write": `Sweep.dump`
+
+        `bytes_written` holds the number of bytes written by `Sweep.dump`.
+
+        Note: In parallel dumps, naming and serialization happen in the worker
+        processes, their durations are summed over all workers.
+
+        If given, `callback(name, duration)` is called for every recorded
+        event.
+    """
+
+    def __init__(self, callback=None):
+        self.timers = collections.OrderedDict()
+        self.bytes_written = 0
+        self.callback = callback
+        self._copy_observer = lambda duration: self.record("copy", duration)
+
+    def __str__(self):
+        lines = ["{:<50s} {:>10s} {:>12s} {:>12s}".format(
+            "stage", "calls", "total [s]", "per call [us]")]
+        for name, timer in self.timers.items():
+            lines.append("{:<50s} {:>10d} {:>12.4f} {:>12.1f}".format(
+                name, timer.calls, timer.time,
+                1e6 * timer.time / max(timer.calls, 1)))
+        lines.append("{} bytes written".format(self.bytes_written))
+        return "\n".join(lines)
+
+    @property
+    def copies(self):
+        return self.get_timer("copy").calls
+
+    def as_dict(self):
+        """
+            Return all statistics as (JSON-serializable) dictionary.
+        """
+        return {
+            "timers": {name: {"calls": timer.calls, "time": timer.time}
+                       for name, timer in self.timers.items()},
+            "bytes_written": self.bytes_written,
+        }
+
+    def get_timer(self, name):
+        if name not in self.timers:
+            self.timers[name] = Timer()
+        return self.timers[name]
+
+    def record(self, name, duration, calls=1):
+        self.get_timer(name).add(duration, calls=calls)
+        if self.callback is not None:
+            self.callback(name, duration)
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def observe_copies(self):
+        """
+            Record all copies of ParameterSets made by the current thread in
+            this context (contexts can be nested).
+
+            Note: Do not keep the context open across `yield`s, copies made
+            while the generator is suspended would be recorded as well.
+        """
+        observers = p.get_copy_observers()
+        if self._copy_observer in observers:
+            yield
+            return
+        observers.append(self._copy_observer)
+        try:
+            yield
+        finally:
+            observers.remove(self._copy_observer)
+
+    def wrap_filter(self, stage, predicate):
+        if predicate is None:
+            return None
+        name = "filter[{}]".format(stage)
+
+        def wrapped(paramset):
+            start = time.perf_counter()
+            try:
+                return predicate(paramset)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return wrapped
+
+    def wrap_generator(self, stage, func, described=None):
+        """
+            Time every ParameterSet yielded by generator function `func`
+            (named after `described` if func wraps another generator
+            function).
+        """
+        name = get_generator_name(stage, func if described is None
+                                  else described)
+
+        def wrapped(paramset):
+            generator = func(paramset)
+            while True:
+                start = time.perf_counter()
+                try:
+                    # only copies made while generating the next value
+                    with self.observe_copies():
+                        value = next(generator)
+                except StopIteration:
+                    self.record(name, time.perf_counter() - start, calls=0)
+                    return
+                self.record(name, time.perf_counter() - start)
+                yield value
+        return wrapped
+
+    def wrap_point(self, stage, func):
+        """
+            Time calls to `func.point` (used for random access).
+        """
+        name = get_generator_name(stage, func)
+
+        def point(paramset, index, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func.point(paramset, index, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return point
+
+
+def get_generator_name(stage, func):
+    """
+        Describe generator function `func` at index `stage`.
+    """
+    def describe_transform(transform):
+        path = transform.prms.get("path_to")
+        return type(transform).__name__ + (
+            "" if path is None else "({})".format(path))
+
+    if hasattr(func, "transforms"):
+        description = "Range[{}]".format(", ".join(
+            describe_transform(t) for t in func.transforms))
+    elif hasattr(func, "prms"):
+        description = describe_transform(func)
+    else:
+        description = getattr(func, "__name__", type(func).__name__)
+    return "generator[{}] {}".format(stage, description)
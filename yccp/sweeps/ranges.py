@@ -6,7 +6,7 @@
     transformations with different parameters to ParameterSets.
 """
 
-import collections as c
+import collections.abc as c
 
 from . import transforms as trans
 
@@ -47,13 +47,35 @@ class Range(object):
         self.transforms = transforms
         self.range_tuples = range_tuples
 
-    def __call__(self, paramset):
-        # apply several transformations at once
-        for tr in self.range_tuples:
-            p = paramset.copy()
+    def __call__(self, paramset, record=True, cow=False):
+        # generate one ParameterSet at a time (ranges can be long)
+        for index in range(len(self.range_tuples)):
+            yield self.point(paramset, index, record=record, cow=cow)
+
+    def __len__(self):
+        return len(self.range_tuples)
+
+    def modified_paths(self):
+        """
+            Return the paths modified by this range (None if unknown).
+        """
+        paths = []
+        for t in self.transforms:
+            modified = t.modified_paths()
+            if modified is None:
+                return None
+            paths.extend(modified)
+        return paths
 
-            for t, v in zip(self.transforms, tr):
-                t.set_value(v)
-                t.apply(p)
+    def point(self, paramset, index, record=True, cow=False):
+        """
+            Return the `index`-th ParameterSet generated from `paramset` (see
+            `Transform.apply_value` for record and `Transform.point` for cow).
+        """
+        p = paramset.copy(cow=cow)
+
+        # apply several transformations at once
+        for t, v in zip(self.transforms, self.range_tuples[index]):
+            t.apply_value(p, v, record=record)
 
-            yield p
+        return p
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+    Sinks store the serialized ParameterSets generated by `Sweep.dump`.
+
+    `FileSink` writes one file each (optionally via a pool of writer
+    threads), `BundleSink` writes all of them into a single bundle (see
+    `bundles`) and `DryRunSink` only logs what would be written.
+"""
+
+import concurrent.futures as cf
+import os.path as osp
+import time
+
+from . import bundles as b
+from . import manifest as mf
+from . import parametersets as p
+
+import logging
+log = logging.getLogger(__name__.split(".")[0])
+
+__all__ = [
+        "BundleSink",
+        "DryRunSink",
+        "FileSink",
+        "Sink",
+    ]
+
+
+class Sink(object):
+    """
+        Base class of all sinks.
+
+        Subclasses implement `_exists`, `_write` and `get_hash`. Names stored
+        during the dump are kept in `names`.
+    """
+
+    def __init__(self, profile=None):
+        """
+            Writes are recorded in profile (a `ProfileStats`) if not None.
+        """
+        self.profile = profile
+        self.names = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def exists(self, name):
+        """
+            Whether name was stored during the dump or exists already.
+        """
+        return name in self.names or self._exists(name)
+
+    def flush(self):
+        """
+            Wait for all pending writes (raising their errors).
+        """
+        pass
+
+    def get_hash(self, name):
+        """
+            Return the content hash of the stored entry name or None if it
+            does not exist.
+        """
+        raise NotImplementedError
+
+    def has_stored(self, name):
+        """
+            Whether name was stored during the dump.
+        """
+        return name in self.names
+
+    def store(self, name, content, sha1=None, overwrite=False,
+              checkpoint=None):
+        """
+            Store the serialized content of a generated ParameterSet and
+            return whether it is "new", "changed" or "unchanged".
+
+            Raise OSError (EEXIST) if name exists and overwrite is not set.
+
+            For incremental dumps, checkpoint is the `Checkpoint` of the
+            previous dump and content is None if the point is unchanged
+            according to it. Existing entries with the same content hash
+            (sha1) are not rewritten either and entries of the previous
+            dump are overwritten.
+        """
+        unchanged = False
+        if checkpoint is not None and checkpoint.incremental\
+                and name not in self.names:
+            if content is None:
+                unchanged = True
+            else:
+                stored = self.get_hash(name)
+                if stored == sha1:
+                    unchanged = True
+                elif stored is not None and name in checkpoint:
+                    # entry of a previous run that changed
+                    overwrite = True
+
+        if unchanged:
+            log.debug("Unchanged: {}".format(name))
+            self.names.add(name)
+            return "unchanged"
+
+        log.info("Writing: {}".format(name))
+        existed = self.exists(name)
+        p.check_overwrite(name, overwrite, exists=existed)
+        if self.profile is None:
+            self._write(name, content)
+        else:
+            start = time.perf_counter()
+            self._write(name, content)
+            self.profile.record("write", time.perf_counter() - start)
+            self.profile.bytes_written += len(content.encode("utf-8"))
+        self.names.add(name)
+        return "changed" if existed else "new"
+
+    def write_base(self, name, content, overwrite=False):
+        """
+            Write the base document of a delta-encoded dump (unless it exists
+            with the same content).
+        """
+        stored = self.get_hash(name)
+        if stored == mf.content_hash(content):
+            return
+        log.info("Writing base: {}".format(name))
+        p.check_overwrite(name, overwrite, exists=stored is not None)
+        self._write(name, content)
+
+    def _exists(self, name):
+        raise NotImplementedError
+
+    def _write(self, name, content):
+        raise NotImplementedError
+
+
+class FileSink(Sink):
+    """
+        Write every ParameterSet to its own file (named by its full path).
+
+        If workers is larger than one, files are written by as many threads
+        (in the order they are stored).
+    """
+
+    def __init__(self, workers=None, profile=None):
+        super(FileSink, self).__init__(profile=profile)
+        self.workers = workers
+        self._writer = None
+        if workers is not None and workers > 1:
+            self._writer = cf.ThreadPoolExecutor(max_workers=workers)
+        # filename -> future of pending writes (in submission order)
+        self._pending = {}
+        self._created_folders = set()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.shutdown()
+
+    def flush(self):
+        while len(self._pending) > 0:
+            self._pending.pop(next(iter(self._pending))).result()
+
+    def get_hash(self, name):
+        if not osp.isfile(name):
+            return None
+        return mf.file_hash(name)
+
+    def _exists(self, name):
+        return osp.isfile(name)
+
+    def _write(self, name, content):
+        folder = osp.dirname(name)
+        if folder not in self._created_folders:
+            p.create_folder(name)
+            self._created_folders.add(folder)
+
+        if self._writer is None:
+            p.write_serialized(name, content)
+            return
+
+        # same file written twice -> keep order
+        if name in self._pending:
+            self._pending.pop(name).result()
+        self._pending[name] = self._writer.submit(
+            p.write_serialized, name, content)
+        if len(self._pending) > 4 * self.workers:
+            self._pending.pop(next(iter(self._pending))).result()
+
+
+class BundleSink(Sink):
+    """
+        Write all ParameterSets as entries of the bundle filename (an
+        existing bundle is appended to).
+    """
+
+    def __init__(self, filename, profile=None):
+        super(BundleSink, self).__init__(profile=profile)
+        p.create_folder(filename)
+        log.info("Writing into bundle: {}".format(filename))
+        self.bundle = b.open_bundle(filename, mode="a")
+
+    def close(self):
+        self.bundle.close()
+
+    def get_hash(self, name):
+        if name not in self.bundle:
+            return None
+        return mf.content_hash(self.bundle.read(name))
+
+    def _exists(self, name):
+        return name in self.bundle
+
+    def _write(self, name, content):
+        self.bundle.write(name, content)
+
+
+class DryRunSink(Sink):
+    """
+        Only log which ParameterSets would be written.
+    """
+
+    def has_stored(self, name):
+        # nothing is actually stored
+        return False
+
+    def store(self, name, content, sha1=None, overwrite=False,
+              checkpoint=None):
+        """
+            Return None since nothing is stored.
+        """
+        log.info("Would write: {}".format(name))
+        self.names.add(name)
+        return None
+
+    def write_base(self, name, content, overwrite=False):
+        log.info("Would write base: {}".format(name))
@@ -1,22 +1,35 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import collections as c
+import concurrent.futures as cf
 import errno
+import functools as ft
 import inspect
 import itertools as it
 import logging
+import multiprocessing as mp
 import os
 import os.path as osp
+import pickle
+
+import numpy as np
 
 log = logging.getLogger(__name__.split(".")[0])
 
+from .. import prelude as pl
 from .. import utils as u
 
+from . import deltas as d
+from . import manifest as mf
 from . import namers as n
+from . import parametersets as p
+from . import profiling as prof
 from . import ranges as r
+from . import sinks
 from . import transforms as t
 
-__all__ = ["Sweep"]
+__all__ = ["DumpStats", "FilterStats", "Sweep"]
 
 
 class Sweep(object):
@@ -26,17 +39,52 @@ class Sweep(object):
         You can add Ranges, Transforms and filters (which are just functions
         ParameterSet -> bool).
 
+        If record_provenance is False, the applied Transforms are not recorded
+        in `_metainfo/transforms` of the generated ParameterSets (e.g. for
+        bulk dumps).
     """
     # string to inserted between name components
     filename_component_sep = "-"
 
-    def __init__(self):
+    # number of ParameterSets sent to a worker process at once (parallel dump)
+    dump_chunksize = 16
+
+    def __init__(self, record_provenance=True):
+        self.record_provenance = record_provenance
+
         # one namer per folder
         self.namer_folders = []
         self.namer_file = []
 
         self.generator_functions = []
         self.filters = []
+        # (filter, stage, paths) of filters applied before the leaves
+        self.staged_filters = []
+
+        # statistics of the last generated sweep
+        self.filter_stats = None
+        # statistics of the last dump
+        self.dump_stats = None
+
+        # profiling statistics (None if disabled, see `enable_profiling`)
+        self.profile_stats = None
+
+    def __len__(self):
+        """
+            Number of generated ParameterSets.
+
+            Only available if the sweep consists of Transforms and Ranges
+            without filters, see `count` otherwise.
+        """
+        if not self.is_indexable() or self.has_filters():
+            raise TypeError("Length of sweep is only known if it consists of "
+                            "Transforms and Ranges without filters, use "
+                            "count() instead.")
+        return self._num_unfiltered()
+
+    def __bool__(self):
+        # do not fall back to __len__, which might raise
+        return True
 
     def add(self, func):
         """
@@ -51,12 +99,35 @@ class Sweep(object):
 
         self.generator_functions.append(func)
 
-    def add_filter(self, filter):
+    def add_filter(self, filter, stage=None, paths=None):
         """
             Add a filter to trim the number of generated ParameterSets. A
             filter is as simple function that maps ParameterSet -> bool.
+
+            Per default, filters are applied to the fully generated
+            ParameterSets. If a filter only depends on values that are fixed
+            early on, it can be evaluated as soon as possible to prune whole
+            subtrees of the sweep:
+
+            stage:
+                Generator function (or its index) whose generated
+                ParameterSets are filtered (-1 for the ParameterSet passed to
+                the sweep).
+
+            paths:
+                Paths the filter depends on. It is evaluated after the last
+                generator function that might modify any of them (custom
+                generator functions might modify anything).
+
+            Only one of stage and paths can be given.
         """
-        self.filters.append(filter)
+        if stage is not None and paths is not None:
+            raise ValueError("Filters can either be added at a given stage "
+                             "or for the paths they depend on, not both.")
+        if stage is None and paths is None:
+            self.filters.append(filter)
+        else:
+            self.staged_filters.append((filter, stage, paths))
 
     def add_namers_folder(self, *namers):
         """
@@ -65,12 +136,30 @@ class Sweep(object):
         self.namer_folders.append(
             n.join(namers, sep=self.filename_component_sep))
 
+    def count(self, paramset):
+        """
+            Number of ParameterSets generated from paramset (falls back to
+            enumerating them if the length of the sweep is not known).
+        """
+        try:
+            return len(self)
+        except TypeError:
+            return sum(1 for _ in self.generate(paramset, cow=True))
+
     def dump(self,
              paramset,
              basefolder=None,
              write_files=True,
              overwrite_files=False,
-             failOnOverwrite=True):
+             failOnOverwrite=True,
+             workers=None,
+             shard=None,
+             manifest=None,
+             manifest_paths=None,
+             incremental=False,
+             bundle=None,
+             delta_base=None,
+             npy_threshold=None):
         """
             Generate new ParameterSets from paramset by applying all
             transforms, ranges and filters that were added.
@@ -80,38 +169,231 @@ class Sweep(object):
 
             If write_files is False, no files will be written, but the
             ParamaterSets will be generated one by one (useful for test runs).
+
+            If workers is larger than one, naming and serialization of the
+            generated ParameterSets is distributed over as many processes
+            and the files are written by as many threads. File names, the
+            handling of name collisions and the log are identical to the
+            serial run.
+
+            If shard is a tuple (k, n), only the k-th of n parts of the sweep
+            is dumped (see `shard`).
+
+            If manifest is not None, a `Manifest` (SQLite database) with the
+            index, filename, content hash and swept values (see
+            `get_swept_paths`, additional paths can be given in
+            manifest_paths) of every ParameterSet is written to that filename
+            (relative to basefolder).
+
+            If incremental is True, an existing manifest serves as checkpoint:
+            ParameterSets whose fingerprint did not change since it was
+            written are skipped without serializing them. Files not in the
+            checkpoint are compared to what is on disk by content hash and
+            only rewritten if they changed. Hence, an interrupted dump can be
+            resumed by running it again.
+
+            Returns the `DumpStats` of the dump (also stored in
+            `dump_stats`), e.g. how many files were new, changed or skipped
+            as unchanged.
+
+            If bundle is not None, all ParameterSets are stored in a single
+            bundle (see `bundles`) with that filename (relative to basefolder)
+            instead of one file each. Entries are named by the namers (without
+            basefolder) and an existing bundle is appended to. Load entries
+            via `ParameterSet(name, bundle=...)`.
+
+            If delta_base is not None, paramset is written once to that
+            filename (relative to basefolder or as entry of the bundle) and
+            only the differences to it are stored for every generated
+            ParameterSet (see `deltas`). They are rebuilt transparently when
+            loading them as ParameterSet.
+
+            If npy_threshold is not None, NumPy arrays of at least that many
+            bytes are written to side-car .npy files next to the generated
+            files (see `ParameterSet.write`, not supported for bundles).
         """
-        written_filenames = set()
+        if basefolder is None:
+            basefolder = os.getcwd()
+
+        if incremental and manifest is None:
+            raise ValueError("Incremental dumps require a manifest.")
+
+        if incremental and bundle is not None:
+            raise ValueError("Incremental dumps into bundles are not "
+                             "supported.")
+
+        if npy_threshold is not None and bundle is not None:
+            raise ValueError("Bundles do not support side-car .npy files.")
+
+        if not write_files:
+            npy_threshold = None
+
+        if isinstance(paramset, p.ParameterSet)\
+                and type(paramset).write is not p.ParameterSet.write:
+            log.warning("{}.write is not used by Sweep.dump, override "
+                        "serialize instead.".format(type(paramset).__name__))
+
+        # entries in bundles are named relative to basefolder
+        namefolder = basefolder if bundle is None else ""
+
+        # indices of the points of this shard (see `_iter_shard`)
+        index_start, index_stop, index_step = self._shard_indices(
+            *(shard or (0, 1)))
+        if shard is None:
+            # also remove entries of a previous larger sweep
+            index_stop = None
+
+        value_paths = None
+        checkpoint = None
+        if manifest is not None:
+            value_paths = self.get_swept_paths()
+            for path in manifest_paths or []:
+                if path not in value_paths:
+                    value_paths.append(path)
+            checkpoint = mf.Checkpoint(
+                osp.join(basefolder, manifest), value_paths,
+                incremental=incremental, start=index_start, stop=index_stop,
+                step=index_step)
+
+        profile = self.profile_stats
+        if not write_files:
+            sink = sinks.DryRunSink()
+        elif bundle is not None:
+            sink = sinks.BundleSink(osp.join(basefolder, bundle),
+                                    profile=profile)
+        else:
+            sink = sinks.FileSink(workers=workers, profile=profile)
+
+        delta = None
+        if delta_base is not None:
+            delta = (paramset.data, osp.join(namefolder, delta_base))
+
         overwritten_files = set()
-        for count, ps in enumerate(self.generate(paramset)):
-            fn = self.get_filename(ps, basefolder=basefolder)
+        self.dump_stats = stats = DumpStats()
+        try:
+            if delta is not None:
+                sink.write_base(delta[1], paramset.serialize(
+                    npy_threshold=npy_threshold,
+                    npy_folder=osp.dirname(delta[1])), overwrite_files)
+
+            for point in self._iter_named(
+                    paramset, namefolder, write_files or manifest is not None,
+                    workers, shard, value_paths, checkpoint, delta,
+                    npy_threshold):
+                stats.points += 1
+                fn = point.filename
+                if point.content is None and sink.has_stored(fn):
+                    # unchanged according to the checkpoint, but the file was
+                    # already (over)written by a colliding point of this run
+                    point.content = _serialize_point(
+                        self, point.get_paramset(), fn, delta, npy_threshold)
+
+                if point.content is not None:
+                    sha1 = mf.content_hash(point.content)
+                elif checkpoint is not None:
+                    sha1 = checkpoint.get_hash(fn)
+                else:
+                    sha1 = None
 
-            if write_files:
-                log.info("Writing: {}".format(fn))
                 try:
-                    ps.write(fn, overwrite=overwrite_files)
-                    written_filenames.add(fn)
+                    status = sink.store(fn, point.content, sha1,
+                                        overwrite_files, checkpoint)
                 except OSError as e:
                     if e.errno == errno.EEXIST and not failOnOverwrite:
                         overwritten_files.add(fn)
+                        stats.collisions += 1
+                        status = None
                     else:
                         raise
-            else:
-                log.info("Would write: {}".format(fn))
-                written_filenames.add(fn)
+                if status is not None:
+                    # new, changed or unchanged
+                    setattr(stats, status, getattr(stats, status) + 1)
+
+                if checkpoint is not None:
+                    checkpoint.add(point.index, fn, sha1, point.fingerprint,
+                                   status is not None, point.values)
+
+            sink.flush()
+            if checkpoint is not None:
+                # only within this shard
+                checkpoint.finish()
+        finally:
+            sink.close()
+            if checkpoint is not None:
+                checkpoint.close()
 
+        stats.files = len(sink.names)
         log.info("{} {} parameter sets ({} unique names).".format(
             "Wrote" if write_files else "Would write",
-            count + 1, len(written_filenames)))
+            stats.points, stats.files))
         if write_files:
             log.info("Name collision for {} files, overwrite set to {}".format(
                 len(overwritten_files), str(overwrite_files)))
+        if incremental:
+            log.info(str(stats))
+        if self.has_filters():
+            log.info(str(self.filter_stats))
+        if profile is not None:
+            log.info("Profile:\n{}".format(profile))
+
+        return stats
+
+    def generate(self, paramset, cow=False):
+        """
+            Yield all ParameterSets generated from paramset.
+
+            If cow is True, ParameterSets generated by Ranges and Transforms
+            share data copy-on-write (see `ParameterSet`) with paramset and
+            each other. Then, every ParameterSet has to be used before the
+            next one is generated (custom generator functions might keep
+            modifying their ParameterSet) and `unshare` has to be called
+            before modifying its values in place.
+        """
+        stage_filters = self._get_stage_filters()
+        self.filter_stats = stats = FilterStats(self._get_subtree_sizes())
+
+        if stage_filters[0] is not None and not stage_filters[0](paramset):
+            stats.reject(0)
+            return
+
+        profile = self.profile_stats
+        generator_functions = []
+        for i, func in enumerate(self.generator_functions):
+            if isinstance(func, (t.Transform, r.Range)):
+                generator = ft.partial(func, record=self.record_provenance,
+                                       cow=cow)
+            else:
+                # Ranges and Transforms might generate copy-on-write copies,
+                # custom generator functions might modify their argument in
+                # place
+                generator = _unshared(func)
+            if profile is not None:
+                generator = profile.wrap_generator(i, generator,
+                                                   described=func)
+            generator_functions.append(generator)
+
+        chained = u.chain_generator_functions(
+            generator_functions, filters=stage_filters[1:],
+            on_reject=lambda i: stats.reject(i + 1))(paramset)
 
-    def generate(self, paramset):
-        for p in u.chain_generator_functions(
-                self.generator_functions)(paramset):
-            if all(f(p) for f in self.filters):
-                yield p
+        # copies are observed per generated point (see
+        # `ProfileStats.wrap_generator`)
+        for ps in chained:
+            yield ps
+
+    def enable_profiling(self, callback=None):
+        """
+            Collect timers of all stages of the pipeline (generator functions,
+            filters, copies, naming, serialization and writing) in
+            `profile_stats` (see `profiling.ProfileStats` for callback).
+
+            Statistics accumulate until profiling is enabled again.
+        """
+        self.profile_stats = prof.ProfileStats(callback=callback)
+        return self.profile_stats
+
+    def disable_profiling(self):
+        self.profile_stats = None
 
     def get_filename(self, paramset, basefolder=None):
         """
@@ -128,11 +410,648 @@ class Sweep(object):
 
         return osp.join(*components) + ".yaml"
 
+    def _iter_named(self, paramset, basefolder, serialize, workers,
+                    shard=None, value_paths=None, checkpoint=None,
+                    delta=None, npy_threshold=None):
+        """
+            Yield a `_PreparedPoint` for every generated ParameterSet (see
+            `_prepare_point` and `_iter_shard` for the index).
+
+            If workers is larger than one, they are prepared by a pool of
+            worker processes.
+        """
+        # every point is consumed before the next one is generated
+        points = self._iter_shard(paramset, *(shard or (0, 1)), cow=True)
+
+        args = (basefolder, serialize, value_paths, checkpoint, delta,
+                npy_threshold)
+
+        if workers is not None and workers > 1\
+                and "fork" not in mp.get_all_start_methods():
+            # the sweep cannot be pickled (namers are closures), hence
+            # worker processes have to be forked
+            log.warning("Dumping serially: Parallel dumps require worker "
+                        "processes to be forked, which is not supported on "
+                        "this platform.")
+            workers = None
+
+        if workers is None or workers <= 1:
+            for index, ps in points:
+                point = _prepare_point(self, index, ps, *args)
+                point.paramset = ps
+                yield point
+            return
+
+        context = mp.get_context("fork")
+
+        # generators may keep modifying a ParameterSet after yielding it,
+        # hence it is pickled right away instead of once its chunk is full
+        # (snapshots are kept until their point is yielded, see above)
+        pending = {}
+
+        def snapshots():
+            for index, ps in points:
+                pending[index] = pickle.dumps(
+                    ps, protocol=pickle.HIGHEST_PROTOCOL)
+                yield index, pending[index]
+
+        with cf.ProcessPoolExecutor(
+                max_workers=workers, mp_context=context,
+                initializer=_init_dump_worker,
+                initargs=(self,) + args) as pool:
+            for point, events in u.map_chunked(
+                    pool, _prepare_point_in_worker, snapshots(),
+                    chunksize=self.dump_chunksize, max_pending=2 * workers):
+                for name, duration in events or ():
+                    self.profile_stats.record(name, duration)
+                point.paramset = pending.pop(point.index)
+                yield point
+
+    def _get_stage_filters(self):
+        """
+            Return one combined filter (or None) per stage: Stage 0 is the
+            ParameterSet passed to the sweep, stage i+1 the ParameterSets
+            generated by the i-th generator function.
+        """
+        stage_filters = [[] for _ in range(len(self.generator_functions) + 1)]
+
+        for filter, stage, paths in self.staged_filters:
+            if stage is None:
+                stage = self._get_last_modifying(paths)
+            elif not isinstance(stage, int):
+                indices = [i for i, func in enumerate(self.generator_functions)
+                           if func is stage]
+                if len(indices) == 0:
+                    raise ValueError("Filter stage {} was not added to the "
+                                     "sweep.".format(stage))
+                stage = indices[-1]
+            stage_filters[stage + 1].append(filter)
+
+        stage_filters[-1].extend(self.filters)
+
+        stage_filters = [_combine_filters(filters)
+                         for filters in stage_filters]
+        if self.profile_stats is not None:
+            stage_filters = [self.profile_stats.wrap_filter(i, f)
+                             for i, f in enumerate(stage_filters)]
+        return stage_filters
+
+    def _get_last_modifying(self, paths):
+        """
+            Return the index of the last generator function that might modify
+            any of the given paths (-1 if there is none).
+        """
+        for i in reversed(range(len(self.generator_functions))):
+            modified = getattr(self.generator_functions[i],
+                               "modified_paths", lambda: None)()
+            if modified is None or any(_paths_overlap(m, path)
+                                       for m in modified for path in paths):
+                return i
+        return -1
+
+    def _get_subtree_sizes(self):
+        """
+            Return the number of leaves below a ParameterSet of each stage
+            (see `_get_stage_filters`), None if unknown.
+        """
+        sizes = [1]
+        for func in reversed(self.generator_functions):
+            if sizes[0] is None or not isinstance(func, (t.Transform,
+                                                         r.Range)):
+                sizes.insert(0, None)
+            else:
+                sizes.insert(0, sizes[0] * len(func))
+        return sizes
+
+    def _iter_slice(self, paramset, start, stop, stage=0, stage_filters=None,
+                    stats=None, base=0, cow=False):
+        """
+            Yield (index, ParameterSet) for all indices in [start, stop) of
+            the subtree below `paramset` at `stage` of the generator functions
+            (indices are offset by `base`).
+
+            Indices are mixed-radix numbers with one digit per generator
+            function (the last one varying fastest), ParameterSets of common
+            prefixes are only generated once.
+
+            If given, `stage_filters` (see `_get_stage_filters`) are applied
+            and rejections are recorded in `stats` (see `generate` for cow).
+        """
+        if start >= stop:
+            # also the case if any Range is empty (stride would be zero)
+            return
+
+        if stage == len(self.generator_functions):
+            yield base, paramset
+            return
+
+        stride = 1
+        for func in self.generator_functions[stage+1:]:
+            stride *= len(func)
+
+        func = self.generator_functions[stage]
+        for digit in range(start // stride, -(-stop // stride)):
+            offset = digit * stride
+            sub_start = max(start - offset, 0)
+            sub_stop = min(stop - offset, stride)
+
+            if self.profile_stats is None:
+                child = func.point(paramset, digit,
+                                   record=self.record_provenance, cow=cow)
+            else:
+                with self.profile_stats.observe_copies():
+                    child = self.profile_stats.wrap_point(stage, func)(
+                        paramset, digit, record=self.record_provenance,
+                        cow=cow)
+
+            if stage_filters is not None:
+                predicate = stage_filters[stage + 1]
+                if predicate is not None and not predicate(child):
+                    if stats is not None:
+                        stats.reject(stage + 1, leaves=sub_stop - sub_start)
+                    continue
+
+            for indexed in self._iter_slice(child, sub_start, sub_stop,
+                                            stage=stage+1,
+                                            stage_filters=stage_filters,
+                                            stats=stats, base=base+offset,
+                                            cow=cow):
+                yield indexed
+
+    def _num_unfiltered(self):
+        num = 1
+        for func in self.generator_functions:
+            num *= len(func)
+        return num
+
     def get_namers(self):
         return it.chain(self.namer_folders, (self.namer_file,))
 
+    def get_swept_paths(self):
+        """
+            Return all paths modified by the Transforms and Ranges of this
+            sweep (in order of appearance).
+        """
+        paths = []
+        for func in self.generator_functions:
+            for path in getattr(func, "modified_paths", lambda: None)() or []:
+                if path not in paths:
+                    paths.append(path)
+        return paths
+
+    def has_filters(self):
+        return len(self.filters) + len(self.staged_filters) > 0
+
+    def is_indexable(self):
+        """
+            Whether the ParameterSets can be accessed by index directly (i.e.,
+            the sweep only consists of Transforms and Ranges).
+        """
+        return all(isinstance(func, (t.Transform, r.Range))
+                   for func in self.generator_functions)
+
+    def point(self, paramset, index, cow=False):
+        """
+            Return the `index`-th ParameterSet that would be generated from
+            paramset (see `generate` for cow).
+
+            If the sweep is indexable and has no filters, only the requested
+            ParameterSet is created, otherwise all previous ones are
+            enumerated.
+        """
+        if self.is_indexable() and not self.has_filters():
+            num = len(self)
+            if index < 0:
+                index += num
+            if not 0 <= index < num:
+                raise IndexError("Sweep index out of range.")
+            return next(self._iter_slice(paramset, index, index + 1,
+                                         cow=cow))[1]
+
+        if index < 0:
+            index += self.count(paramset)
+        if index >= 0:
+            # only the requested ParameterSet is kept
+            for ps in it.islice(self.generate(paramset, cow=True), index,
+                                None):
+                return ps if cow else ps.copy()
+        raise IndexError("Sweep index out of range.")
+
     def set_namers_file(self, *namers):
         """
             Add another namer for the filename.
         """
         self.namer_file = n.join(namers, sep=self.filename_component_sep)
+
+    def shard(self, paramset, k, n, cow=False):
+        """
+            Iterate over the k-th of n disjoint parts of the ParameterSets
+            generated from paramset (0 <= k < n). Together, all parts yield the
+            same ParameterSets as `generate` (see there for cow).
+
+            If the sweep is indexable, the k-th contiguous block of indices is
+            generated directly. Otherwise all ParameterSets are enumerated and
+            every n-th (starting at k) is yielded.
+        """
+        for _, ps in self._iter_shard(paramset, k, n, cow=cow):
+            yield ps
+
+    def _shard_indices(self, k, n):
+        """
+            Return (start, stop, step) of the indices of the k-th of n shards
+            (see `_iter_shard`, stop is None if unknown).
+        """
+        if not 0 <= k < n:
+            raise ValueError("Shard {} does not exist for {} shards.".format(
+                k, n))
+        if self.is_indexable():
+            num = self._num_unfiltered()
+            return k * num // n, (k + 1) * num // n, 1
+        else:
+            return k, None, n
+
+    def _iter_shard(self, paramset, k, n, cow=False):
+        """
+            Yield (index, ParameterSet) for the k-th of n shards (see `shard`).
+
+            The index is global: For indexable sweeps, it is the index among
+            all ParameterSets before filtering (hence, filters leave gaps),
+            otherwise the index among all generated ParameterSets.
+        """
+        start, stop, step = self._shard_indices(k, n)
+
+        if self.is_indexable():
+            stage_filters = self._get_stage_filters()
+            self.filter_stats = stats = FilterStats(self._get_subtree_sizes())
+
+            if stage_filters[0] is not None and not stage_filters[0](paramset):
+                stats.reject(0, leaves=stop - start)
+                return
+
+            for indexed in self._iter_slice(paramset, start, stop,
+                                            stage_filters=stage_filters,
+                                            stats=stats, cow=cow):
+                yield indexed
+        else:
+            for i, ps in enumerate(it.islice(self.generate(paramset, cow=cow),
+                                             start, None, step)):
+                yield start + i * step, ps
+
+    def to_table(self, paramset, paths=None, filenames=True, basefolder=None,
+                 as_dict=False):
+        """
+            Return the values of all ParameterSets generated from paramset as
+            NumPy structured array with one row per ParameterSet (in order of
+            generation) and one field per path (defaults to
+            `get_swept_paths`). Nothing is written.
+
+            If filenames is True, the field "filename" holds the filenames as
+            generated by the namers (see `get_filename` for basefolder).
+
+            If as_dict is True, a dictionary of arrays (field -> column) is
+            returned instead.
+
+            If possible (no filenames, no filters and all paths are either
+            only set by `SetValue`s or not modified at all), the values are
+            taken directly from the Ranges without generating any
+            ParameterSets.
+        """
+        if paths is None:
+            paths = self.get_swept_paths()
+
+        columns = None
+        if not filenames:
+            columns = self._get_columns_from_ranges(paramset, paths)
+
+        if columns is None:
+            compiled = [u.compile_path(path) for path in paths]
+            rows = []
+            names = []
+            for ps in self.generate(paramset, cow=True):
+                rows.append([path.retrieve(ps.data) for path in compiled])
+                if filenames:
+                    names.append(self.get_filename(ps, basefolder=basefolder))
+            columns = c.OrderedDict(
+                (path, _to_column([row[i] for row in rows]))
+                for i, path in enumerate(paths))
+            if filenames:
+                columns["filename"] = _to_column(names)
+                columns.move_to_end("filename", last=False)
+
+        if as_dict:
+            return columns
+
+        num = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        table = np.empty(num, dtype=[(name, column.dtype)
+                                     for name, column in columns.items()])
+        for name, column in columns.items():
+            table[name] = column
+        return table
+
+    def _get_columns_from_ranges(self, paramset, paths):
+        """
+            Return the columns for all paths computed from the values of the
+            Ranges (or None if that is not possible).
+        """
+        if not self.is_indexable() or self.has_filters():
+            return None
+
+        # (stage, index of transform) setting each path (None if constant)
+        sources = []
+        for path in paths:
+            if path.strip("/").split("/")[0] == "_metainfo":
+                return None
+            source = None
+            for stage, func in enumerate(self.generator_functions):
+                if isinstance(func, r.Range):
+                    transforms = func.transforms
+                elif isinstance(func, t.Transform):
+                    transforms = [func]
+                else:
+                    return None
+                for j, transform in enumerate(transforms):
+                    modified = transform.modified_paths()
+                    if modified is None:
+                        return None
+                    if not any(_paths_overlap(path, m) for m in modified):
+                        continue
+                    if type(transform) is t.SetValue\
+                            and transform.prms["path_to"] == path:
+                        source = (stage, j)
+                    else:
+                        return None
+            sources.append(source)
+
+        lengths = [len(func) for func in self.generator_functions]
+        num = int(np.prod(lengths))
+
+        columns = c.OrderedDict()
+        for path, source in zip(paths, sources):
+            if source is None:
+                value = u.retrieve_path(paramset.data, path)
+                columns[path] = _to_column([value] * num)
+                continue
+
+            stage, j = source
+            func = self.generator_functions[stage]
+            if isinstance(func, r.Range):
+                values = [rt[j] for rt in func.range_tuples]
+            else:
+                values = [func.prms["value"]]
+            values = _to_column(values)
+            stride = int(np.prod(lengths[stage+1:]))
+            repeats = int(np.prod(lengths[:stage]))
+            columns[path] = np.tile(np.repeat(values, stride), repeats)
+        return columns
+
+
+class DumpStats(object):
+    """
+        Statistics of a `Sweep.dump`.
+
+        Files are counted as new, changed (rewritten) or unchanged (skipped,
+        only in incremental dumps), collisions are files that were not
+        overwritten by another point of the dump (see `failOnOverwrite`).
+    """
+
+    def __init__(self):
+        # number of generated ParameterSets
+        self.points = 0
+        # number of unique filenames
+        self.files = 0
+        self.new = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.collisions = 0
+
+    def __str__(self):
+        return "Dumped {} parameter sets: {} new, {} changed and {} "\
+            "unchanged (skipped) files.".format(
+                self.points, self.new, self.changed, self.unchanged)
+
+    @property
+    def written(self):
+        """
+            Number of files actually written.
+        """
+        return self.new + self.changed
+
+
+class FilterStats(object):
+    """
+        Statistics about the filters of a sweep, collected while generating.
+
+        Stage 0 is the ParameterSet passed to the sweep, stage i+1 the
+        ParameterSets generated by the i-th generator function.
+    """
+
+    def __init__(self, subtree_sizes):
+        # number of leaves below a ParameterSet of each stage (None if unknown)
+        self.subtree_sizes = subtree_sizes
+        # number of rejected ParameterSets per stage
+        self.rejected = [0] * len(subtree_sizes)
+        # number of leaves never generated because of pruned subtrees
+        self.leaves_avoided = 0
+        # number of pruned subtrees whose number of leaves is unknown
+        self.subtrees_unknown = 0
+
+    def __str__(self):
+        return "Filters pruned {} subtrees ({} leaves avoided{}) and "\
+            "rejected {} parameter sets.".format(
+                self.pruned, self.leaves_avoided,
+                "" if self.subtrees_unknown == 0 else
+                ", {} subtrees of unknown size".format(self.subtrees_unknown),
+                self.rejected[-1])
+
+    @property
+    def pruned(self):
+        """
+            Number of subtrees pruned before reaching the leaves.
+        """
+        return sum(self.rejected[:-1])
+
+    def reject(self, stage, leaves=None):
+        """
+            Record a rejected ParameterSet at `stage`. `leaves` defaults to the
+            full subtree size of that stage.
+        """
+        self.rejected[stage] += 1
+        if stage == len(self.rejected) - 1:
+            # leaves themselves were generated
+            return
+        if leaves is None:
+            leaves = self.subtree_sizes[stage]
+        if leaves is None:
+            self.subtrees_unknown += 1
+        else:
+            self.leaves_avoided += leaves
+
+
+def _unshared(func):
+    """
+        Wrap generator function func so that it is only passed ParameterSets
+        that do not share any data (see `ParameterSet.unshare`).
+    """
+    def wrapped(paramset):
+        return func(paramset.unshare())
+    return wrapped
+
+
+def _combine_filters(filters):
+    if len(filters) == 0:
+        return None
+    elif len(filters) == 1:
+        return filters[0]
+    else:
+        return lambda paramset: all(f(paramset) for f in filters)
+
+
+def _paths_overlap(path_a, path_b):
+    """
+        Whether one of the paths is contained in the other.
+    """
+    split_a = path_a.strip("/").split("/")
+    split_b = path_b.strip("/").split("/")
+    if split_a[0] in pl.default_prelude_attr\
+            or split_b[0] in pl.default_prelude_attr:
+        # prelude values can affect expressions anywhere (reactive
+        # ParameterSets)
+        return True
+    num = min(len(split_a), len(split_b))
+    return split_a[:num] == split_b[:num]
+
+
+def _to_column(values):
+    """
+        Convert a list of values to a one-dimensional array (of dtype object
+        if the values are not scalars of a common type).
+    """
+    try:
+        column = np.asarray(values)
+    except ValueError:
+        column = None
+    if column is None or column.ndim != 1 or len(column) != len(values):
+        column = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            column[i] = value
+    return column
+
+
+# arguments to `_prepare_point` in dump worker processes
+_dump_worker_args = None
+
+
+def _init_dump_worker(*args):
+    global _dump_worker_args
+    _dump_worker_args = args
+
+
+def _prepare_point_in_worker(snapshot):
+    """
+        Return the prepared point and the profiled events (name, duration) to
+        be recorded in the main process (None if profiling is disabled).
+    """
+    sweep = _dump_worker_args[0]
+    index, pickled = snapshot
+    events = None
+    if sweep.profile_stats is not None:
+        events = []
+        sweep.profile_stats = prof.ProfileStats(
+            callback=lambda name, duration: events.append((name, duration)))
+    point = _prepare_point(sweep, index, pickle.loads(pickled),
+                           *_dump_worker_args[1:])
+    return point, events
+
+
+class _PreparedPoint(object):
+    """
+        A generated ParameterSet prepared for dumping (see `_prepare_point`).
+
+        The ParameterSet itself is attached as `paramset` (pickled if it was
+        prepared by a worker process) to serialize it after all,
+        `get_paramset` has to be called before the next point is generated.
+    """
+
+    __slots__ = ["index", "filename", "content", "values", "fingerprint",
+                 "paramset"]
+
+    def __init__(self, index, filename, content=None, values=None,
+                 fingerprint=None):
+        self.index = index
+        self.filename = filename
+        self.content = content
+        self.values = values
+        self.fingerprint = fingerprint
+        self.paramset = None
+
+    def get_paramset(self):
+        if isinstance(self.paramset, bytes):
+            return pickle.loads(self.paramset)
+        return self.paramset
+
+
+def _prepare_point(sweep, index, paramset, basefolder, serialize, value_paths,
+                   checkpoint, delta=None, npy_threshold=None):
+    """
+        Return the `_PreparedPoint` (filename, serialized content, values and
+        fingerprint) of a generated ParameterSet.
+
+        Values for `value_paths` are only extracted if it is not None. The
+        fingerprint is only computed for incremental dumps (i.e. if
+        checkpoint is an incremental `Checkpoint`).
+
+        Content is None if not `serialize` or if the checkpoint holds the same
+        fingerprint for the filename and the file exists (i.e., it is
+        unchanged).
+
+        If delta is not None, it is a tuple (base data, base filename) and
+        only the differences to the base are serialized.
+
+        Large NumPy arrays are externalized according to npy_threshold (see
+        `prelude.dump`).
+    """
+    profile = sweep.profile_stats
+
+    if profile is None:
+        fn = sweep.get_filename(paramset, basefolder=basefolder)
+    else:
+        with profile.measure("namers"):
+            fn = sweep.get_filename(paramset, basefolder=basefolder)
+
+    values = None
+    if value_paths is not None:
+        values = mf.extract_values(paramset, value_paths)
+
+    fingerprint = None
+    unchanged = False
+    if checkpoint is not None and checkpoint.incremental:
+        if profile is None:
+            fingerprint = paramset.fingerprint()
+        else:
+            with profile.measure("fingerprint"):
+                fingerprint = paramset.fingerprint()
+        unchanged = checkpoint.is_unchanged(fn, fingerprint)\
+            and osp.isfile(fn)
+
+    content = None
+    if serialize and not unchanged:
+        content = _serialize_point(sweep, paramset, fn, delta, npy_threshold)
+
+    return _PreparedPoint(index, fn, content, values, fingerprint)
+def _serialize_point(sweep, paramset, fn, delta=None, npy_threshold=None):
+    """
+        Return the serialized content of a generated ParameterSet to be
+        written to fn (see `_prepare_point` for delta and npy_threshold).
+    """
+    if delta is None:
+        # subclasses of ParameterSet may customize serialization
+        dump = paramset.serialize
+    else:
+        base_data, base_filename = delta
+        dump = ft.partial(pl.dump, d.make_delta(
+            base_filename, fn, *d.diff(base_data, paramset.data)))
+
+    if sweep.profile_stats is None:
+        return dump(npy_threshold=npy_threshold, npy_folder=osp.dirname(fn))
+    with sweep.profile_stats.measure("serialize"):
+        return dump(npy_threshold=npy_threshold, npy_folder=osp.dirname(fn))
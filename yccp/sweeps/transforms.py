@@ -5,50 +5,377 @@
     Transformators used in sweeps.
 """
 
+import collections.abc as _abc
+import copy as _copy
+import functools as _ft
+import inspect as _inspect
+import types as _types
+import warnings as _warnings
+
+import yaml as _yaml
+
 from .. import meta as _m
+from .. import prelude as _pl
 from .. import utils as _u
 
 
+class Record(_abc.Mapping):
+    """
+        Entry of `_metainfo/transforms` of a Transform with
+        `lazy_description`.
+
+        Behaves like the dictionary {"name": ..., "description": ...}, the
+        description is only rendered when accessed (e.g. when the
+        ParameterSet is written). Hence, records capture the parameters of
+        the Transform needed for the description (see
+        `Transform.description_parameters`), the used value and the
+        information returned by `Transform.transform` when they are created.
+        Values that are not scalars are converted to the strings used in the
+        description right away (so that records neither keep large arrays
+        alive nor change along with them).
+
+        Records are not modified once created, copies are the record itself.
+        Pickled records keep the captured fields (and are rendered after
+        unpickling), unless they refer to functions that can only be pickled
+        by value (e.g. lambdas), then the rendered dictionary is pickled.
+    """
+
+    __slots__ = ["name", "prms", "value", "info", "_describe",
+                 "_description"]
+
+    def __init__(self, transform, value, info):
+        self.name = transform.__class__.__name__
+        prms = transform.prms
+        keys = transform.description_parameters
+        self.prms = {}
+        for k in (prms if keys is None else keys):
+            prm = prms[k]
+            if type(prm) not in _shared_types:
+                prm = _copy.deepcopy(prm)
+            self.prms[k] = prm
+        self.value = _summarize(value)
+        self.info = _summarize(info)
+        self._describe = type(transform).describe_transform
+        self._description = None
+
+    @property
+    def path(self):
+        return self.prms.get("path_to")
+
+    @property
+    def description(self):
+        if self._description is None:
+            # the record stands in for the Transform, describe_transform
+            # only uses the captured prms
+            self._description = self._describe(
+                self, None, self.value, self.info)
+        return self._description
+
+    def __getitem__(self, key):
+        if key == "name":
+            return self.name
+        elif key == "description":
+            return self.description
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("name", "description"))
+
+    def __len__(self):
+        return 2
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        if not _is_global(self._describe) or any(
+                isinstance(prm, _types.FunctionType) and not _is_global(prm)
+                for prm in self.prms.values()):
+            return (dict, (self.as_dict(),))
+        # the rendered description is not part of the state (e.g. for
+        # fingerprints)
+        return (_restore_record, (self.name, self.prms, self.value,
+                                  self.info, self._describe))
+
+    def __repr__(self):
+        return "Record({!r})".format(self.as_dict())
+
+    def as_dict(self):
+        return {"name": self.name, "description": self.description}
+
+
+def _restore_record(name, prms, value, info, describe):
+    record = Record.__new__(Record)
+    record.name = name
+    record.prms = prms
+    record.value = value
+    record.info = info
+    record._describe = describe
+    record._description = None
+    return record
+
+
+def _is_global(function):
+    """
+        Whether function can be pickled by reference (i.e., it is neither a
+        lambda nor defined locally).
+    """
+    return "<" not in getattr(function, "__qualname__", "<")
+
+
+# immutable types
+_scalar_types = (type(None), bool, int, float, complex, str, bytes)
+_exact_scalar_types = frozenset(_scalar_types)
+# types of parameters not copied by records
+_shared_types = frozenset(_scalar_types + (_types.FunctionType,))
+
+
+def _summarize(value):
+    """
+        Return value if it is a scalar (or a tuple of such), otherwise the
+        string it is formatted as in descriptions.
+    """
+    if type(value) in _exact_scalar_types:
+        return value
+    elif isinstance(value, tuple):
+        return tuple([_summarize(v) for v in value])
+    elif isinstance(value, _scalar_types):
+        return value
+    return str(value)
+
+
+_yaml.add_representer(
+    Record, lambda dumper, record: dumper.represent_dict(record.as_dict()),
+    Dumper=_pl.YccpDumper)
+
+
+def get_function_source(function):
+    """
+        Return the source of function (cached, reading and tokenizing the
+        source file is expensive).
+    """
+    try:
+        return _get_function_source_cached(function)
+    except TypeError:
+        # unhashable callable
+        return _get_function_source(function)
+
+
+def _get_function_source(function):
+    try:
+        return _inspect.getsource(function)
+    except (IOError, TypeError):
+        return "a function"
+
+
+_get_function_source_cached = _ft.lru_cache(maxsize=256)(_get_function_source)
+
+
+@_ft.lru_cache(maxsize=None)
+def _overrides(cls, name, overridden):
+    """
+        Whether method `name` is defined in a more derived class than
+        method `overridden` (e.g. `modify` in a subclass of a builtin
+        Transform implementing `transform`).
+    """
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            return overridden not in vars(klass)
+        elif overridden in vars(klass):
+            return False
+    return False
+
+
+def _deprecated_attribute(name):
+    """
+        Property for a value of the last application that Transforms used to
+        store in attribute `name` (deprecated: not thread-safe, the values
+        are returned by `transform`).
+    """
+    private = "_" + name
+
+    def fget(self):
+        _warnings.warn(
+            "{}.{} is deprecated, use the information returned by "
+            "transform() instead.".format(type(self).__name__, name),
+            DeprecationWarning, stacklevel=2)
+        return getattr(self, private, None)
+
+    def fset(self, value):
+        setattr(self, private, value)
+
+    return property(fget, fset, doc="Deprecated, see `transform`.")
+
+
 class Transform(object, metaclass=_m.InheritDefaults):
     """
         Transform a single parameter set.
+
+        Transforms are stateless: `apply_value` and `apply_batch` take the
+        value to use as argument instead of modifying the Transform (see
+        `SetValue.set_value`), hence the same Transform can be applied
+        concurrently from several threads.
+
+        Subclasses implement `transform` and `describe_transform` (or, for
+        stateful Transforms, `modify` and `describe`). If a subclass of a
+        builtin Transform implements `modify` (`describe`), it is used instead
+        of the `transform` (`describe_transform`) of the builtin Transform and
+        the used value is set in `prms` (i.e., the subclass is stateful, see
+        `_is_stateful`).
+
+        If `lazy_description` is True, `describe_transform` does not need the
+        ParameterSet and is only called when the record of the transformation
+        is accessed (see `Record`). It may then only use the parameters in
+        `description_parameters` (None for all).
+
+        If record is False, the transformation is not recorded in
+        `_metainfo/transforms` (see `Sweep`).
     """
 
     default_parameters = {}
 
-    def apply(self, paramset):
+    lazy_description = False
+    description_parameters = None
+
+    def apply(self, paramset, record=True):
         """
             Transform dataset.
         """
-        self.modify(paramset)
-        self.record(paramset)
+        return self.apply_value(paramset, self.prms.get("value"),
+                                record=record)
+
+    def apply_value(self, paramset, value, record=True):
+        """
+            Transform dataset using `value` instead of the configured value.
+        """
+        if self._is_stateful():
+            if "value" in self.prms:
+                self.prms["value"] = value
+            # might modify the data directly
+            info = self.modify(paramset.unshare())
+            if info is None:
+                info = self._get_stateful_info()
+        else:
+            info = self.transform(paramset, value)
+        if record:
+            self.record(paramset, value, info)
         return paramset
 
-    def __call__(self, paramset):
-        new = paramset.copy()
-        self.apply(new)
-        yield new
+    def apply_batch(self, paramsets, values, record=True):
+        """
+            Transform every ParameterSet in paramsets with the corresponding
+            value (see `apply_value`), returns paramsets.
+        """
+        for paramset, value in zip(paramsets, values):
+            self.apply_value(paramset, value, record=record)
+        return paramsets
+
+    def __call__(self, paramset, record=True, cow=False):
+        yield self.point(paramset, 0, record=record, cow=cow)
+
+    def __len__(self):
+        return 1
+
+    def point(self, paramset, index, record=True, cow=False):
+        """
+            Return the `index`-th ParameterSet generated from `paramset` (a
+            Transform only generates a single one).
+
+            If cow is True, it shares data with paramset copy-on-write (see
+            `ParameterSet.copy`).
+        """
+        if index != 0:
+            raise IndexError("Transforms only generate a single ParameterSet.")
+        new = paramset.copy(cow=cow)
+        self.apply(new, record=record)
+        return new
+
+    def transform(self, paramset, value):
+        """
+            Actually modify the parameter set using value (via item
+            assignment/deletion or `get_mutable`, its data might be shared
+            copy-on-write).
+
+            Returns information about the modification that is passed on to
+            `describe_transform` (e.g. the original value). Must not modify
+            the Transform itself.
+        """
+        return self.modify(paramset)
+
+    def describe_transform(self, paramset, value, info):
+        """
+            Return an object describing the transformation (`info` as
+            returned by `transform`, paramset is None for
+            `lazy_description`).
+        """
+        return self.describe(paramset)
 
     def modify(self, paramset):
         """
-            Actually modify the parameter set.
+            Actually modify the parameter set (see `transform`).
         """
         raise NotImplementedError
 
+    def modified_paths(self):
+        """
+            Return the paths modified by this transformation (None if
+            unknown).
+
+            Custom Transforms might modify anything, hence only the builtin
+            ones declare their paths (not if a subclass implements `modify`,
+            see `_declares_paths`).
+
+            Note: The record in `_metainfo/transforms` is not included.
+        """
+        return None
+
     def describe(self, paramset):
         """
             Return an object describing the transformation.
         """
         raise NotImplementedError
 
-    def record(self, paramset):
+    def _is_stateful(self):
+        """
+            Whether the stateful `modify` is used instead of `transform`.
+        """
+        return _overrides(type(self), "modify", "transform")
+
+    def _get_stateful_info(self):
+        """
+            Return the information to describe the last application of a
+            stateful Transform whose `modify` does not return it (e.g. from
+            the attributes it set).
+        """
+        return None
+
+    def _declares_paths(self):
+        """
+            Whether the paths of a builtin Transform are known: Subclasses
+            implementing `modify` might modify anything.
+        """
+        return not _overrides(type(self), "modify", "transform")
+
+    def record(self, paramset, value=None, info=None):
         """
             Record that this transformation took place.
         """
-        paramset.metainfo["transforms"].append({
+        stateful = _overrides(type(self), "describe", "describe_transform")
+        # stateful Transforms are described right away (errors surface
+        # where they are caused)
+        if self.lazy_description and not stateful\
+                and not self._is_stateful():
+            entry = Record(self, value, info)
+        else:
+            entry = {
                 "name" : self.__class__.__name__,
-                "description" : self.describe(paramset),
-            })
+                "description" : self.describe(paramset) if stateful else
+                    self.describe_transform(paramset, value, info),
+            }
+        paramset.get_mutable("_metainfo/transforms").append(entry)
 
 
 class SetValue(Transform):
@@ -63,23 +390,33 @@ class SetValue(Transform):
                 "value" : None,
             }
 
+    lazy_description = True
+    description_parameters = ("path_to",)
+
     def set_value(self, value):
         """
-            Change the used value after the fact (i.e. from Ranges).
+            Change the used value after the fact.
+
+            Note: Use `apply_value` to apply the Transform with different
+            values (e.g. from several threads).
         """
         self.prms["value"] = value
 
-    def modify(self, paramset):
-        _u.set_recursive(paramset.data,
-                self.prms["path_to"], self.prms["value"])
+    def transform(self, paramset, value):
+        paramset[self.prms["path_to"]] = value
 
-    def describe(self, paramset):
+    def describe_transform(self, paramset, value, info):
         """
             Return an object describing the transformation.
         """
         return "Changed {} to {}.".format(
                 self.prms["path_to"],
-                self.prms["value"])
+                value)
+
+    def modified_paths(self):
+        if not self._declares_paths():
+            return None
+        return [self.prms["path_to"]]
 
 
 class CopyValue(Transform):
@@ -87,25 +424,34 @@ class CopyValue(Transform):
         Copy one value.
     """
 
+    lazy_description = True
+    description_parameters = ("path_from", "path_to")
+
     default_parameters = {
             "path_from" : None,
             "path_to" : None,
         }
 
-    def modify(self, paramset):
+    def transform(self, paramset, value):
         assert self.prms["path_from"] is not None
         assert self.prms["path_to"] is not None
 
         value = _u.get_recursive(paramset.data, self.prms["path_from"])
-        _u.set_recursive(paramset.data, self.prms["path_to"], value)
+        paramset[self.prms["path_to"]] = value
+        return value
 
-    def describe(self, paramset):
+    def describe_transform(self, paramset, value, info):
         return "Copied {} to {} ({})".format(
                 self.prms["path_from"],
                 self.prms["path_to"],
-                _u.get_recursive(paramset.data, self.prms["path_from"])
+                info
             )
 
+    def modified_paths(self):
+        if not self._declares_paths():
+            return None
+        return [self.prms["path_to"]]
+
 
 class AddValue(SetValue):
     """
@@ -117,26 +463,81 @@ class AddValue(SetValue):
                 "path_from" : None,
             }
 
+    description_parameters = ("path_to", "path_from")
+
+    # values of the last application of the stateful `modify`
+    orig_value = _deprecated_attribute("orig_value")
+    final_value = _deprecated_attribute("final_value")
+
+    # name of the deprecated attribute holding the original value
+    _attr_orig_value = "orig_value"
+
     def get_orig_value(self, paramset):
         if self.prms["path_from"] is not None:
-            self.orig_value = _u.get_recursive(paramset.data,
-                self.prms["path_from"])
+            orig_value = _u.get_recursive(paramset.data,
+                                          self.prms["path_from"])
         else:
-            self.orig_value = _u.get_recursive(paramset.data,
-                self.prms["path_to"])
+            orig_value = _u.get_recursive(paramset.data,
+                                          self.prms["path_to"])
+        self._store_orig_value(orig_value)
+        return orig_value
+
+    def transform(self, paramset, value):
+        """
+            Returns (original value, final value).
+        """
+        return self._apply(paramset, value, self.get_orig_value(paramset))
 
     def modify(self, paramset):
-        self.get_orig_value(paramset)
-        self.final_value = self.orig_value + self.prms["value"]
-        _u.set_recursive(paramset.data,
-                self.prms["path_to"], self.final_value)
+        """
+            Stateful variant of `transform` for subclasses that implement
+            `get_orig_value` by setting the (deprecated) attributes.
+        """
+        private = "_" + self._attr_orig_value
+        setattr(self, private, None)
+        orig_value = self.get_orig_value(paramset)
+        if orig_value is None:
+            orig_value = getattr(self, private)
+        setattr(self, private, orig_value)
+        orig_value, self._final_value = self._apply(
+            paramset, self.prms.get("value"), orig_value)
+        return orig_value, self._final_value
+
+    def _apply(self, paramset, value, orig_value):
+        """
+            Set the final value computed from orig_value and value.
 
-    def describe(self, paramset):
+            Returns (original value, final value).
+        """
+        final_value = orig_value + value
+        paramset[self.prms["path_to"]] = final_value
+        return orig_value, final_value
+
+    def _store_orig_value(self, orig_value):
+        """
+            Set the deprecated attribute holding the original value, which
+            stateful subclasses (implementing `modify`) read after calling
+            `get_orig_value`.
+        """
+        if self._is_stateful():
+            setattr(self, "_" + self._attr_orig_value, orig_value)
+
+    def _get_stateful_info(self):
+        return (getattr(self, "_" + self._attr_orig_value, None),
+                getattr(self, "_final_value", None))
+
+    def _is_stateful(self):
+        # custom `get_orig_value`s might only set the deprecated attributes
+        return super(AddValue, self)._is_stateful()\
+            or _overrides(type(self), "get_orig_value", "_apply")
+
+    def describe_transform(self, paramset, value, info):
+        orig_value, final_value = info
         return "Added {} to {} ({} -> {}){}.".format(
-                self.prms["value"],
+                value,
                 self.prms["path_to"],
-                self.orig_value,
-                self.final_value,
+                orig_value,
+                final_value,
                 "" if self.prms["path_from"] is None else
                     " [taken from {}]".format(self.prms["path_from"]))
 
@@ -146,23 +547,21 @@ class FactorValue(AddValue):
         Multiply a single value with a factor.
     """
 
-    def modify(self, paramset):
-        self.get_orig_value(paramset)
-
-        self.final_value = self.orig_value * self.prms["value"]
-        _u.set_recursive(paramset.data,
-                self.prms["path_to"],
-                self.final_value)
+    def _apply(self, paramset, value, orig_value):
+        final_value = orig_value * value
+        paramset[self.prms["path_to"]] = final_value
+        return orig_value, final_value
 
-    def describe(self, paramset):
+    def describe_transform(self, paramset, value, info):
         """
             Return an object describing the transformation.
         """
+        orig_value, final_value = info
         return "Multiplied {} by {} ({} -> {}){}.".format(
                 self.prms["path_to"],
-                self.prms["value"],
-                self.orig_value,
-                self.final_value,
+                value,
+                orig_value,
+                final_value,
                 "" if self.prms["path_from"] is None else
                     " [taken from {}]".format(self.prms["path_from"]))
 
@@ -177,32 +576,29 @@ class ApplyFunction(AddValue):
         "function": None,
     }
 
-    def modify(self, paramset):
-        assert callable(self.prms['function'])
-        self.get_orig_value(paramset)
+    description_parameters = ("function", "path_from", "path_to")
 
-        self.final_value = self.prms['function'](self.orig_value)
-        _u.set_recursive(
-            paramset.data,
-            self.prms["path_to"],
-            self.final_value)
+    def _apply(self, paramset, value, orig_value):
+        assert callable(self.prms['function'])
+        # the function may modify its argument, which is shared
+        # copy-on-write
+        final_value = self.prms['function'](_copy.deepcopy(orig_value))
+        paramset[self.prms["path_to"]] = final_value
+        return orig_value, final_value
 
-    def describe(self, paramset):
+    def describe_transform(self, paramset, value, info):
         """
             Return an object describing the transformation.
         """
         assert callable(self.prms['function'])
-        import inspect
-        try:
-            function_name = inspect.getsource(self.prms["function"])
-        except IOError:
-            function_name = "a function"
+        function_name = get_function_source(self.prms["function"])
+        orig_value, final_value = info
         return "applied {} to {} and saved at {} ({} -> {}).".format(
             function_name,
             self.prms["path_from"],
             self.prms["path_to"],
-            self.orig_value,
-            self.final_value,
+            orig_value,
+            final_value,
         )
 
 
@@ -217,39 +613,40 @@ class ApplyFunctionElaborate(AddValue):
         "orig_values": {},
     }
 
+    description_parameters = ("function", "dict", "path_to")
+
+    orig_values = _deprecated_attribute("orig_values")
+
+    _attr_orig_value = "orig_values"
+
     def get_orig_value(self, paramset):
-        self.orig_values = {}
+        orig_values = {}
         for local_key, yaml_key in self.prms['dict'].items():
-            self.orig_values[local_key] = _u.get_recursive(
+            orig_values[local_key] = _u.get_recursive(
                 paramset.data,
                 yaml_key)
+        self._store_orig_value(orig_values)
+        return orig_values
 
-    def modify(self, paramset):
+    def _apply(self, paramset, value, orig_values):
         assert callable(self.prms['function'])
-        self.get_orig_value(paramset)
+        final_value = self.prms['function'](**_copy.deepcopy(orig_values))
+        paramset[self.prms["path_to"]] = final_value
+        return orig_values, final_value
 
-        self.final_value = self.prms['function'](**self.orig_values)
-        _u.set_recursive(
-            paramset.data,
-            self.prms["path_to"],
-            self.final_value)
-
-    def describe(self, paramset):
+    def describe_transform(self, paramset, value, info):
         """
             Return an object describing the transformation.
         """
         assert callable(self.prms['function'])
-        import inspect
-        try:
-            function_name = inspect.getsource(self.prms["function"])
-        except IOError:
-            function_name = "a function"
+        function_name = get_function_source(self.prms["function"])
+        orig_values, final_value = info
         return "applied {} to {} and saved at {} ({} -> {}).".format(
             function_name,
             self.prms["dict"],
             self.prms["path_to"],
-            self.orig_values,
-            self.final_value,
+            orig_values,
+            final_value,
         )
 
 
@@ -258,24 +655,29 @@ class DeleteValues(Transform):
         Deletes the selected values from the parameterset.
     """
 
+    lazy_description = True
+    description_parameters = ("paths",)
+
     default_parameters = {
             "paths" : [],
         }
 
-    def modify(self, paramset):
+    def transform(self, paramset, value):
         for path_to in self.prms["paths"]:
-            split = path_to.split("/")
-            if len(split) > 0:
-                base = _u.get_recursive(paramset.data, "/".join(split[:-1]))
-            else:
-                base = paramset.data
-            if base is not None:
-                try:
-                    del base[split[-1]]
-                except KeyError:
-                    pass
-
-    def describe(self, paramset):
+            try:
+                del paramset[path_to]
+            except KeyError:
+                # only missing values are ignored, not missing parents
+                parent = _u.compile_path(path_to).parent
+                if parent.retrieve(paramset.data, materialized=False) is None:
+                    raise
+
+    def describe_transform(self, paramset, value, info):
         return "Removed paths: \n" + "\n".join(self.prms["paths"])
 
+    def modified_paths(self):
+        if not self._declares_paths():
+            return None
+        return list(self.prms["paths"])
+
 
@@ -2,14 +2,28 @@
 # encoding: utf-8
 
 __all__ = [
+    "LRUCache",
+    "LayeredMapping",
+    "Lazy",
+    "Path",
+    "compile_path",
     "get_recursive",
+    "materialize",
     "set_recursive",
     "update_dict_recursively",
     "chain_generator_functions",
+    "map_chunked",
+    "atomic_write",
 ]
 
 import collections as c
+import collections.abc
+import contextlib
 import copy
+import functools
+import itertools as it
+import os
+import threading
 
 ##########################################################
 # convenience functions to retrieve data from deep dicts #
@@ -22,17 +36,13 @@ def get_recursive(dct, path, default=None, sep="/"):
         If the name is a number it will descend into that element of the list.
 
         If the path is found it will be returned, otherwise `default`.
+
+        `path` can also be a compiled `Path` (see `compile_path`).
     """
-    retval = retrieve_path(dct, path, sep, create=False)
-    if retval is None:
-        if default is None:
-            raise KeyError("YCCP: Did not find {} in the given document. "
-                           "Skip this by giving sensible (not None) default".format(path))
-        retval = default
-    return retval
+    return compile_path(path, sep).get(dct, default=default)
 
 
-def set_recursive(dct, path, value, sep="/"):
+def set_recursive(dct, path, value, sep="/", make_mutable=None):
     """
         For every name in path seperated by `sep`, a new dictionary with that
         name will be created.
@@ -45,31 +55,13 @@ def set_recursive(dct, path, value, sep="/"):
         If the path is found it will be returned, otherwise None.
 
         Afterwards key in path will be set to value.
-    """
-    split_path = path.split(sep)
-    key = split_path[-1]
-    path = sep.join(split_path[:-1])
-    container = retrieve_path(dct, path, sep, create=True)
-    if container is not None:
-        if key.isdigit():
-            idx = int(key)
-            if isinstance(container, list):
-                if idx < len(container):
-                    container[idx] = value
-                elif idx == len(container):
-                    container.append(value)
-                else:
-                    raise ValueError("List {} has wrong length.".format(path))
 
-            else:
-                raise ValueError("Expected list for path {}.".format(path))
-        else:
-            container[key] = value
-    else:
-        raise ValueError("Did not find path {}".format(path))
+        See `retrieve_path` for `make_mutable`.
+    """
+    compile_path(path, sep).set(dct, value, make_mutable=make_mutable)
 
 
-def retrieve_path(dct, path, sep="/", create=False):
+def retrieve_path(dct, path, sep="/", create=False, make_mutable=None):
     """
         For every name in path seperated by `sep`, a new dictionary with that
         name will be created if `create==True`.
@@ -81,65 +73,390 @@ def retrieve_path(dct, path, sep="/", create=False):
         If the name is 0 a new list will be created if `create==True`.
 
         If the path is found it will be returned, otherwise None.
+
+        If `make_mutable` is not None, it is called with every element that is
+        descended into (but not `dct` itself) and the returned object replaces
+        the element in its container (used for copy-on-write).
+
+        `Lazy` values along the path are resolved, the returned value is
+        fully materialized (see `materialize`).
     """
-    if path is None or path == "/" or path == "":
+    if path is None:
         return dct
-    current = dct
-    completed_names = []
-    split_path = path.split(sep)
-    for i, name in enumerate(split_path):
-        current_path = sep.join(completed_names)
-        if name.isdigit():
-            if isinstance(current, list):
-                idx = int(name)
+    return compile_path(path, sep).retrieve(dct, create=create,
+                                            make_mutable=make_mutable)
+
+
+class Path(object):
+    """
+        Compiled path into a nested document of dictionaries and lists.
+
+        The path is split and its numerical components are converted once, so
+        that repeatedly accessing the same path (e.g. by Transforms and namers
+        for every generated ParameterSet) is cheap. Use `compile_path` to
+        obtain (cached) instances.
+    """
+
+    __slots__ = ["path", "sep", "names", "_steps", "_parent"]
+
+    def __init__(self, path, sep="/"):
+        self.path = path
+        self.sep = sep
+        if path == sep or path == "":
+            self.names = ()
+        else:
+            self.names = tuple(path.split(sep))
+        # (name, index or None, next step descends into a list)
+        self._steps = tuple(
+            (name, int(name) if name.isdigit() else None,
+             i + 1 < len(self.names) and self.names[i + 1].isdigit())
+            for i, name in enumerate(self.names))
+        self._parent = None
+
+    def __repr__(self):
+        return "Path({!r})".format(self.path)
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def parent(self):
+        """
+            Path of the container holding the value at this path.
+        """
+        if self._parent is None:
+            self._parent = compile_path(self.sep.join(self.names[:-1]),
+                                        self.sep)
+        return self._parent
+
+    def get(self, dct, default=None):
+        """
+            See `get_recursive`.
+        """
+        retval = self.retrieve(dct)
+        if retval is None:
+            if default is None:
+                raise KeyError("YCCP: Did not find {} in the given document. "
+                               "Skip this by giving sensible (not None) "
+                               "default".format(self.path))
+            retval = default
+        return retval
+
+    def retrieve(self, dct, create=False, make_mutable=None,
+                 materialized=True):
+        """
+            See `retrieve_path` (the returned value is only resolved
+            shallowly if materialized is False).
+        """
+        current = dct
+        last = len(self._steps) - 1
+        for i, (name, idx, next_is_list) in enumerate(self._steps):
+            if idx is not None:
+                if not isinstance(current, list):
+                    return None
                 if idx < len(current):
-                    current = current[idx]
+                    pass
                 elif idx == len(current) and create:
                     # append next type to current
-                    if i+1 < len(split_path) and split_path[i+1].isdigit():
-                        current.append([])
-                    else:
-                        current.append({})
-                    current = current[idx]
+                    current.append([] if next_is_list else {})
                 else:
                     return None
+                key = idx
+            elif name in current:
+                key = name
+            elif create:
+                # append next type to current
+                current[name] = [] if next_is_list else {}
+                key = name
             else:
                 return None
-        elif name in current:
-            current = current[name]
-        elif create:
-            # append next type to current
-            if i+1 < len(split_path) and split_path[i+1].isdigit():
-                current[name] = []
+
+            child = current[key]
+            if isinstance(child, Lazy):
+                child = child.resolve(deep=materialized and i == last)
+            elif materialized and i == last\
+                    and type(child) in (PartialDict, PartialList):
+                child = materialize(child)
+            if make_mutable is not None:
+                child = current[key] = make_mutable(child)
+            current = child
+
+        if materialized and type(current) in (PartialDict, PartialList):
+            current = materialize(current)
+        return current
+
+    def set(self, dct, value, make_mutable=None):
+        """
+            See `set_recursive`.
+        """
+        container = self.parent.retrieve(dct, create=True,
+                                         make_mutable=make_mutable,
+                                         materialized=False)
+        key = self.names[-1] if len(self.names) > 0 else ""
+        if container is not None:
+            if key.isdigit():
+                idx = int(key)
+                if isinstance(container, list):
+                    if idx < len(container):
+                        container[idx] = value
+                    elif idx == len(container):
+                        container.append(value)
+                    else:
+                        raise ValueError("List {} has wrong length.".format(
+                            self.parent.path))
+
+                else:
+                    raise ValueError("Expected list for path {}.".format(
+                        self.parent.path))
             else:
-                current[name] = {}
-            current = current[name]
+                container[key] = value
         else:
-            return None
-        completed_names.append(name)
-    return current
+            raise ValueError("Did not find path {}".format(self.parent.path))
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_path(path, sep):
+    return Path(path, sep)
+
+
+def compile_path(path, sep="/"):
+    """
+        Return the compiled `Path` for the string `path` (cached), compiled
+        paths are returned as is. None, "" and `sep` denote the root.
+    """
+    if isinstance(path, Path):
+        return path
+    if path is None:
+        path = ""
+    return _compile_path(path, sep)
 
 
 ##########################################################
 # regular convenience functions                          #
 ##########################################################
 
-def update_dict_recursively(d, u):
+def update_dict_recursively(d, u, deepcopy=True):
     """
         Dictionary d with the contents from u in recursive manner.
+
+        Every value of u is deep-copied exactly once. If `deepcopy` is False,
+        values are inserted as they are (i.e. shared with u), only the
+        dictionaries of d are created/modified, u is never modified.
     """
-    for k, v in copy.deepcopy(u).items():
-        if isinstance(v, c.Mapping):
-            if k in d and not isinstance(d.get(k), c.Mapping):
-                raise ValueError(
-                        "Only dictionaries should be updated recursively")
-            d[k] = update_dict_recursively(d.get(k, {}), v)
+    _update_dict_recursively(d, u, {} if deepcopy else None)
+    return d
+
+
+def _update_dict_recursively(d, u, memo):
+    # memo is the deepcopy-memo shared by all values (None: do not copy)
+    for k, v in u.items():
+        if isinstance(v, Lazy):
+            v = v.resolve(deep=False)
+        if isinstance(v, c.abc.Mapping):
+            if k in d:
+                current = d[k]
+                if not isinstance(current, c.abc.Mapping):
+                    raise ValueError(
+                            "Only dictionaries should be updated recursively")
+            else:
+                current = d[k] = {}
+            _update_dict_recursively(current, v, memo)
+        elif memo is not None:
+            d[k] = copy.deepcopy(v, memo)
         else:
             d[k] = v
-    return d
 
 
-def chain_generator_functions(generator_functions):
+class LayeredMapping(c.abc.Mapping):
+    """
+        Read-only view of several mappings (`maps`, bottom to top) with the
+        semantics of successive `update_dict_recursively` calls, i.e.
+        mappings at the same key are merged and every other value replaces
+        the values of lower layers.
+
+        Values are looked up lazily from the top-most layer down, nested
+        mappings present in several layers are returned as LayeredMapping.
+    """
+
+    __slots__ = ["maps"]
+
+    def __init__(self, maps):
+        self.maps = maps
+
+    def __contains__(self, key):
+        return any(key in m for m in self.maps)
+
+    def __getitem__(self, key):
+        # mappings at key from top to bottom
+        found = []
+        for m in reversed(self.maps):
+            if key not in m:
+                continue
+            value = m[key]
+            if isinstance(value, Lazy):
+                value = value.resolve(deep=False)
+            if isinstance(value, c.abc.Mapping):
+                found.append(value)
+            elif len(found) == 0:
+                return value
+            else:
+                raise ValueError(
+                        "Only dictionaries should be updated recursively")
+        if len(found) == 0:
+            raise KeyError(key)
+        elif len(found) == 1:
+            return found[0]
+        return LayeredMapping(found[::-1])
+
+    def __iter__(self):
+        # keys in order of their first appearance from the bottom
+        seen = set()
+        for m in self.maps:
+            for key in m:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "LayeredMapping({!r})".format(self.maps)
+
+    def to_dict(self):
+        """
+            Return the merged dictionary (values are shared with the layers).
+        """
+        merged = {}
+        for m in self.maps:
+            update_dict_recursively(merged, m, deepcopy=False)
+        return merged
+
+
+# not yet constructed
+_missing = object()
+
+
+class Lazy(object):
+    """
+        Placeholder for a value in a partially constructed document (see
+        `prelude.load` with lazy=True) that is only constructed when accessed
+        via `Path`s (e.g. `ParameterSet.__getitem__`).
+
+        Subclasses implement `construct(deep)`: If deep is False, containers
+        only need to be constructed one level deep (as `PartialDict` or
+        `PartialList` holding further Lazy values). Constructed values are
+        cached.
+
+        Deep copies of placeholders that were not constructed yet are
+        constructed independently on access (see `duplicate`), pickled
+        placeholders are materialized.
+    """
+
+    __slots__ = ["_shallow", "_deep"]
+
+    def __init__(self):
+        self._shallow = self._deep = _missing
+
+    def __reduce__(self):
+        return (_identity, (self.resolve(),))
+
+    def __deepcopy__(self, memo):
+        if self._deep is not _missing:
+            return copy.deepcopy(self._deep, memo)
+        elif self._shallow is not _missing:
+            return copy.deepcopy(self._shallow, memo)
+        return self.duplicate()
+
+    def construct(self, deep):
+        raise NotImplementedError
+
+    def duplicate(self):
+        """
+            Return a new placeholder constructing the same value (the default
+            implementation constructs it right away).
+        """
+        return copy.deepcopy(self.resolve())
+
+    def resolve(self, deep=True):
+        """
+            Return the constructed value (containers possibly being partial
+            if deep is False).
+        """
+        if self._deep is not _missing:
+            return self._deep
+        if deep:
+            if self._shallow is _missing:
+                self._deep = self.construct(deep=True)
+            else:
+                self._deep = materialize(self._shallow)
+                self._shallow = _missing
+            return self._deep
+        if self._shallow is _missing:
+            self._shallow = self.construct(deep=False)
+        return self._shallow
+
+
+class PartialDict(dict):
+    """
+        Dictionary whose values might be `Lazy`.
+    """
+
+    __slots__ = []
+
+    def __copy__(self):
+        # copy-on-write copies must not materialize
+        return PartialDict(self)
+
+    def __deepcopy__(self, memo):
+        cp = memo[id(self)] = PartialDict()
+        for k, v in self.items():
+            cp[copy.deepcopy(k, memo)] = copy.deepcopy(v, memo)
+        return cp
+
+    def __reduce__(self):
+        return (_identity, (materialize(self),))
+
+
+class PartialList(list):
+    """
+        List whose items might be `Lazy`.
+    """
+
+    __slots__ = []
+
+    def __copy__(self):
+        return PartialList(self)
+
+    def __deepcopy__(self, memo):
+        cp = memo[id(self)] = PartialList()
+        cp.extend(copy.deepcopy(v, memo) for v in self)
+        return cp
+
+    def __reduce__(self):
+        return (_identity, (materialize(self),))
+
+
+def materialize(value):
+    """
+        Return value with all `Lazy` values constructed (partial containers
+        are copied).
+    """
+    if isinstance(value, Lazy):
+        return value.resolve(deep=True)
+    elif isinstance(value, PartialDict):
+        return {k: materialize(v) for k, v in value.items()}
+    elif isinstance(value, PartialList):
+        return [materialize(v) for v in value]
+    return value
+
+
+def _identity(value):
+    return value
+
+
+def chain_generator_functions(generator_functions, filters=None,
+                              on_reject=None):
     """
         Takes a list of functions that take one value and return generators and
         successively applies them.
@@ -147,6 +464,12 @@ def chain_generator_functions(generator_functions):
         Returns a single generator over all generators returned by the
         generator_functions for all inputs.
 
+        If `filters` is given, it holds one predicate (or None) per generator
+        function. Values yielded by the corresponding generator that do not
+        satisfy it are discarded and never passed on to subsequent generator
+        functions. `on_reject(index)` is called for each value discarded after
+        `generator_functions[index]`.
+
         Note: This function currently does NOT check if the generators modify
         an item inplace!
     """
@@ -157,6 +480,13 @@ def chain_generator_functions(generator_functions):
             try:
                 value = next(generators[-1])
 
+                if filters is not None:
+                    predicate = filters[len(generators) - 1]
+                    if predicate is not None and not predicate(value):
+                        if on_reject is not None:
+                            on_reject(len(generators) - 1)
+                        continue
+
                 if len(generators) < len(generator_functions):
                     generators.append(
                             generator_functions[len(generators)](value))
@@ -167,3 +497,125 @@ def chain_generator_functions(generator_functions):
             except StopIteration:
                 generators.pop()
     return chained
+
+
+def map_chunked(executor, func, iterable, chunksize=1, max_pending=8):
+    """
+        Like `executor.map(func, iterable)` but the items of `iterable` are
+        sent to the executor in chunks of size `chunksize` and only consumed
+        once there are less than `max_pending` chunks being processed.
+
+        Hence, `iterable` can be a (possibly large) generator. Results are
+        yielded in order.
+    """
+    iterable = iter(iterable)
+    chunks = iter(lambda: list(it.islice(iterable, chunksize)), [])
+
+    pending = c.deque()
+    for chunk in chunks:
+        pending.append(executor.submit(_apply_to_chunk, func, chunk))
+        if len(pending) >= max_pending:
+            for result in pending.popleft().result():
+                yield result
+
+    while len(pending) > 0:
+        for result in pending.popleft().result():
+            yield result
+
+
+def _apply_to_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+##########
+# caches #
+##########
+
+class LRUCache(object):
+    """
+        Thread-safe mapping of at most `maxsize` entries, the least recently
+        used entry is evicted first. If maxsize is 0, nothing will be cached.
+
+        Cached values are shared, they must not be modified in place.
+    """
+
+    Info = c.namedtuple("Info", ["hits", "misses", "evictions", "maxsize",
+                                 "currsize"])
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = c.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self, counters=False):
+        """
+            Remove all entries (and reset all counters if `counters` is True).
+        """
+        with self._lock:
+            self._data.clear()
+            if counters:
+                self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+            Return the value for `key` (marking it as recently used) or
+            `default`.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def info(self):
+        """
+            Return hit/miss/eviction counters as well as the current size.
+        """
+        with self._lock:
+            return self.Info(self.hits, self.misses, self.evictions,
+                             self.maxsize, len(self._data))
+
+
+#########
+# files #
+#########
+
+@contextlib.contextmanager
+def atomic_write(filename, mode="wb"):
+    """
+        Context manager yielding a file object for a temporary file that
+        replaces `filename` once the block completes, so that concurrent
+        readers (or writers) never see partially written files.
+
+        If the block raises, the temporary file is removed and `filename`
+        stays untouched.
+    """
+    tmp = "{}.{}.{}.tmp".format(filename, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp, mode) as f:
+            yield f
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise